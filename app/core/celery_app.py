@@ -0,0 +1,10 @@
+from celery import Celery
+from app.core.config import settings
+
+celery_app = Celery("document_query", broker=settings.redis_url)
+celery_app.conf.update(
+    # Jobs are long and heavy; take one at a time and only ack when done
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    task_ignore_result=True,
+)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 class Settings(BaseSettings):
@@ -10,22 +10,122 @@ class Settings(BaseSettings):
     # OpenAI Settings
     openai_api_key: Optional[str] = None
     openai_model: str = "gpt-4o"
+    openai_base_url: Optional[str] = None  # any OpenAI-compatible server
+    llm_max_concurrency: int = 8
+
+    # LLM Gateway Settings
+    # JSON list of {"name", "base_url", "api_key", "model", "operations",
+    # "rate_limit_rps", "rate_limit_burst"}; empty uses the OpenAI settings above
+    llm_endpoints: List[Dict] = []
+    llm_validation_model: Optional[str] = None  # cheaper model for "validate" calls
+    llm_timeout_seconds: float = 60
+    llm_connect_timeout_seconds: float = 5
+    llm_max_connections: int = 50
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry_seconds: float = 30
+    llm_max_retries: int = 3
+    llm_backoff_base_seconds: float = 0.5
+    llm_backoff_max_seconds: float = 20  # a longer Retry-After moves to the next endpoint
+    llm_rate_limit_rps: float = 0  # per endpoint; 0 for no limit
+    llm_rate_limit_burst: int = 10
+    llm_hedge_quantile: float = 0.95  # hedge calls slower than this; 0 disables
+    llm_hedge_min_samples: int = 20  # latencies needed before hedging
+
+    # Answer Validation
+    validation_mode: str = "inline"  # "off", "deferred", "inline" or "structured"
 
     # Embedding Settings
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_backend: str = "torch"  # "torch", "torch-int8", "onnx" or "onnx-int8"
+    embedding_batch_size: int = 64
+    embedding_threads: int = 0  # 0 keeps torch's default
+    embedding_query_cache_size: int = 1024
+    embedding_coalesce_ms: int = 5
 
     # Chunking Settings
     chunk_size: int = 500
     chunk_overlap: int = 50
+    chunk_length_unit: str = "characters"  # or "tokens" (tiktoken)
 
     # Vector Store Settings
     faiss_index_path: str = "./faiss_index"
     top_k_chunks: int = 10
+    vector_metric: str = "l2"  # or "cosine" for inner product on normalized vectors
+    min_similarity: float = 0.2
+    max_context_tokens: int = 4000
+
+    # Vector Index Settings
+    vector_index_type: str = "flat"  # "flat", "hnsw" or "ivfpq"
+    vector_index_promotion_threshold: int = 100000
+    vector_index_hnsw_m: int = 32
+    vector_index_ef_construction: int = 200
+    vector_index_ef_search: int = 64
+    vector_index_nlist: int = 1024
+    vector_index_nprobe: int = 16
+    vector_index_pq_m: int = 48
+    vector_index_pq_nbits: int = 8
+    vector_search_exhaustive_max: int = 20000
+
+    # Hybrid Search Settings
+    hybrid_search_enabled: bool = True  # fuse BM25 keyword hits with vector hits
+    hybrid_candidates: int = 50  # hits taken from each retriever before fusion
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    rrf_k: int = 60
+
+    # Context Assembly Settings
+    context_merge_adjacent: bool = True  # join neighbouring chunks, sending their overlap once
+    context_dedup_threshold: float = 0.8  # MinHash Jaccard estimate; 0 keeps near-duplicates
+    context_minhash_permutations: int = 64
+    context_shingle_size: int = 3  # words per shingle
 
     # PDF Processing
     max_pdf_size_mb: int = 50
     pdf_download_timeout: int = 30
+    pdf_download_concurrency: int = 8
+    pdf_extraction_backend: str = "pdfplumber"  # or "pypdf2" for text-only
+    pdf_extraction_workers: int = 0  # 0 uses one worker per CPU
+    pdf_extraction_min_pages_per_task: int = 16
+
+    # Ingest Pipeline Settings
+    ingest_max_documents: int = 4  # documents extracted and embedded at once
+    ingest_queue_batches: int = 4  # chunk batches waiting for the embedder
+
+    # HTTP Client Settings
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http2_enabled: bool = True
+
+    # Document Cache Settings
+    document_cache_enabled: bool = True
+    document_cache_max_mb: int = 1024
+    document_cache_access_flush_seconds: int = 30  # batches cache-hit manifest writes
+
+    # Answer Cache Settings
+    answer_cache_enabled: bool = True
+    answer_cache_backend: str = "memory"  # or "redis"
+    answer_cache_similarity: float = 0.95
+    answer_cache_ttl_seconds: int = 3600
+    answer_cache_max_entries: int = 10000
+    answer_cache_redis_candidates: int = 256  # most recently used entries a Redis lookup compares
+    redis_url: str = "redis://localhost:6379/0"
+
+    # Completion Cache Settings
+    completion_cache_enabled: bool = True  # exact-match, per process
+    completion_cache_ttl_seconds: int = 3600
+    completion_cache_max_entries: int = 1000
+
+    # Job Queue Settings
+    job_backend: str = "memory"  # or "redis" for Celery worker processes
+    job_workers: int = 4  # in-process workers for the memory backend
+    job_queue_max_size: int = 100
+    job_max_records: int = 10000
+    job_ttl_seconds: int = 3600
+    job_cancel_poll_seconds: float = 0.5
 
+    # Telemetry Settings
+    telemetry_enabled: bool = True  # False turns metrics and spans into no-ops
+    telemetry_trace_buffer: int = 100  # finished traces kept for /traces
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,30 @@
+import httpx
+from app.core.config import settings
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP client shared by all outbound document downloads."""
+    return httpx.AsyncClient(
+        http2=settings.http2_enabled,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+        ),
+        timeout=settings.pdf_download_timeout,
+        follow_redirects=True,
+    )
+
+
+def create_llm_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP client shared by every LLM endpoint."""
+    return httpx.AsyncClient(
+        http2=settings.http2_enabled,
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+        ),
+        timeout=httpx.Timeout(
+            settings.llm_timeout_seconds, connect=settings.llm_connect_timeout_seconds
+        ),
+    )
@@ -0,0 +1,415 @@
+"""
+Metrics and tracing for the query pipeline.
+
+Counters and histograms render in the Prometheus text format for
+``/metrics``. Spans follow the OpenTelemetry model (trace and span IDs,
+parent links, attributes and status): ``trace`` starts the root span of a
+request, ``span`` times a stage inside it, and the request's summed stage
+durations become the ``timings`` block of its response metadata. Finished
+traces are kept in a ring buffer for ``/traces``.
+
+With ``telemetry_enabled`` off, metrics and spans do nothing beyond a flag
+check.
+"""
+import bisect
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+_enabled = settings.telemetry_enabled
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def set_enabled(enabled: bool):
+    """Switch telemetry on or off at runtime, e.g. to measure its overhead."""
+    global _enabled
+    _enabled = enabled
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        if not _enabled:
+            return
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labels, labels), 0)
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        if not _enabled:
+            return
+        key = _label_key(self.labels, labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bucket] += 1
+            entry[1] += value
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = [
+                (key, list(counts), total)
+                for key, (counts, total) in self._values.items()
+            ]
+        for key, counts, total in values:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = {**labels, "le": _format_bound(bound)}
+                yield f"{self.name}_bucket", bucket_labels, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Span:
+    """One timed operation of a trace."""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "attributes", "start", "end", "status"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: Optional[str],
+        parent_id: Optional[str],
+        attributes: Dict,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time_ns()
+        self.end = None
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": self.start,
+            "end_time_unix_nano": self.end,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class Trace:
+    """The spans and summed stage durations of one request."""
+
+    def __init__(self, name: str):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.name = name
+        self.spans: List[Span] = []
+        self.stages: Dict[str, float] = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, span: Optional[Span] = None):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            if span is not None:
+                self.spans.append(span)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {"trace_id": self.trace_id, "name": self.name, "spans": spans}
+
+
+class _SpanContext:
+    """Context manager timing a span; also usable with ``async with``."""
+
+    __slots__ = (
+        "_name", "_attributes", "_root", "span", "_trace_token", "_span_token", "_started"
+    )
+
+    def __init__(self, name: str, attributes: Dict, root: bool):
+        self._name = name
+        self._attributes = attributes
+        self._root = root
+
+    def __enter__(self) -> Span:
+        self._trace_token = None
+        if self._root:
+            current = Trace(self._name)
+            self._trace_token = _current_trace.set(current)
+        else:
+            current = _current_trace.get()
+        parent = None if self._root else _current_span.get()
+        self.span = Span(
+            self._name,
+            current.trace_id if current is not None else None,
+            parent.span_id if parent is not None else None,
+            self._attributes,
+        )
+        self._span_token = _current_span.set(self.span)
+        self._started = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self._started
+        span = self.span
+        span.end = span.start + int(seconds * 1e9)
+        if exc_type is not None:
+            span.status = "error"
+            span.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        try:
+            _current_span.reset(self._span_token)
+        except ValueError:
+            # Exited in another context: an async generator closed elsewhere
+            pass
+
+        STAGE_SECONDS.observe(seconds, stage=span.name)
+        current = _current_trace.get()
+        if current is not None:
+            current.record(span.name, seconds, span)
+        if self._trace_token is not None:
+            try:
+                _current_trace.reset(self._trace_token)
+            except ValueError:
+                pass
+            _traces.append(current)
+        return False
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        return self.__exit__(exc_type, exc, traceback)
+
+
+class _NoopSpan:
+    """Shared stand-in for spans while telemetry is off."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "telemetry_trace", default=None
+)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "telemetry_span", default=None
+)
+_traces: Deque[Trace] = deque(maxlen=max(settings.telemetry_trace_buffer, 1))
+_registry: List = []
+
+
+def trace(name: str, **attributes):
+    """
+    Start a request's root span.
+
+    Stages timed inside it, including in tasks and worker threads started
+    from it, are summed into its ``timings``.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _SpanContext(name, attributes, root=True)
+
+
+def span(name: str, **attributes):
+    """Time a pipeline stage as a child of the current span."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _SpanContext(name, attributes, root=False)
+
+
+def record_stage(name: str, seconds: float):
+    """
+    Record time a stage spent working without a span of its own, such as
+    the summed extraction time of a pipelined ingest.
+    """
+    if not _enabled:
+        return
+    STAGE_SECONDS.observe(seconds, stage=name)
+    current = _current_trace.get()
+    if current is not None:
+        current.record(name, seconds)
+
+
+def timings() -> Optional[Dict[str, float]]:
+    """
+    Milliseconds per stage of the current request so far, plus ``total_ms``.
+
+    Stages that overlap or repeat (documents ingested side by side, the
+    answers of a batch) are summed, so they can add up to more than the
+    total. None without a trace or while telemetry is off.
+    """
+    current = _current_trace.get()
+    if current is None:
+        return None
+    with current._lock:
+        stages = dict(current.stages)
+    result = {f"{stage}_ms": round(seconds * 1000, 1) for stage, seconds in stages.items()}
+    result["total_ms"] = round((time.perf_counter() - current.started) * 1000, 1)
+    return result
+
+
+def trace_id() -> Optional[str]:
+    current = _current_trace.get()
+    return current.trace_id if current is not None else None
+
+
+def recent_traces(limit: Optional[int] = None) -> List[Dict]:
+    """Finished traces, most recent first."""
+    traces = list(_traces)[::-1]
+    return [finished.to_dict() for finished in traces[:limit]]
+
+
+def render_metrics() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            if labels:
+                label_text = ",".join(
+                    f'{key}="{_escape(value)}"' for key, value in labels.items()
+                )
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _label_key(names: Tuple[str, ...], labels: Dict) -> Tuple[str, ...]:
+    if not names:
+        return ()
+    return tuple([str(labels[name]) for name in names])
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent per pipeline stage.",
+    labels=("stage",),
+)
+DOWNLOADED_BYTES = Counter(
+    "rag_downloaded_bytes_total", "Bytes of PDF content downloaded."
+)
+PAGES_EXTRACTED = Counter(
+    "rag_pages_extracted_total", "PDF pages whose text was extracted."
+)
+CHUNKS_EMBEDDED = Counter(
+    "rag_chunks_embedded_total", "Document chunks embedded."
+)
+CONTEXT_TOKENS_SAVED = Counter(
+    "rag_context_tokens_saved_total",
+    "Tokens of retrieved chunks left out of LLM prompts by context assembly.",
+)
+LLM_REQUESTS = Counter(
+    "rag_llm_requests_total",
+    "LLM API attempts per endpoint and call kind, by outcome (ok, retry, error).",
+    labels=("endpoint", "operation", "outcome"),
+)
+LLM_HEDGES = Counter(
+    "rag_llm_hedges_total",
+    "Hedged LLM requests, by the endpoint the copy was sent to.",
+    labels=("endpoint", "operation"),
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "LLM tokens sent (input) and generated (output), per call kind.",
+    labels=("operation", "direction"),
+)
+LLM_CACHED_TOKENS = Counter(
+    "rag_llm_cached_tokens_total",
+    "Input tokens the provider served from its prompt cache, per call kind.",
+    labels=("operation",),
+)
+LLM_COMPLETION_CACHE = Counter(
+    "rag_llm_completion_cache_total",
+    "Local exact-match completion cache lookups, by outcome (hit, miss).",
+    labels=("operation", "outcome"),
+)
@@ -0,0 +1,27 @@
+from functools import lru_cache
+
+import tiktoken
+from app.core.config import settings
+
+
+def encoding_name(model: str = None) -> str:
+    """
+    Name of the tiktoken encoding for an OpenAI model.
+
+    Models this tiktoken release doesn't know, such as ones released after
+    it or served under another name, are counted with cl100k_base.
+    """
+    try:
+        return tiktoken.encoding_name_for_model(model or settings.openai_model)
+    except KeyError:
+        return "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = None) -> tiktoken.Encoding:
+    """Return the (cached) tiktoken encoding for an OpenAI model."""
+    return tiktoken.get_encoding(encoding_name(model))
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
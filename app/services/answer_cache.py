@@ -0,0 +1,273 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import redis.asyncio as redis
+from app.core.config import settings
+
+
+def document_set_key(doc_urls: Dict[str, str]) -> str:
+    """
+    Key for a request's document set.
+
+    Covers the document contents and the model, so an answer is only reused
+    for the same documents answered by the same LLM.
+    """
+    key = "|".join([settings.openai_model] + sorted(doc_urls))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def chunk_set_key(chunks: Iterable[Dict]) -> str:
+    """Key for the exact context an answer was generated from."""
+    parts = sorted(
+        f"{chunk['doc_id']}:"
+        f"{','.join(map(str, chunk.get('chunk_indexes', [chunk['chunk_index']])))}:"
+        f"{chunk.get('document_name', '')}"
+        for chunk in chunks
+    )
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _best_match(
+    candidates: List[Tuple[np.ndarray, str, Dict]],
+    embedding: np.ndarray,
+    chunk_key: str,
+    threshold: float,
+) -> Optional[Dict]:
+    """Most similar candidate above ``threshold`` built from ``chunk_key``."""
+    best, best_similarity = None, threshold
+    for cached_embedding, cached_chunk_key, answer in candidates:
+        if cached_chunk_key != chunk_key:
+            continue
+        # Embeddings are normalized, so the dot product is the cosine
+        similarity = float(np.dot(cached_embedding, embedding))
+        if similarity >= best_similarity:
+            best, best_similarity = answer, similarity
+    return best
+
+
+class AnswerCache:
+    """
+    In-memory cache of generated answers for near-duplicate questions.
+
+    An answer is reused when the new query's embedding is at least
+    ``answer_cache_similarity`` similar to a cached query over the same
+    document set and retrieval selected the identical chunk set. Entries
+    expire after ``answer_cache_ttl_seconds`` and the least recently used
+    are evicted beyond ``answer_cache_max_entries``.
+    """
+
+    def __init__(self):
+        self.threshold = settings.answer_cache_similarity
+        self.ttl = settings.answer_cache_ttl_seconds
+        self.max_entries = settings.answer_cache_max_entries
+
+        # (doc_key, entry_id) -> (expires_at, embedding, chunk_key, answer)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple]" = OrderedDict()
+        self._by_doc_set: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    async def get(
+        self, doc_key: str, embedding: np.ndarray, chunk_key: str
+    ) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for entry_id in list(self._by_doc_set.get(doc_key, ())):
+                key = (doc_key, entry_id)
+                expires_at, cached_embedding, cached_chunk_key, answer = self._entries[key]
+                if expires_at <= now:
+                    self._remove(key)
+                    continue
+                candidates.append((cached_embedding, cached_chunk_key, (key, answer)))
+
+            match = _best_match(candidates, embedding, chunk_key, self.threshold)
+            if match is None:
+                self._misses += 1
+                return None
+
+            key, answer = match
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(answer)
+
+    async def put(
+        self,
+        doc_key: str,
+        embedding: np.ndarray,
+        chunk_key: str,
+        answer: Dict,
+        entry_id: Optional[str] = None,
+    ) -> str:
+        """
+        Cache an answer, or replace entry ``entry_id`` if given.
+
+        Returns:
+            The entry ID
+        """
+        entry_id = entry_id or uuid.uuid4().hex
+        key = (doc_key, entry_id)
+        with self._lock:
+            self._entries[key] = (
+                time.time() + self.ttl,
+                np.asarray(embedding, dtype="float32"),
+                chunk_key,
+                dict(answer),
+            )
+            self._entries.move_to_end(key)
+            self._by_doc_set.setdefault(doc_key, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        return entry_id
+
+    async def stats(self) -> Dict:
+        with self._lock:
+            return _stats(self._hits, self._misses, len(self._entries))
+
+    async def close(self):
+        pass
+
+    def _remove(self, key: Tuple[str, str]):
+        doc_key, entry_id = key
+        self._entries.pop(key, None)
+        entry_ids = self._by_doc_set.get(doc_key)
+        if entry_ids is not None:
+            entry_ids.discard(entry_id)
+            if not entry_ids:
+                del self._by_doc_set[doc_key]
+
+
+class RedisAnswerCache(AnswerCache):
+    """
+    Answer cache shared between instances through Redis.
+
+    Each entry is a JSON value with a TTL. A sorted set per document set
+    tracks entries by last access, and beyond ``answer_cache_max_entries``
+    the least recently used entries of that document set are dropped.
+    A lookup only compares the ``answer_cache_redis_candidates`` most
+    recently used entries, so its cost doesn't grow with the cap. Hit/miss
+    counters are shared too.
+    """
+
+    PREFIX = "answer-cache"
+
+    def __init__(self, client: Optional[redis.Redis] = None):
+        super().__init__()
+        self.client = client or redis.Redis.from_url(settings.redis_url)
+        self.candidates = settings.answer_cache_redis_candidates
+
+    async def get(
+        self, doc_key: str, embedding: np.ndarray, chunk_key: str
+    ) -> Optional[Dict]:
+        index_key = f"{self.PREFIX}:{doc_key}"
+        recent = await self.client.zrevrange(index_key, 0, self.candidates - 1)
+        entry_ids = [entry_id.decode() for entry_id in recent]
+
+        candidates = []
+        expired = []
+        if entry_ids:
+            values = await self.client.mget(
+                [self._entry_key(doc_key, entry_id) for entry_id in entry_ids]
+            )
+            for entry_id, value in zip(entry_ids, values):
+                if value is None:
+                    expired.append(entry_id)
+                    continue
+                entry = json.loads(value)
+                cached_embedding = np.frombuffer(
+                    base64.b64decode(entry["embedding"]), dtype="float32"
+                )
+                candidates.append(
+                    (cached_embedding, entry["chunk_key"], (entry_id, entry["answer"]))
+                )
+
+        if expired:
+            await self.client.zrem(index_key, *expired)
+
+        match = _best_match(candidates, embedding, chunk_key, self.threshold)
+        if match is None:
+            await self.client.hincrby(f"{self.PREFIX}:stats", "misses", 1)
+            return None
+
+        entry_id, answer = match
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(index_key, {entry_id: time.time()})
+            pipe.expire(index_key, self.ttl)
+            pipe.hincrby(f"{self.PREFIX}:stats", "hits", 1)
+            await pipe.execute()
+        return answer
+
+    async def put(
+        self,
+        doc_key: str,
+        embedding: np.ndarray,
+        chunk_key: str,
+        answer: Dict,
+        entry_id: Optional[str] = None,
+    ) -> str:
+        entry_id = entry_id or uuid.uuid4().hex
+        index_key = f"{self.PREFIX}:{doc_key}"
+        value = json.dumps(
+            {
+                "embedding": base64.b64encode(
+                    np.asarray(embedding, dtype="float32").tobytes()
+                ).decode("ascii"),
+                "chunk_key": chunk_key,
+                "answer": answer,
+            }
+        )
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self._entry_key(doc_key, entry_id), value, ex=self.ttl)
+            pipe.zadd(index_key, {entry_id: time.time()})
+            pipe.expire(index_key, self.ttl)
+            pipe.zcard(index_key)
+            count = (await pipe.execute())[-1]
+
+        if count > self.max_entries:
+            evicted = await self.client.zpopmin(index_key, count - self.max_entries)
+            await self.client.delete(
+                *(self._entry_key(doc_key, entry_id.decode()) for entry_id, _ in evicted)
+            )
+        return entry_id
+
+    async def stats(self) -> Dict:
+        counters = await self.client.hgetall(f"{self.PREFIX}:stats")
+        return _stats(
+            int(counters.get(b"hits", 0)), int(counters.get(b"misses", 0)), None
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    def _entry_key(self, doc_key: str, entry_id: str) -> str:
+        return f"{self.PREFIX}:{doc_key}:{entry_id}"
+
+
+def _stats(hits: int, misses: int, entries: Optional[int]) -> Dict:
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "entries": entries,
+        "similarity_threshold": settings.answer_cache_similarity,
+    }
+
+
+def create_answer_cache() -> AnswerCache:
+    """Create the answer cache for the configured backend."""
+    if settings.answer_cache_backend == "memory":
+        return AnswerCache()
+    if settings.answer_cache_backend == "redis":
+        return RedisAnswerCache()
+    raise ValueError(f"Unknown answer cache backend: {settings.answer_cache_backend}")
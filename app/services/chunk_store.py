@@ -0,0 +1,184 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+class ChunkStore:
+    """
+    Chunk text and metadata stored as columns instead of Python dicts.
+
+    A saved store opens lazily through mmap: chunk text lives in one UTF-8
+    blob addressed by an offsets array, and metadata lives in numpy columns
+    aligned with a sorted chunk ID column. Only the rows a search returns are
+    materialized. Chunks added since the last save are buffered in memory and
+    removals are kept as tombstones until the next save compacts them away.
+
+    Character offsets and page spans are plain integer columns too, so
+    citations never need a second copy of the page text. -1 marks a value
+    the chunk didn't have, and reads back as None.
+    """
+
+    # Integer chunk fields and their defaults, stored as int32 columns
+    FIELDS = {
+        "chunk_index": 0,
+        "total_chunks": 1,
+        "start_char": -1,
+        "end_char": -1,
+        "page_start": -1,
+        "page_end": -1,
+    }
+    COLUMNS = tuple(FIELDS) + ("doc",)
+
+    def __init__(self):
+        self._ids = np.empty(0, dtype="int64")
+        self._offsets = np.zeros(1, dtype="int64")
+        self._text = np.empty(0, dtype="uint8")
+        self._columns = {name: np.empty(0, dtype="int32") for name in self.COLUMNS}
+        self._doc_table: List[str] = []
+        self._doc_numbers: Dict[str, int] = {}
+
+        # chunk ID -> (text, doc number, FIELDS values)
+        self._pending: Dict[int, Tuple[str, int, Tuple[int, ...]]] = {}
+        self._deleted: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._deleted) + len(self._pending)
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return chunk_id in self._pending or self._row(chunk_id) is not None
+
+    def add(self, doc_id: str, ids: Iterable[int], chunks: List[Dict]):
+        doc = self._doc_numbers.get(doc_id)
+        if doc is None:
+            doc = self._doc_numbers[doc_id] = len(self._doc_table)
+            self._doc_table.append(doc_id)
+
+        for chunk_id, chunk in zip(ids, chunks):
+            values = tuple(
+                default if chunk.get(name) is None else chunk[name]
+                for name, default in self.FIELDS.items()
+            )
+            self._pending[int(chunk_id)] = (chunk["text"], doc, values)
+
+    def remove(self, ids: Iterable[int]):
+        for chunk_id in ids:
+            if self._pending.pop(chunk_id, None) is None:
+                if self._row(chunk_id) is not None:
+                    self._deleted.add(chunk_id)
+
+    def get(self, chunk_id: int) -> Optional[Dict]:
+        """Materialize a single chunk as a dictionary."""
+        pending = self._pending.get(chunk_id)
+        if pending is not None:
+            text, doc, values = pending
+        else:
+            row = self._row(chunk_id)
+            if row is None:
+                return None
+            start, end = self._offsets[row], self._offsets[row + 1]
+            text = self._text[start:end].tobytes().decode("utf-8")
+            doc = int(self._columns["doc"][row])
+            values = [int(self._columns[name][row]) for name in self.FIELDS]
+
+        chunk = {"text": text}
+        for name, value in zip(self.FIELDS, values):
+            chunk[name] = None if value < 0 else value
+        chunk["doc_id"] = self._doc_table[doc]
+        return chunk
+
+    def save(self, path: str):
+        """Write a compacted copy of the store to ``path``."""
+        os.makedirs(path, exist_ok=True)
+
+        live = ~np.isin(self._ids, np.fromiter(self._deleted, dtype="int64"))
+        rows = np.flatnonzero(live)
+        pending_ids = sorted(self._pending)
+
+        # Renumber documents so removed ones drop out of the table
+        docs = [self._columns["doc"][rows]] + [
+            np.array([self._pending[i][1] for i in pending_ids], dtype="int32")
+        ]
+        used, doc_column = np.unique(np.concatenate(docs), return_inverse=True)
+
+        lengths = [self._offsets[rows + 1] - self._offsets[rows]]
+        with open(os.path.join(path, "text.bin.tmp"), "wb") as f:
+            if len(rows) == len(self._ids):
+                f.write(self._text.tobytes())
+            else:
+                for row in rows:
+                    f.write(self._text[self._offsets[row] : self._offsets[row + 1]])
+
+            pending_lengths = []
+            for chunk_id in pending_ids:
+                data = self._pending[chunk_id][0].encode("utf-8")
+                f.write(data)
+                pending_lengths.append(len(data))
+            lengths.append(np.array(pending_lengths, dtype="int64"))
+
+        offsets = np.zeros(len(rows) + len(pending_ids) + 1, dtype="int64")
+        np.cumsum(np.concatenate(lengths), out=offsets[1:])
+
+        columns = {
+            "ids": np.concatenate(
+                [self._ids[rows], np.array(pending_ids, dtype="int64")]
+            ),
+            "offsets": offsets,
+            "doc": doc_column.astype("int32"),
+        }
+        for position, name in enumerate(self.FIELDS):
+            columns[name] = np.concatenate(
+                [
+                    self._columns[name][rows],
+                    np.array(
+                        [self._pending[i][2][position] for i in pending_ids],
+                        dtype="int32",
+                    ),
+                ]
+            )
+
+        for name, values in columns.items():
+            with open(os.path.join(path, f"{name}.npy.tmp"), "wb") as f:
+                np.save(f, values)
+        with open(os.path.join(path, "documents.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump([self._doc_table[doc] for doc in used], f)
+
+        # Replace files atomically; existing mmaps keep the old inodes alive
+        for name in ["text.bin", "documents.json"] + [f"{n}.npy" for n in columns]:
+            os.replace(os.path.join(path, f"{name}.tmp"), os.path.join(path, name))
+
+    @classmethod
+    def open(cls, path: str) -> "ChunkStore":
+        """Open a saved store without reading chunk text into memory."""
+        store = cls()
+
+        store._ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        store._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        for name in cls.COLUMNS:
+            column_path = os.path.join(path, f"{name}.npy")
+            if os.path.exists(column_path):
+                store._columns[name] = np.load(column_path, mmap_mode="r")
+            else:
+                # Saved before the column existed
+                store._columns[name] = np.full(
+                    len(store._ids), cls.FIELDS[name], dtype="int32"
+                )
+
+        text_path = os.path.join(path, "text.bin")
+        if os.path.getsize(text_path):
+            store._text = np.memmap(text_path, dtype="uint8", mode="r")
+
+        with open(os.path.join(path, "documents.json"), encoding="utf-8") as f:
+            store._doc_table = json.load(f)
+        store._doc_numbers = {doc_id: i for i, doc_id in enumerate(store._doc_table)}
+
+        return store
+
+    def _row(self, chunk_id: int) -> Optional[int]:
+        if chunk_id in self._deleted:
+            return None
+        row = int(np.searchsorted(self._ids, chunk_id))
+        if row < len(self._ids) and self._ids[row] == chunk_id:
+            return row
+        return None
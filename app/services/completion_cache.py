@@ -0,0 +1,72 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+def completion_key(operation: str, model: str, request: Dict) -> str:
+    """Hash of everything that determines a completion: the prompt and its parameters."""
+    payload = json.dumps(
+        {"operation": operation, "model": model, "request": request},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    In-memory, exact-match cache of LLM completions, per process.
+
+    Unlike the answer cache, which matches similar questions, this only
+    returns a completion for a byte-identical request: the same messages,
+    model and parameters. Entries expire after
+    ``completion_cache_ttl_seconds`` and the least recently used are
+    evicted beyond ``completion_cache_max_entries``.
+    """
+
+    def __init__(self):
+        self.ttl = settings.completion_cache_ttl_seconds
+        self.max_entries = settings.completion_cache_max_entries
+
+        # key -> (expires_at, content, model)
+        self._entries: "OrderedDict[str, Tuple[float, str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns:
+            The cached ``(content, model)``, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                self._entries.pop(key, None)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: str, content: str, model: str):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, content, model)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,196 @@
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core import telemetry
+from app.core.config import settings
+from app.core.tokens import count_tokens
+from app.services.lexical_index import tokenize
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# Shortest suffix/prefix match trusted as chunk overlap when offsets are missing
+_MIN_TEXT_OVERLAP = 8
+
+
+class ContextAssembler:
+    """
+    Turn search results into the context sent to the LLM.
+
+    Adjacent chunks of a document are merged into one passage, so the text
+    they share through ``chunk_overlap`` is sent once. Passages that are
+    near-duplicates of a better ranked one (boilerplate repeated across
+    pages or documents) are dropped, by MinHash estimate of the Jaccard
+    similarity of their word shingles. The rest are packed best-first into
+    ``max_context_tokens``, counted with tiktoken.
+    """
+
+    def __init__(self):
+        self.max_tokens = settings.max_context_tokens
+        self.merge_adjacent = settings.context_merge_adjacent
+        self.dedup_threshold = settings.context_dedup_threshold
+        self.shingle_size = max(settings.context_shingle_size, 1)
+
+        # Fixed seed: signatures are only compared within one request, but
+        # a stable choice keeps assembly reproducible
+        rng = np.random.default_rng(0)
+        permutations = settings.context_minhash_permutations
+        self._a = rng.integers(1, 1 << 31, permutations, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, 1 << 31, permutations, dtype=np.uint64)[:, None]
+
+    def assemble(self, chunks: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """
+        Merge, deduplicate and pack search results.
+
+        Args:
+            chunks: Search results, best first
+
+        Returns:
+            Tuple of the context passages, best first, and assembly stats:
+            how many chunks were merged into a neighbour, dropped as
+            duplicates or left out for the budget, the tokens of the
+            retrieved chunks and of the context, and the tokens saved.
+            A merged passage lists its ``chunk_indexes`` and spans the
+            offsets and pages of all of them. The top passage is always
+            kept, even when it alone exceeds the budget.
+        """
+        tokens_retrieved = sum(count_tokens(chunk["text"]) for chunk in chunks)
+        passages = self._merge(chunks) if self.merge_adjacent else [
+            self._passage([(rank, chunk)]) for rank, chunk in enumerate(chunks)
+        ]
+
+        selected = []
+        signatures = []
+        used = 0
+        stats = {
+            "chunks_retrieved": len(chunks),
+            "chunks_merged": len(chunks) - len(passages),
+            "duplicates_dropped": 0,
+            "budget_dropped": 0,
+            "tokens_retrieved": tokens_retrieved,
+            "overlap_tokens_saved": tokens_retrieved,
+            "duplicate_tokens_saved": 0,
+            "budget_tokens_saved": 0,
+        }
+        for passage in passages:
+            tokens = count_tokens(passage["text"])
+            stats["overlap_tokens_saved"] -= tokens
+
+            if self.dedup_threshold > 0:
+                signature = self.signature(passage["text"])
+                if any(
+                    np.mean(signature == kept) >= self.dedup_threshold
+                    for kept in signatures
+                ):
+                    stats["duplicates_dropped"] += 1
+                    stats["duplicate_tokens_saved"] += tokens
+                    continue
+
+            if selected and used + tokens > self.max_tokens:
+                stats["budget_dropped"] += 1
+                stats["budget_tokens_saved"] += tokens
+                continue
+
+            selected.append(passage)
+            if self.dedup_threshold > 0:
+                signatures.append(signature)
+            used += tokens
+
+        stats["context_tokens"] = used
+        stats["tokens_saved"] = tokens_retrieved - used
+        telemetry.CONTEXT_TOKENS_SAVED.inc(max(stats["tokens_saved"], 0))
+        return selected, stats
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the text's word shingles."""
+        tokens = tokenize(text)
+        size = self.shingle_size
+        shingles = {
+            " ".join(tokens[start : start + size])
+            for start in range(max(len(tokens) - size + 1, 1))
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+    def _merge(self, chunks: List[Dict]) -> List[Dict]:
+        """Join runs of consecutive chunks per document; best rank first."""
+        by_document: Dict[str, List[Tuple[int, Dict]]] = {}
+        for rank, chunk in enumerate(chunks):
+            by_document.setdefault(chunk["doc_id"], []).append((rank, chunk))
+
+        passages = []
+        for ranked in by_document.values():
+            ranked.sort(key=lambda entry: entry[1]["chunk_index"])
+            run = [ranked[0]]
+            for entry in ranked[1:]:
+                if entry[1]["chunk_index"] == run[-1][1]["chunk_index"] + 1:
+                    run.append(entry)
+                else:
+                    passages.append(self._passage(run))
+                    run = [entry]
+            passages.append(self._passage(run))
+
+        passages.sort(key=lambda passage: passage["rank"])
+        return passages
+
+    @staticmethod
+    def _passage(run: List[Tuple[int, Dict]]) -> Dict:
+        """One passage from consecutive chunks given with their ranks."""
+        rank, best = min(run, key=lambda entry: entry[0])
+        passage = dict(best)
+        passage["rank"] = rank
+        passage["chunk_indexes"] = [chunk["chunk_index"] for _, chunk in run]
+        if len(run) == 1:
+            return passage
+
+        first, last = run[0][1], run[-1][1]
+        text = first["text"]
+        previous = first
+        for _, chunk in run[1:]:
+            text = _join(text, previous, chunk)
+            previous = chunk
+        passage["text"] = text
+        passage["chunk_index"] = first["chunk_index"]
+        passage["start_char"] = first.get("start_char")
+        passage["end_char"] = last.get("end_char")
+        pages = [
+            page
+            for _, chunk in run
+            for page in (chunk.get("page_start"), chunk.get("page_end"))
+            if page is not None
+        ]
+        passage["page_start"] = min(pages) if pages else None
+        passage["page_end"] = max(pages) if pages else None
+        similarities = [
+            chunk["similarity"] for _, chunk in run if chunk.get("similarity") is not None
+        ]
+        passage["similarity"] = max(similarities) if similarities else None
+        return passage
+
+
+def _join(text: str, previous: Dict, chunk: Dict) -> str:
+    """Append a chunk to the text ending with ``previous``, minus their overlap."""
+    following = chunk["text"]
+    overlap = _offset_overlap(previous, chunk)
+    if overlap is not None and text.endswith(following[:overlap]):
+        if overlap == 0 and chunk["start_char"] > previous["end_char"]:
+            return f"{text}\n{following}"
+        return text + following[overlap:]
+
+    # No usable offsets: find the longest suffix of the text that starts the chunk
+    for size in range(min(len(text), len(following)), _MIN_TEXT_OVERLAP - 1, -1):
+        if text.endswith(following[:size]):
+            return text + following[size:]
+    return f"{text}\n{following}"
+
+
+def _offset_overlap(previous: Dict, chunk: Dict) -> Optional[int]:
+    """Characters the chunk shares with its predecessor, from their offsets."""
+    end, start = previous.get("end_char"), chunk.get("start_char")
+    if end is None or start is None:
+        return None
+    return max(end - start, 0)
@@ -0,0 +1,278 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from app.core.config import settings
+
+
+class DocumentCache:
+    """
+    On-disk cache of extracted text, chunks and embeddings for each PDF.
+
+    Entries are content-addressed by the SHA-256 of the PDF bytes. A URL table
+    remembers the ETag/Last-Modified validators last seen for every URL, so an
+    unchanged document can be revalidated without downloading it again.
+
+    Worker processes may share the cache directory: each merges the entries
+    and URLs it changed into the manifest on disk, under a file lock. New
+    entries and URLs are written at once; the access times cache hits update
+    are batched, written at most every ``document_cache_access_flush_seconds``
+    and by ``flush``.
+
+    Every method does file I/O; from the event loop use the ``_async`` ones.
+    """
+
+    def __init__(self, path: str = None, max_size_mb: int = None):
+        self.path = path or os.path.join(settings.faiss_index_path, "documents")
+        if max_size_mb is None:
+            max_size_mb = settings.document_cache_max_mb
+        self.max_size = max_size_mb * 1024 * 1024
+
+        # Text, chunks and embeddings depend on these settings, so entries
+        # written under a different configuration must never be served. The
+        # embedding backends agree closely but not bit for bit. "offsets"
+        # retires entries whose chunks predate page and offset metadata.
+        self.fingerprint = hashlib.sha256(
+            f"{settings.embedding_model}|{settings.embedding_backend}|normalized"
+            f"|{settings.pdf_extraction_backend}|{settings.chunk_size}|{settings.chunk_overlap}"
+            f"|{settings.chunk_length_unit}|offsets".encode()
+        ).hexdigest()[:16]
+
+        self._lock = threading.Lock()
+        self._manifest_path = os.path.join(self.path, "manifest.json")
+        self._manifest_lock_path = os.path.join(self.path, "manifest.lock")
+        os.makedirs(self.path, exist_ok=True)
+        self._manifest = self._read_manifest()
+        # What this process changed since it last wrote the manifest
+        self._changed_entries = set()
+        self._removed_entries = set()
+        self._changed_urls = set()
+        self._flush_interval = settings.document_cache_access_flush_seconds
+        self._written_at = time.monotonic()
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def lookup_url(self, url: str) -> Optional[Dict]:
+        """Return the cached validators and content hash for a URL, if any."""
+        with self._lock:
+            known = self._manifest["urls"].get(url)
+            if known and self._entry_key(known["content_hash"]) in self._manifest["entries"]:
+                return dict(known)
+            return None
+
+    def remember_url(
+        self,
+        url: str,
+        content_hash: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        with self._lock:
+            self._manifest["urls"][url] = {
+                "content_hash": content_hash,
+                "etag": etag,
+                "last_modified": last_modified,
+            }
+            self._changed_urls.add(url)
+            self._write_manifest()
+
+    def get(self, content_hash: str) -> Optional[Dict]:
+        """
+        Load a cached document.
+
+        Returns:
+            Dictionary with ``text``, ``chunks`` and ``embeddings`` or None on a miss
+        """
+        key = self._entry_key(content_hash)
+        entry_dir = os.path.join(self.path, key)
+
+        with self._lock:
+            if key not in self._manifest["entries"]:
+                return None
+
+        try:
+            with open(os.path.join(entry_dir, "text.txt"), encoding="utf-8") as f:
+                text = f.read()
+            with open(os.path.join(entry_dir, "chunks.json"), encoding="utf-8") as f:
+                chunks = json.load(f)
+            embeddings = np.load(os.path.join(entry_dir, "embeddings.npy"))
+        except (OSError, ValueError) as e:
+            # Also reached when another thread evicted the entry meanwhile
+            print(f"Discarding unreadable cache entry {key}: {e}")
+            with self._lock:
+                self._remove_entry(key)
+                self._write_manifest()
+            return None
+
+        with self._lock:
+            entry = self._manifest["entries"].get(key)
+            if entry is not None:
+                entry["last_access"] = time.time()
+                self._changed_entries.add(key)
+            # Access times only order eviction; losing the latest few is harmless
+            if time.monotonic() - self._written_at >= self._flush_interval:
+                self._write_manifest()
+
+        return {"text": text, "chunks": chunks, "embeddings": embeddings}
+
+    def put(
+        self, content_hash: str, text: str, chunks: List[Dict], embeddings: np.ndarray
+    ):
+        key = self._entry_key(content_hash)
+        entry_dir = os.path.join(self.path, key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            with open(os.path.join(tmp_dir, "text.txt"), "w", encoding="utf-8") as f:
+                f.write(text)
+            with open(os.path.join(tmp_dir, "chunks.json"), "w", encoding="utf-8") as f:
+                json.dump(chunks, f)
+            np.save(
+                os.path.join(tmp_dir, "embeddings.npy"),
+                np.asarray(embeddings, dtype="float32"),
+            )
+            size = sum(
+                os.path.getsize(os.path.join(tmp_dir, name))
+                for name in os.listdir(tmp_dir)
+            )
+
+            with self._lock:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(tmp_dir, entry_dir)
+                self._manifest["entries"][key] = {
+                    "size": size,
+                    "last_access": time.time(),
+                }
+                self._changed_entries.add(key)
+                self._removed_entries.discard(key)
+                self._write_manifest()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def flush(self):
+        """Write access times not yet in the manifest."""
+        with self._lock:
+            if self._changed_entries or self._removed_entries or self._changed_urls:
+                self._write_manifest()
+
+    async def lookup_url_async(self, url: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.lookup_url, url)
+
+    async def remember_url_async(
+        self,
+        url: str,
+        content_hash: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        await asyncio.to_thread(
+            self.remember_url, url, content_hash, etag, last_modified
+        )
+
+    async def get_async(self, content_hash: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.get, content_hash)
+
+    async def put_async(
+        self, content_hash: str, text: str, chunks: List[Dict], embeddings: np.ndarray
+    ):
+        await asyncio.to_thread(self.put, content_hash, text, chunks, embeddings)
+
+    async def flush_async(self):
+        await asyncio.to_thread(self.flush)
+
+    def _entry_key(self, content_hash: str) -> str:
+        return f"{content_hash}-{self.fingerprint}"
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its budget."""
+        entries = self._manifest["entries"]
+        total = sum(entry["size"] for entry in entries.values())
+
+        for key in sorted(entries, key=lambda k: entries[k]["last_access"]):
+            if total <= self.max_size:
+                break
+            total -= entries[key]["size"]
+            self._remove_entry(key)
+
+    def _remove_entry(self, key: str):
+        self._manifest["entries"].pop(key, None)
+        self._changed_entries.discard(key)
+        self._removed_entries.add(key)
+        shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+
+        # Forget URLs that pointed at the removed entry
+        self._manifest["urls"] = {
+            url: known
+            for url, known in self._manifest["urls"].items()
+            if self._entry_key(known["content_hash"]) != key
+        }
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(self._manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if "urls" in manifest and "entries" in manifest:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"urls": {}, "entries": {}}
+
+    def _write_manifest(self):
+        """
+        Merge this process's changes into the manifest on disk, evict down
+        to the size budget and write the result.
+        """
+        with open(self._manifest_lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._manifest = self._merge(self._read_manifest())
+                self._evict()
+
+                tmp_path = f"{self._manifest_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self._manifest, f)
+                os.replace(tmp_path, self._manifest_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        self._changed_entries.clear()
+        self._removed_entries.clear()
+        self._changed_urls.clear()
+        self._written_at = time.monotonic()
+
+    def _merge(self, on_disk: Dict) -> Dict:
+        """Apply this process's changes on top of another's manifest."""
+        entries = on_disk["entries"]
+        for key in self._removed_entries:
+            entries.pop(key, None)
+        for key in self._changed_entries:
+            ours = self._manifest["entries"].get(key)
+            if ours is None:
+                continue
+            theirs = entries.get(key)
+            if theirs is not None and theirs["last_access"] > ours["last_access"]:
+                ours = dict(ours, last_access=theirs["last_access"])
+            entries[key] = ours
+
+        urls = on_disk["urls"]
+        for url in self._changed_urls:
+            if url in self._manifest["urls"]:
+                urls[url] = self._manifest["urls"][url]
+        if self._removed_entries:
+            urls = {
+                url: known
+                for url, known in urls.items()
+                if self._entry_key(known["content_hash"]) not in self._removed_entries
+            }
+
+        return {"urls": urls, "entries": entries}
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+from app.core.config import settings
+
+
+class EmbeddingService:
+    """
+    Shared sentence embedding model.
+
+    ``embedding_backend`` selects plain torch, torch int8 dynamic quantization,
+    or an ONNX Runtime export (fp32 or int8) of the same model.
+
+    Embeddings are normalized once at encode time. Query embeddings are kept in
+    an LRU cache keyed by a hash of the text, and concurrent async query
+    lookups arriving within ``embedding_coalesce_ms`` share one encode batch.
+
+    One instance is shared by every request and worker thread. Encodes are
+    serialized because Hugging Face fast tokenizers raise "Already borrowed"
+    when used from two threads at once; the model already parallelizes each
+    batch across ``embedding_threads``.
+    """
+
+    def __init__(self):
+        if settings.embedding_threads:
+            torch.set_num_threads(settings.embedding_threads)
+
+        try:
+            print(f"Loading embedding model: {settings.embedding_model}")
+            self.model = SentenceTransformer(settings.embedding_model)
+            print("Embedding model loaded successfully")
+        except Exception as e:
+            print(f"Error loading embedding model: {e}")
+            raise
+
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self._encode = self._create_encoder(settings.embedding_backend)
+        self.batch_size = settings.embedding_batch_size
+        self.coalesce_delay = settings.embedding_coalesce_ms / 1000
+
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def warm_up(self):
+        """Run one encode so the first real request doesn't pay for lazy init."""
+        self.embed(["warm up"])
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in batches, returning normalized float32 vectors."""
+        with self._encode_lock:
+            embeddings = self._encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        return embeddings.astype("float32", copy=False)
+
+    def _create_encoder(self, backend: str):
+        """Return the encode function for the configured backend."""
+        if backend == "torch":
+            return self.model.encode
+
+        if backend == "torch-int8":
+            torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+            return self.model.encode
+
+        if backend in ("onnx", "onnx-int8"):
+            # Imported here so only these backends need onnxruntime and onnx
+            from app.services.onnx_encoder import OnnxEncoder
+
+            return OnnxEncoder(self.model, quantize=backend == "onnx-int8").encode
+
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    async def embed_async(self, texts: List[str]) -> np.ndarray:
+        """Embed texts on a worker thread so the event loop stays responsive."""
+        return await asyncio.to_thread(self.embed, texts)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        key = self._cache_key(text)
+        embedding = self._cache_get(key)
+        if embedding is None:
+            embedding = self.embed([text])[0]
+            self._cache_put(key, embedding)
+        return embedding
+
+    async def embed_query_async(self, text: str) -> np.ndarray:
+        key = self._cache_key(text)
+        embedding = self._cache_get(key)
+        if embedding is not None:
+            return embedding
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((key, text, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_queries())
+
+        return await future
+
+    async def embed_queries_async(self, texts: List[str]) -> np.ndarray:
+        """Embed many queries, encoding every cache miss in one batch."""
+        keys = [self._cache_key(text) for text in texts]
+        embeddings = [self._cache_get(key) for key in keys]
+
+        missing = dict(
+            (key, text)
+            for key, text, embedding in zip(keys, texts, embeddings)
+            if embedding is None
+        )
+        if missing:
+            encoded = dict(
+                zip(missing, await self.embed_async(list(missing.values())))
+            )
+            for key, embedding in encoded.items():
+                self._cache_put(key, embedding)
+            embeddings = [
+                encoded[key] if embedding is None else embedding
+                for key, embedding in zip(keys, embeddings)
+            ]
+
+        return np.stack(embeddings)
+
+    async def _flush_queries(self):
+        """Encode every query that arrived during the coalescing window."""
+        await asyncio.sleep(self.coalesce_delay)
+        batch, self._pending = self._pending, []
+        self._flush_task = None
+
+        texts = dict((key, text) for key, text, _ in batch)
+        try:
+            embeddings = await self.embed_async(list(texts.values()))
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_key = dict(zip(texts, embeddings))
+        for key, embedding in by_key.items():
+            self._cache_put(key, embedding)
+        for key, _, future in batch:
+            if not future.done():
+                future.set_result(by_key[key])
+
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+            return embedding
+
+    def _cache_put(self, key: str, embedding: np.ndarray):
+        # Cached vectors are shared between callers
+        embedding.setflags(write=False)
+        with self._cache_lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > settings.embedding_query_cache_size:
+                self._cache.popitem(last=False)
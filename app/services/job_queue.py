@@ -0,0 +1,418 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from app.core.celery_app import celery_app
+from app.core.config import settings
+
+ACTIVE_STATUSES = ("pending", "processing")
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobQueue:
+    """
+    In-process job queue with a bounded job store.
+
+    At most ``job_queue_max_size`` submitted jobs wait in the queue, and
+    ``job_workers`` asyncio workers run them. Finished jobs are kept for
+    ``job_ttl_seconds``; beyond ``job_max_records`` the oldest finished jobs
+    are dropped early.
+    """
+
+    def __init__(self):
+        self.max_queued = settings.job_queue_max_size
+        self.ttl = settings.job_ttl_seconds
+        self.max_records = settings.job_max_records
+
+        self._jobs: Dict[str, Dict] = {}
+        # job ID -> expiry, in finishing order (and so in expiry order)
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._queued: set = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self, runner: Callable[[Dict], Awaitable[None]]):
+        """Start the workers; ``runner`` is called with each dequeued job."""
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._work(runner))
+            for _ in range(settings.job_workers)
+        ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def close(self):
+        pass
+
+    async def submit(self, kind: str, payload: Dict) -> Dict:
+        """
+        Queue a job.
+
+        Raises:
+            QueueFullError: When ``job_queue_max_size`` jobs are already waiting
+        """
+        self._evict()
+        if len(self._queued) >= self.max_queued:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} jobs waiting)")
+
+        job = _new_job(kind, payload, "pending")
+        self._jobs[job["job_id"]] = job
+        self._queued.add(job["job_id"])
+        self._queue.put_nowait(job["job_id"])
+        return dict(job)
+
+    async def create(self, kind: str, payload: Dict) -> Dict:
+        """Record a job the caller runs itself, without queueing it."""
+        self._evict()
+        job = _new_job(kind, payload, "processing")
+        self._jobs[job["job_id"]] = job
+        return dict(job)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        self._evict()
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return dict(job, confidence_notes=dict(job["confidence_notes"]))
+
+    async def start_job(self, job_id: str, redelivered: bool = False) -> bool:
+        """
+        Mark a queued job as processing.
+
+        Args:
+            job_id: The job to start
+            redelivered: The job was handed out before, to a worker that
+                died mid-run, so it may already be processing
+
+        Returns:
+            False if the job was cancelled or has finished
+        """
+        self._queued.discard(job_id)
+        return self._transition(job_id, _startable(redelivered), status="processing")
+
+    async def complete(self, job_id: str, result: Dict):
+        self._transition(
+            job_id, ACTIVE_STATUSES, status="completed", result=result, **_finished()
+        )
+
+    async def fail(self, job_id: str, error: str):
+        self._transition(
+            job_id, ACTIVE_STATUSES, status="failed", error=error, **_finished()
+        )
+
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        """
+        Cancel a pending or running job.
+
+        Returns:
+            The job record, or None if the job is unknown. A job that had
+            already finished keeps its status.
+        """
+        self._queued.discard(job_id)
+        self._transition(job_id, ACTIVE_STATUSES, status="cancelled", **_finished())
+        return await self.get(job_id)
+
+    async def is_cancelled(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        return job is None or job["status"] == "cancelled"
+
+    async def attach_confidence_note(
+        self, job_id: str, confidence_note: str, position: int = 0
+    ):
+        """Record a deferred validation result; ``position`` indexes batch queries."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job["confidence_notes"][position] = confidence_note
+
+    def _transition(self, job_id: str, from_statuses, **fields) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] not in from_statuses:
+            return False
+        job.update(fields)
+        if job["status"] not in ACTIVE_STATUSES:
+            self._finished[job_id] = time.time() + self.ttl
+        return True
+
+    def _evict(self):
+        """Drop expired finished jobs, then the oldest beyond the record cap."""
+        now = time.time()
+        while self._finished:
+            job_id, expires_at = next(iter(self._finished.items()))
+            if expires_at > now and len(self._jobs) <= self.max_records:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+
+    async def _work(self, runner: Callable[[Dict], Awaitable[None]]):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "pending":
+                continue
+            try:
+                await runner(dict(job))
+            except Exception as e:
+                print(f"Error running job {job_id}: {e}")
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Job queue shared through Redis and run by Celery workers (``app.worker``).
+
+    Job records are Redis hashes that expire ``job_ttl_seconds`` after their
+    last update. Status changes are compare-and-set, so a worker can never
+    resurrect a cancelled job. A sorted set tracks queued jobs for
+    backpressure.
+    """
+
+    PREFIX = "jobs"
+
+    # Set fields only if the job's status is one of ARGV[1] (space separated)
+    TRANSITION_SCRIPT = """
+        local status = redis.call('HGET', KEYS[1], 'status')
+        if not status or not string.find(' ' .. ARGV[1] .. ' ', ' ' .. status .. ' ', 1, true) then
+            return 0
+        end
+        redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+        return 1
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None):
+        super().__init__()
+        self.client = client or redis.Redis.from_url(
+            settings.redis_url, decode_responses=True
+        )
+        self._transition_script = self.client.register_script(self.TRANSITION_SCRIPT)
+        self._queued_key = f"{self.PREFIX}:queued"
+
+    def start(self, runner: Callable[[Dict], Awaitable[None]]):
+        """Jobs run in Celery worker processes, not in this process."""
+
+    async def stop(self):
+        pass
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def submit(self, kind: str, payload: Dict) -> Dict:
+        now = time.time()
+        job = _new_job(kind, payload, "pending")
+        job_id = job["job_id"]
+
+        # Forget queue entries whose worker never picked them up
+        await self.client.zremrangebyscore(self._queued_key, 0, now - self.ttl)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zadd(self._queued_key, {job_id: now})
+            pipe.zcard(self._queued_key)
+            queued = (await pipe.execute())[-1]
+        if queued > self.max_queued:
+            await self.client.zrem(self._queued_key, job_id)
+            raise QueueFullError(f"Job queue is full ({self.max_queued} jobs waiting)")
+
+        await self._save(job)
+        # Publishing blocks on the broker connection
+        await asyncio.to_thread(
+            celery_app.send_task, "run_job", args=[job_id], task_id=job_id
+        )
+        return job
+
+    async def create(self, kind: str, payload: Dict) -> Dict:
+        job = _new_job(kind, payload, "processing")
+        await self._save(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._job_key(job_id))
+            pipe.hgetall(self._notes_key(job_id))
+            fields, notes = await pipe.execute()
+        if not fields:
+            return None
+
+        job = {
+            "job_id": fields["job_id"],
+            "kind": fields["kind"],
+            "status": fields["status"],
+            "created_at": fields["created_at"],
+            "completed_at": fields.get("completed_at"),
+            "payload": json.loads(fields["payload"]),
+            "result": json.loads(fields["result"]) if "result" in fields else None,
+            "error": fields.get("error"),
+            "confidence_notes": {int(position): note for position, note in notes.items()},
+        }
+        return job
+
+    async def start_job(self, job_id: str, redelivered: bool = False) -> bool:
+        await self.client.zrem(self._queued_key, job_id)
+        return await self._transition(
+            job_id, _startable(redelivered), status="processing"
+        )
+
+    async def complete(self, job_id: str, result: Dict):
+        await self._transition(
+            job_id,
+            ACTIVE_STATUSES,
+            status="completed",
+            result=json.dumps(result),
+            **_finished(),
+        )
+
+    async def fail(self, job_id: str, error: str):
+        await self._transition(
+            job_id, ACTIVE_STATUSES, status="failed", error=error, **_finished()
+        )
+
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        await self.client.zrem(self._queued_key, job_id)
+        await self._transition(
+            job_id, ACTIVE_STATUSES, status="cancelled", **_finished()
+        )
+        return await self.get(job_id)
+
+    async def is_cancelled(self, job_id: str) -> bool:
+        status = await self.client.hget(self._job_key(job_id), "status")
+        return status is None or status == "cancelled"
+
+    async def attach_confidence_note(
+        self, job_id: str, confidence_note: str, position: int = 0
+    ):
+        notes_key = self._notes_key(job_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hset(notes_key, str(position), confidence_note)
+            pipe.expire(notes_key, self.ttl)
+            await pipe.execute()
+
+    async def _save(self, job: Dict):
+        fields = {
+            "job_id": job["job_id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "payload": json.dumps(job["payload"]),
+        }
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job["job_id"]), mapping=fields)
+            pipe.expire(self._job_key(job["job_id"]), self.ttl)
+            await pipe.execute()
+
+    async def _transition(self, job_id: str, from_statuses, **fields) -> bool:
+        args = [" ".join(from_statuses), self.ttl]
+        for name, value in fields.items():
+            args.extend([name, value])
+        return bool(
+            await self._transition_script(keys=[self._job_key(job_id)], args=args)
+        )
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.PREFIX}:{job_id}"
+
+    def _notes_key(self, job_id: str) -> str:
+        return f"{self.PREFIX}:{job_id}:notes"
+
+
+def _new_job(kind: str, payload: Dict, status: str) -> Dict:
+    return {
+        "job_id": str(uuid.uuid4()),
+        "kind": kind,
+        "status": status,
+        "created_at": datetime.now().isoformat(),
+        "completed_at": None,
+        "payload": payload,
+        "result": None,
+        "error": None,
+        "confidence_notes": {},
+    }
+
+
+def _finished() -> Dict:
+    return {"completed_at": datetime.now().isoformat()}
+
+
+def _startable(redelivered: bool) -> Tuple[str, ...]:
+    """Statuses a job may be started from."""
+    return ACTIVE_STATUSES if redelivered else ("pending",)
+
+
+def create_job_queue() -> JobQueue:
+    """Create the job queue for the configured backend."""
+    if settings.job_backend == "memory":
+        return JobQueue()
+    if settings.job_backend == "redis":
+        return RedisJobQueue()
+    raise ValueError(f"Unknown job backend: {settings.job_backend}")
+
+
+async def run_job(
+    job_queue: JobQueue, query_processor, job: Dict, redelivered: bool = False
+):
+    """
+    Run a queued job with ``query_processor`` and record its outcome.
+
+    The job record is polled while the job runs, so cancelling it from any
+    process stops the work. A job interrupted by shutdown is marked failed
+    rather than left processing.
+    """
+    job_id = job["job_id"]
+    if not await job_queue.start_job(job_id, redelivered):
+        return
+
+    payload = job["payload"]
+    deferred = payload["validation"] == "deferred"
+
+    if job["kind"] == "batch":
+
+        async def attach(position: int, confidence_note: str):
+            await job_queue.attach_confidence_note(job_id, confidence_note, position)
+
+        work = query_processor.process_queries(
+            queries=payload["queries"],
+            document_urls=payload["document_urls"],
+            validation=payload["validation"],
+            on_validated=attach if deferred else None,
+        )
+    else:
+
+        async def attach(confidence_note: str):
+            await job_queue.attach_confidence_note(job_id, confidence_note)
+
+        work = query_processor.process_query(
+            query=payload["query"],
+            document_urls=payload["document_urls"],
+            validation=payload["validation"],
+            on_validated=attach if deferred else None,
+        )
+
+    task = asyncio.create_task(work)
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=settings.job_cancel_poll_seconds)
+            if not task.done() and await job_queue.is_cancelled(job_id):
+                print(f"Cancelling job {job_id}")
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                return
+
+        await job_queue.complete(job_id, task.result())
+
+    except Exception as e:
+        await job_queue.fail(job_id, str(e))
+
+    finally:
+        if not task.done():
+            task.cancel()
+        # A no-op once the job has finished; otherwise it was interrupted,
+        # e.g. by shutdown, and would be left processing
+        await job_queue.fail(job_id, "Interrupted before the job finished")
@@ -0,0 +1,278 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from app.core.config import settings
+
+# Words plus dotted, dashed or slashed codes such as "4.2.1", "HO-3" or "n/a"
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-/]\w+)*")
+
+
+# Function words that match nearly every chunk; a query made of them alone
+# would otherwise fill the results with unrelated chunks
+STOPWORDS = frozenset(
+    """
+    a about above after again against all am an and any are as at be because
+    been before being below between both but by can could did do does doing
+    down during each few for from further had has have having he her here hers
+    him his how i if in into is it its itself just me more most my no nor not
+    of off on once only or other our ours out over own same she should so some
+    such than that the their theirs them then there these they this those
+    through to too under until up very was we were what when where which while
+    who whom why will with would you your yours
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def terms(text: str) -> List[str]:
+    """Tokens that are indexed and searched by BM25: all but stopwords."""
+    return [token for token in tokenize(text) if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk text, keyed by the vector store's chunk IDs.
+    Stopwords are neither indexed nor searched.
+
+    A saved index is stored as compressed sparse rows: a sorted vocabulary,
+    an offsets array per term and flat chunk ID and term frequency arrays,
+    opened through mmap. Postings of documents added since the last save
+    are kept as small per-document arrays, merged per term the first time a
+    query touches it. Removed chunks get a length of -1 and their postings
+    are skipped until the next save compacts them away.
+    """
+
+    def __init__(self):
+        self._vocabulary: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype="int64")
+        self._ids = np.empty(0, dtype="int64")
+        self._tfs = np.empty(0, dtype="int32")
+        # term -> [(chunk IDs, term frequencies)] added since the last save
+        self._pending: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+
+        # Token count per chunk ID, -1 for IDs not (or no longer) indexed
+        self._lengths = np.empty(0, dtype="int32")
+        self._count = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @staticmethod
+    def analyze(chunks: Sequence[Dict]) -> Dict:
+        """
+        Tokenize a document's chunks into postings by chunk position.
+
+        Needs no index state, so it can run before taking the store's lock.
+        """
+        lengths = np.empty(len(chunks), dtype="int32")
+        positions: Dict[str, Tuple[List[int], List[int]]] = {}
+        for position, chunk in enumerate(chunks):
+            tokens = terms(chunk["text"])
+            lengths[position] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                entry = positions.get(term)
+                if entry is None:
+                    positions[term] = ([position], [tf])
+                else:
+                    entry[0].append(position)
+                    entry[1].append(tf)
+
+        return {
+            "lengths": lengths,
+            "postings": {
+                term: (np.array(chunk_positions, dtype="int64"), np.array(tfs, dtype="int32"))
+                for term, (chunk_positions, tfs) in positions.items()
+            },
+        }
+
+    def add(self, ids: np.ndarray, analyzed: Dict):
+        """Index analyzed chunks under the contiguous chunk IDs ``ids``."""
+        if not len(ids):
+            return
+        first = int(ids[0])
+
+        needed = int(ids[-1]) + 1
+        if needed > len(self._lengths):
+            lengths = np.full(max(needed, 2 * len(self._lengths)), -1, dtype="int32")
+            lengths[: len(self._lengths)] = self._lengths
+            self._lengths = lengths
+        self._lengths[ids] = analyzed["lengths"]
+        self._count += len(ids)
+        self._total_length += int(analyzed["lengths"].sum())
+
+        for term, (positions, tfs) in analyzed["postings"].items():
+            self._pending.setdefault(term, []).append((positions + first, tfs))
+
+    def remove(self, ids: Iterable[int]):
+        ids = np.asarray(list(ids), dtype="int64")
+        ids = ids[ids < len(self._lengths)]
+        live = ids[self._lengths[ids] >= 0]
+        self._count -= len(live)
+        self._total_length -= int(self._lengths[live].sum())
+        self._lengths[live] = -1
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        id_ranges: Optional[Sequence[Tuple[int, int]]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rank chunks by BM25 against the query.
+
+        Args:
+            query: The search text
+            top_k: Maximum number of chunks to return
+            id_ranges: Restrict results to these ``(first, count)`` chunk ID
+                ranges; all chunks are searched when None
+
+        Returns:
+            Tuple of chunk IDs and their BM25 scores, best first. Term
+            statistics always cover the whole index.
+        """
+        if not self._count:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+
+        k1, b = settings.bm25_k1, settings.bm25_b
+        average_length = self._total_length / self._count
+
+        matched_ids = []
+        matched_scores = []
+        for term in set(terms(query)):
+            ids, tfs = self._postings(term)
+            if not len(ids):
+                continue
+            lengths = self._lengths[ids]
+            live = lengths >= 0
+            df = int(live.sum())
+            if not df:
+                continue
+
+            keep = live
+            if id_ranges is not None:
+                in_range = np.zeros(len(ids), dtype=bool)
+                for first, count in id_ranges:
+                    in_range |= (ids >= first) & (ids < first + count)
+                keep = keep & in_range
+            ids, tfs, lengths = ids[keep], tfs[keep], lengths[keep]
+            if not len(ids):
+                continue
+
+            idf = math.log(1 + (self._count - df + 0.5) / (df + 0.5))
+            tfs = tfs.astype("float32")
+            matched_ids.append(ids)
+            matched_scores.append(
+                idf * tfs * (k1 + 1)
+                / (tfs + k1 * (1 - b + b * lengths / average_length))
+            )
+
+        if not matched_ids:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+
+        ids = np.concatenate(matched_ids)
+        weights = np.concatenate(matched_scores)
+        if len(ids) * 8 > len(self._lengths):
+            # Common terms: summing into a slot per chunk beats sorting
+            scores = np.bincount(ids, weights=weights, minlength=len(self._lengths))
+            ids = np.flatnonzero(scores)
+            scores = scores[ids]
+        else:
+            ids, inverse = np.unique(ids, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+        if len(ids) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return ids[order], scores[order].astype("float32")
+
+    def save(self, path: str):
+        """Write a compacted copy of the index to ``path``."""
+        os.makedirs(path, exist_ok=True)
+
+        terms = sorted(set(self._vocabulary) | set(self._pending))
+        vocabulary = []
+        counts = []
+        ids_parts = []
+        tfs_parts = []
+        for term in terms:
+            ids, tfs = self._postings(term)
+            live = self._lengths[ids] >= 0
+            if not live.any():
+                continue
+            vocabulary.append(term)
+            counts.append(int(live.sum()))
+            ids_parts.append(ids[live])
+            tfs_parts.append(tfs[live])
+
+        offsets = np.zeros(len(vocabulary) + 1, dtype="int64")
+        np.cumsum(np.array(counts, dtype="int64"), out=offsets[1:])
+        arrays = {
+            "offsets": offsets,
+            "ids": np.concatenate([np.empty(0, dtype="int64")] + ids_parts),
+            "tfs": np.concatenate([np.empty(0, dtype="int32")] + tfs_parts),
+            "lengths": np.asarray(self._lengths),
+        }
+        for name, values in arrays.items():
+            with open(os.path.join(path, f"{name}.npy.tmp"), "wb") as f:
+                np.save(f, values)
+        with open(os.path.join(path, "vocabulary.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(vocabulary, f)
+
+        # Replace files atomically; existing mmaps keep the old inodes alive
+        for name in ["vocabulary.json"] + [f"{name}.npy" for name in arrays]:
+            os.replace(os.path.join(path, f"{name}.tmp"), os.path.join(path, name))
+
+    @classmethod
+    def open(cls, path: str) -> "LexicalIndex":
+        """Open a saved index, mapping the postings instead of reading them."""
+        index = cls()
+
+        with open(os.path.join(path, "vocabulary.json"), encoding="utf-8") as f:
+            index._vocabulary = {term: i for i, term in enumerate(json.load(f))}
+        index._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        index._ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        index._tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+
+        # Lengths change on every add and remove, so they live in memory
+        index._lengths = np.load(os.path.join(path, "lengths.npy"))
+        indexed = index._lengths[index._lengths >= 0]
+        index._count = len(indexed)
+        index._total_length = int(indexed.sum())
+
+        return index
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """All postings of a term, saved and pending, live or not."""
+        parts = []
+        term_id = self._vocabulary.get(term)
+        if term_id is not None:
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            parts.append((self._ids[start:end], self._tfs[start:end]))
+
+        pending = self._pending.get(term)
+        if pending:
+            if len(pending) > 1:
+                pending[:] = [
+                    (
+                        np.concatenate([ids for ids, _ in pending]),
+                        np.concatenate([tfs for _, tfs in pending]),
+                    )
+                ]
+            parts.extend(pending)
+
+        if not parts:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="int32")
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([ids for ids, _ in parts]), np.concatenate(
+            [tfs for _, tfs in parts]
+        )
@@ -0,0 +1,376 @@
+import asyncio
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from app.core import telemetry
+from app.core.config import settings
+from app.core.http import create_llm_http_client
+
+# Statuses worth another attempt: timeouts, conflicts, rate limits, server errors
+RETRYABLE_STATUSES = {408, 409, 429}
+
+
+class LLMError(Exception):
+    """Raised when a completion fails on every endpoint it may be sent to."""
+
+    def __init__(self, message: str, retryable: bool = False, status_code: int = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """
+    Requests-per-second limiter: ``rate`` tokens a second, up to ``burst``.
+
+    ``defer`` holds every caller back until a time the server asked for,
+    such as a 429's Retry-After. A rate of 0 only honours deferrals.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.not_before = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.not_before:
+                    await asyncio.sleep(self.not_before - now)
+                    continue
+                if self.rate <= 0:
+                    return
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def defer(self, seconds: float):
+        self.not_before = max(self.not_before, time.monotonic() + seconds)
+
+
+class Endpoint:
+    """One OpenAI-compatible server and model, and the operations it serves."""
+
+    def __init__(
+        self,
+        name: str,
+        client: AsyncOpenAI,
+        model: str,
+        operations: Optional[List[str]] = None,
+        rate_limit_rps: float = 0,
+        rate_limit_burst: int = 1,
+    ):
+        self.name = name
+        self.client = client
+        self.model = model
+        # None serves every operation
+        self.operations = set(operations) if operations else None
+        self.bucket = TokenBucket(rate_limit_rps, rate_limit_burst)
+        # operation -> recent latencies of successful calls, for hedging
+        self.latencies: Dict[str, Deque[float]] = {}
+
+    def latency_quantile(self, operation: str, quantile: float) -> Optional[float]:
+        samples = self.latencies.get(operation)
+        if not samples or len(samples) < settings.llm_hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+    def record_latency(self, operation: str, seconds: float):
+        self.latencies.setdefault(operation, deque(maxlen=200)).append(seconds)
+
+
+class LLMGateway:
+    """
+    Routes chat completions across OpenAI-compatible endpoints.
+
+    Endpoints come from ``llm_endpoints``, or default to the ``openai_*``
+    settings (plus ``llm_validation_model`` for validations). All of them
+    share one pooled HTTP client. Each call:
+
+    - waits for its endpoint's token bucket
+    - retries timeouts, connection errors, 408/409/429 and 5xx with
+      jittered exponential backoff, or after the server's Retry-After
+    - is hedged: once it outlasts the endpoint's ``llm_hedge_quantile``
+      latency for that operation, a second copy goes to the next endpoint
+      (or the same one) and the first answer wins
+    - falls back to the operation's next endpoint once one gives up
+
+    Endpoints listing an operation are preferred over ones serving all.
+    """
+
+    def __init__(self, endpoints: Optional[List[Dict]] = None):
+        self.http_client = create_llm_http_client()
+        configs = endpoints if endpoints is not None else self._configured_endpoints()
+        self.endpoints = [self._endpoint(number, config) for number, config in enumerate(configs)]
+
+    @staticmethod
+    def _configured_endpoints() -> List[Dict]:
+        if settings.llm_endpoints:
+            return settings.llm_endpoints
+        endpoints = [{"name": "default"}]
+        if settings.llm_validation_model:
+            endpoints.append(
+                {
+                    "name": "validation",
+                    "model": settings.llm_validation_model,
+                    "operations": ["validate"],
+                }
+            )
+        return endpoints
+
+    def _endpoint(self, number: int, config: Dict) -> Endpoint:
+        name = config.get("name") or f"endpoint-{number}"
+        api_key = config.get("api_key") or settings.openai_api_key
+        if not api_key:
+            raise ValueError(f"OpenAI API key not configured for LLM endpoint {name}")
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=config.get("base_url") or settings.openai_base_url,
+            http_client=self.http_client,
+            # Retries are the gateway's, so they can move to another endpoint
+            max_retries=0,
+            timeout=httpx.Timeout(
+                settings.llm_timeout_seconds, connect=settings.llm_connect_timeout_seconds
+            ),
+        )
+        return Endpoint(
+            name,
+            client,
+            config.get("model") or settings.openai_model,
+            operations=config.get("operations"),
+            rate_limit_rps=config.get("rate_limit_rps", settings.llm_rate_limit_rps),
+            rate_limit_burst=config.get("rate_limit_burst", settings.llm_rate_limit_burst),
+        )
+
+    def route(self, operation: str) -> List[Endpoint]:
+        """Endpoints for an operation, in the order they are tried."""
+        listed = [e for e in self.endpoints if e.operations and operation in e.operations]
+        catch_all = [e for e in self.endpoints if e.operations is None]
+        candidates = listed + catch_all
+        if not candidates:
+            raise LLMError(f"No LLM endpoint serves {operation!r}")
+        return candidates
+
+    async def complete(self, operation: str, **request):
+        """
+        Create a chat completion for ``operation`` ("answer" or "validate").
+
+        Args:
+            operation: Routes the call and keys its latency statistics
+            request: ``chat.completions.create`` arguments other than the model
+
+        Returns:
+            The completion response
+
+        Raises:
+            LLMError: If the request was rejected as invalid, or every
+                endpoint gave up on it
+        """
+        return (await self.complete_routed(operation, **request))[1]
+
+    async def complete_routed(self, operation: str, **request) -> Tuple[Endpoint, Any]:
+        """
+        Like ``complete``, also naming the endpoint that answered, which is
+        a fallback or hedge rather than the first route when that one failed
+        or ran slow.
+
+        Returns:
+            Tuple of the answering endpoint and the completion response
+        """
+        candidates = self.route(operation)
+        error = None
+        for position, endpoint in enumerate(candidates):
+            backup = candidates[position + 1] if position + 1 < len(candidates) else endpoint
+            try:
+                return await self._hedged(endpoint, backup, operation, request)
+            except LLMError as e:
+                if not e.retryable:
+                    raise
+                error = e
+                print(f"LLM endpoint {endpoint.name} gave up on {operation}: {e}")
+        raise error
+
+    async def stream(self, operation: str, **request):
+        """
+        Start a streamed chat completion, retrying and falling back until
+        the stream opens. Streams are never hedged.
+
+        Returns:
+            The ``AsyncStream`` of completion chunks
+        """
+        return (await self.stream_routed(operation, **request))[1]
+
+    async def stream_routed(self, operation: str, **request) -> Tuple[Endpoint, Any]:
+        """
+        Like ``stream``, also naming the endpoint that answered.
+
+        Returns:
+            Tuple of the answering endpoint and the ``AsyncStream``
+        """
+        error = None
+        for endpoint in self.route(operation):
+            try:
+                stream = await self._call(endpoint, operation, {**request, "stream": True})
+                return endpoint, stream
+            except LLMError as e:
+                if not e.retryable:
+                    raise
+                error = e
+                print(f"LLM endpoint {endpoint.name} gave up on {operation}: {e}")
+        raise error
+
+    async def close(self):
+        await self.http_client.aclose()
+
+    async def _hedged(
+        self, endpoint: Endpoint, backup: Endpoint, operation: str, request: Dict
+    ):
+        """
+        Call ``endpoint``, racing a copy on ``backup`` if it runs slow.
+
+        Returns:
+            Tuple of the endpoint whose call finished first and its response
+        """
+        delay = None
+        if settings.llm_hedge_quantile > 0:
+            delay = endpoint.latency_quantile(operation, settings.llm_hedge_quantile)
+        if delay is None:
+            return endpoint, await self._call(endpoint, operation, request)
+
+        # The deadline runs from when the request is sent, not from when it
+        # started waiting for the rate limiter
+        sent = asyncio.Event()
+        primary = asyncio.create_task(self._call(endpoint, operation, request, sent))
+        pending = {primary}
+        called = {primary: endpoint}
+        try:
+            waiting = asyncio.create_task(sent.wait())
+            await asyncio.wait({primary, waiting}, return_when=asyncio.FIRST_COMPLETED)
+            waiting.cancel()
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return endpoint, primary.result()
+
+            telemetry.LLM_HEDGES.inc(endpoint=backup.name, operation=operation)
+            hedge = asyncio.create_task(self._call(backup, operation, request))
+            pending.add(hedge)
+            called[hedge] = backup
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                # Read every outcome, so a losing failure isn't left unretrieved
+                outcomes = [(task, task.exception()) for task in done]
+                for task, exception in outcomes:
+                    if exception is None:
+                        return called[task], task.result()
+                    error = exception
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_discard_outcome)
+
+    async def _call(
+        self,
+        endpoint: Endpoint,
+        operation: str,
+        request: Dict,
+        sent: Optional[asyncio.Event] = None,
+    ):
+        """One endpoint, with retries; ``sent`` is set once a request goes out."""
+        for attempt in range(settings.llm_max_retries + 1):
+            await endpoint.bucket.acquire()
+            if sent is not None:
+                sent.set()
+            started = time.perf_counter()
+            try:
+                response = await endpoint.client.chat.completions.create(
+                    model=endpoint.model, **request
+                )
+            except openai.APIStatusError as e:
+                error = LLMError(
+                    f"{endpoint.name}: {e}",
+                    retryable=e.status_code in RETRYABLE_STATUSES or e.status_code >= 500,
+                    status_code=e.status_code,
+                )
+                delay = retry_after(e.response.headers)
+            except (openai.APIConnectionError, openai.APITimeoutError) as e:
+                error = LLMError(f"{endpoint.name}: {e}", retryable=True)
+                delay = None
+            else:
+                if not request.get("stream"):
+                    endpoint.record_latency(operation, time.perf_counter() - started)
+                telemetry.LLM_REQUESTS.inc(
+                    endpoint=endpoint.name, operation=operation, outcome="ok"
+                )
+                return response
+
+            if delay is None:
+                delay = min(
+                    settings.llm_backoff_max_seconds,
+                    settings.llm_backoff_base_seconds * 2**attempt,
+                ) * random.uniform(0.5, 1.0)
+            elif error.status_code == 429:
+                # Everyone on this endpoint waits, not just this call; the
+                # retries themselves spread out rather than return at once
+                endpoint.bucket.defer(delay)
+                delay *= random.uniform(1.0, 1.5)
+
+            if (
+                not error.retryable
+                or attempt == settings.llm_max_retries
+                or delay > settings.llm_backoff_max_seconds
+            ):
+                telemetry.LLM_REQUESTS.inc(
+                    endpoint=endpoint.name, operation=operation, outcome="error"
+                )
+                raise error
+            telemetry.LLM_REQUESTS.inc(
+                endpoint=endpoint.name, operation=operation, outcome="retry"
+            )
+            await asyncio.sleep(delay)
+
+
+def _discard_outcome(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()
+
+
+def retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Seconds to wait from ``retry-after-ms`` or ``Retry-After`` (seconds or a date)."""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
@@ -1,107 +1,283 @@
-from openai import AsyncOpenAI
-from typing import List, Dict, Optional
+import json
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from app.core import telemetry
 from app.core.config import settings
+from app.core.tokens import count_tokens
+from app.services.completion_cache import CompletionCache, completion_key
+from app.services.llm_gateway import Endpoint, LLMGateway
+
+# Prompts are built once, without indentation, and laid out for provider
+# prompt caching: what every call shares comes first (the instructions),
+# then the documents in a fixed order, and the question last
+ANSWER_SYSTEM_PROMPT = """You are a helpful assistant that answers questions based solely on the provided context.
+Your task is to answer the user's question using ONLY the information from the provided documents.
+
+Important rules:
+1. Only use information explicitly stated in the provided context
+2. If the answer cannot be found in the context, clearly state that
+3. Do not make assumptions or add information not present in the context
+4. Quote or reference specific parts of the context when possible
+5. Be concise but thorough in your answer"""
+
+ANSWER_PROMPT = """Context from documents:
+{context}
+
+Question: {query}
+
+Please answer the question based only on the provided context."""
+
+# Follows the question, so answers with and without a confidence note share
+# the same prefix
+CONFIDENCE_INSTRUCTIONS = """
+
+Respond with a JSON object with two keys: "answer", your answer to the question,
+and "confidence_note", a brief note on how well the context supports the answer
+and any limitations or missing information."""
+
+SOURCE_TEMPLATE = "[Source: {source}]\n{text}"
+SOURCE_SEPARATOR = "\n\n---\n\n"
+
+VALIDATION_SYSTEM_PROMPT = """You are a validation assistant. Your task is to check if an answer properly addresses a question based on the provided context.
+
+Evaluate:
+1. Does the answer directly address the question?
+2. Is the answer based on the provided context?
+3. Does the answer acknowledge any limitations or missing information?
+
+Provide a brief confidence note about the answer quality."""
+
+VALIDATION_PROMPT = """Question: {query}
+Answer: {answer}
+Context info: Used {chunks} chunks from documents"""
 
 
 class LLMService:
-    def __init__(self):
-        if not settings.openai_api_key:
-            raise ValueError("OpenAI API key not configured")
+    def __init__(self, gateway: Optional[LLMGateway] = None):
+        # Failed calls raise LLMError, after the gateway's retries and fallbacks
+        self.gateway = gateway or LLMGateway()
+        self.completion_cache = (
+            CompletionCache() if settings.completion_cache_enabled else None
+        )
 
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
-        self.model = settings.openai_model
+    @property
+    def model(self) -> str:
+        """Model of the endpoint answers go to first."""
+        return self.gateway.route("answer")[0].model
+
+    async def close(self):
+        await self.gateway.close()
 
     async def generate_answer(
         self, query: str, context_chunks: List[Dict]
     ) -> Dict[str, str]:
         """Generate an answer based on the query and context chunks."""
+        content, model = await self._complete(
+            "answer",
+            messages=self._answer_messages(query, context_chunks),
+            temperature=0.1,
+            max_tokens=1000,
+        )
 
-        # Prepare context from chunks
-        context_parts = []
-        for chunk in context_chunks:
-            source = chunk.get("document_name", "Unknown")
-            text = chunk["text"]
-            context_parts.append(f"[Source: {source}]\n{text}")
+        return {
+            "answer": content,
+            "model_used": model,
+            "chunks_used": len(context_chunks),
+        }
 
-        context = "\n\n---\n\n".join(context_parts)
+    async def stream_answer(
+        self, query: str, context_chunks: List[Dict]
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Generate an answer, yielding its text as the model produces it.
 
-        # Create the prompt
-        system_prompt = """You are a helpful assistant that answers questions based solely on the provided context. 
-                            Your task is to answer the user's question using ONLY the information from the provided documents.
+        Returns:
+            Iterator of ``(text, model)`` pairs, the model being the one that
+            wrote the text (a fallback's when the first endpoint failed)
+        """
+        messages = self._answer_messages(query, context_chunks)
+        request = {"messages": messages, "temperature": 0.1, "max_tokens": 1000}
+        # Same key as generate_answer, so either can reuse the other's answer
+        cached = self._cached("answer", request)
+        if cached is not None:
+            yield cached
+            return
 
-                            Important rules:
-                            1. Only use information explicitly stated in the provided context
-                            2. If the answer cannot be found in the context, clearly state that
-                            3. Do not make assumptions or add information not present in the context
-                            4. Quote or reference specific parts of the context when possible
-                            5. Be concise but thorough in your answer"""
+        output = []
+        endpoint, stream = await self.gateway.stream_routed("answer", **request)
+        model = endpoint.model
+        async with stream:
+            async for chunk in stream:
+                model = chunk.model or model
+                if chunk.choices and chunk.choices[0].delta.content:
+                    output.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content, model
+        if not output:
+            # An empty answer still names its model
+            yield "", model
+        self._cache_completion("answer", endpoint, request, "".join(output), model)
 
-        user_prompt = f"""Context from documents:
-                            {context}
+        # Streamed responses carry no usage, so count the tokens locally
+        if telemetry.enabled():
+            prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+            completion_tokens = count_tokens("".join(output))
+            telemetry.LLM_TOKENS.inc(prompt_tokens, operation="answer", direction="input")
+            telemetry.LLM_TOKENS.inc(
+                completion_tokens, operation="answer", direction="output"
+            )
+            print(
+                f"LLM answer (streamed): {prompt_tokens} prompt tokens, "
+                f"{completion_tokens} completion tokens"
+            )
 
-                            Question: {query}
+    async def generate_answer_with_confidence(
+        self, query: str, context_chunks: List[Dict]
+    ) -> Dict[str, str]:
+        """
+        Generate an answer and its confidence note in a single call.
 
-                            Please answer the question based only on the provided context."""
+        Returns:
+            Dictionary like ``generate_answer`` plus ``confidence_note``
+        """
+        messages = self._answer_messages(query, context_chunks)
+        messages[-1]["content"] += CONFIDENCE_INSTRUCTIONS
+
+        content, model = await self._complete(
+            "answer",
+            messages=messages,
+            temperature=0.1,
+            max_tokens=1200,
+            response_format={"type": "json_object"},
+        )
 
         try:
-            # Call OpenAI API
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.1,
-                max_tokens=1000,
-            )
+            parsed = json.loads(content)
+            answer = str(parsed["answer"])
+            confidence_note = parsed.get("confidence_note")
+        except (ValueError, KeyError, TypeError):
+            answer, confidence_note = content, None
 
-            answer = response.choices[0].message.content
+        return {
+            "answer": answer,
+            "confidence_note": confidence_note,
+            "model_used": model,
+            "chunks_used": len(context_chunks),
+        }
 
-            return {
-                "answer": answer,
-                "model_used": self.model,
-                "chunks_used": len(context_chunks),
-            }
+    async def _complete(self, operation: str, **request) -> Tuple[str, str]:
+        """
+        One completion through the gateway, or from the completion cache
+        when the identical request was answered before.
 
-        except Exception as e:
-            raise ValueError(f"Error generating answer: {str(e)}")
+        Returns:
+            Tuple of the completion text and the model that wrote it
+        """
+        cached = self._cached(operation, request)
+        if cached is not None:
+            return cached
 
-    async def validate_answer(
-        self, query: str, answer: str, context_chunks: List[Dict]
-    ) -> str:
-        """Validate if the answer properly addresses the query (Enhancement 1)."""
+        endpoint, response = await self.gateway.complete_routed(operation, **request)
+        self._record_usage(operation, response)
+        content = response.choices[0].message.content
+        if content is not None:
+            self._cache_completion(operation, endpoint, request, content, response.model)
+        return content, response.model
+
+    def _cached(self, operation: str, request: Dict) -> Optional[Tuple[str, str]]:
+        """The request's cached completion from the operation's first route, if any."""
+        if self.completion_cache is None:
+            return None
+        model = self.gateway.route(operation)[0].model
+        cached = self.completion_cache.get(completion_key(operation, model, request))
+        telemetry.LLM_COMPLETION_CACHE.inc(
+            operation=operation, outcome="miss" if cached is None else "hit"
+        )
+        return cached
 
-        # Prepare context summary
-        context_summary = f"Used {len(context_chunks)} chunks from documents"
+    def _cache_completion(
+        self,
+        operation: str,
+        endpoint: Endpoint,
+        request: Dict,
+        content: str,
+        model: str,
+    ):
+        """
+        Cache a completion under the model of the endpoint that wrote it,
+        so an answer from a fallback is never served as the first route's.
+        """
+        if self.completion_cache is None:
+            return
+        key = completion_key(operation, endpoint.model, request)
+        self.completion_cache.put(key, content, model)
 
-        validation_prompt = f"""You are a validation assistant. Your task is to check if an answer properly addresses a question based on the provided context.
+    @staticmethod
+    def _record_usage(operation: str, response):
+        """Count and log the tokens a completion reports having used."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        # Reported by providers with prompt caching; an object in newer SDKs,
+        # an extra field (a dict) in older ones
+        details = getattr(usage, "prompt_tokens_details", None)
+        if isinstance(details, dict):
+            cached_tokens = details.get("cached_tokens") or 0
+        else:
+            cached_tokens = getattr(details, "cached_tokens", None) or 0
 
-                                Question: {query}
-                                Answer: {answer}
-                                Context info: {context_summary}
+        telemetry.LLM_TOKENS.inc(
+            usage.prompt_tokens, operation=operation, direction="input"
+        )
+        telemetry.LLM_TOKENS.inc(
+            usage.completion_tokens, operation=operation, direction="output"
+        )
+        telemetry.LLM_CACHED_TOKENS.inc(cached_tokens, operation=operation)
+        print(
+            f"LLM {operation}: {usage.prompt_tokens} prompt tokens "
+            f"({cached_tokens} cached), {usage.completion_tokens} completion tokens"
+        )
 
-                                Evaluate:
-                                1. Does the answer directly address the question?
-                                2. Is the answer based on the provided context?
-                                3. Does the answer acknowledge any limitations or missing information?
+    @staticmethod
+    def _answer_messages(query: str, context_chunks: List[Dict]) -> List[Dict]:
+        """Build the chat messages asking for an answer grounded in the chunks."""
+        # Document order, not rank order: the same chunks always give the
+        # same prompt prefix, whatever the question ranked first
+        ordered = sorted(
+            context_chunks,
+            key=lambda chunk: (chunk.get("doc_id", ""), chunk.get("chunk_index", 0)),
+        )
+        context = SOURCE_SEPARATOR.join(
+            SOURCE_TEMPLATE.format(
+                source=chunk.get("document_name", "Unknown"), text=chunk["text"].strip()
+            )
+            for chunk in ordered
+        )
 
-                                Provide a brief confidence note about the answer quality."""
+        return [
+            {"role": "system", "content": ANSWER_SYSTEM_PROMPT},
+            {"role": "user", "content": ANSWER_PROMPT.format(context=context, query=query)},
+        ]
 
+    async def validate_answer(
+        self, query: str, answer: str, context_chunks: List[Dict]
+    ) -> str:
+        """Validate if the answer properly addresses the query (Enhancement 1)."""
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            content, _ = await self._complete(
+                "validate",
                 messages=[
+                    {"role": "system", "content": VALIDATION_SYSTEM_PROMPT},
                     {
-                        "role": "system",
-                        "content": "You are a helpful validation assistant.",
+                        "role": "user",
+                        "content": VALIDATION_PROMPT.format(
+                            query=query, answer=answer, chunks=len(context_chunks)
+                        ),
                     },
-                    {"role": "user", "content": validation_prompt},
                 ],
                 temperature=0.1,
                 max_tokens=200,
             )
-
-            return response.choices[0].message.content
+            return content
 
         except Exception as e:
+            print(f"Answer validation failed: {e}")
             return "Could not validate answer"
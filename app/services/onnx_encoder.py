@@ -0,0 +1,148 @@
+import os
+import re
+from typing import List
+
+import numpy as np
+import onnxruntime
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from sentence_transformers import SentenceTransformer
+from app.core.config import settings
+
+
+class _TokenEmbeddings(torch.nn.Module):
+    """Export wrapper returning only the transformer's last hidden state."""
+
+    def __init__(self, transformer: torch.nn.Module):
+        super().__init__()
+        self.transformer = transformer
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.transformer(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids,
+        )[0]
+
+
+class OnnxEncoder:
+    """
+    Runs a SentenceTransformer's transformer through ONNX Runtime.
+
+    The transformer is exported once (optionally with int8 dynamic
+    quantization) and cached on disk; tokenization, mean pooling and
+    normalization mirror the torch pipeline, so vectors stay compatible with
+    indexes built by the torch backend.
+    """
+
+    def __init__(self, model: SentenceTransformer, quantize: bool = False):
+        pooling = model[1].get_config_dict()
+        if not (
+            pooling.get("pooling_mode_mean_tokens")
+            or pooling.get("pooling_mode") == "mean"
+        ):
+            raise ValueError("The ONNX embedding backend supports mean pooling only")
+
+        self.tokenizer = model.tokenizer
+        self.max_seq_length = model.max_seq_length
+        self.dimension = model.get_sentence_embedding_dimension()
+
+        model_path = self._export(model, quantize)
+
+        options = onnxruntime.SessionOptions()
+        if settings.embedding_threads:
+            options.intra_op_num_threads = settings.embedding_threads
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        # Batch similar lengths together to minimise padding
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.dimension), dtype="float32")
+
+        for start in range(0, len(texts), batch_size):
+            rows = order[start : start + batch_size]
+            tokens = self.tokenizer(
+                [texts[row] for row in rows],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            mask = tokens["attention_mask"].astype("int64")
+            inputs = {
+                "input_ids": tokens["input_ids"].astype("int64"),
+                "attention_mask": mask,
+                "token_type_ids": tokens.get(
+                    "token_type_ids", np.zeros_like(mask)
+                ).astype("int64"),
+            }
+            hidden = self.session.run(None, inputs)[0]
+
+            # Mean pooling over non-padding tokens
+            weights = mask[:, :, None].astype("float32")
+            pooled = (hidden * weights).sum(axis=1) / np.clip(
+                weights.sum(axis=1), 1e-9, None
+            )
+            embeddings[rows] = pooled
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.clip(norms, 1e-12, None)
+
+        return embeddings
+
+    def _export(self, model: SentenceTransformer, quantize: bool) -> str:
+        """Export the transformer to ONNX unless a cached export exists."""
+        directory = os.path.join(settings.faiss_index_path, "models")
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", settings.embedding_model)
+        fp32_path = os.path.join(directory, f"{name}.onnx")
+        int8_path = os.path.join(directory, f"{name}.int8.onnx")
+
+        if not os.path.exists(fp32_path):
+            os.makedirs(directory, exist_ok=True)
+            print(f"Exporting {settings.embedding_model} to ONNX")
+
+            sample = self.tokenizer(["warm up"], return_tensors="pt")
+            mask = sample["attention_mask"]
+            args = (
+                sample["input_ids"],
+                mask,
+                sample.get("token_type_ids", torch.zeros_like(mask)),
+            )
+            names = ["input_ids", "attention_mask", "token_type_ids"]
+
+            wrapper = _TokenEmbeddings(model[0].auto_model).eval()
+            tmp_path = f"{fp32_path}.tmp"
+            with torch.no_grad():
+                torch.onnx.export(
+                    wrapper,
+                    args,
+                    tmp_path,
+                    input_names=names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes={
+                        name: {0: "batch", 1: "sequence"}
+                        for name in names + ["last_hidden_state"]
+                    },
+                    opset_version=14,
+                )
+            os.replace(tmp_path, fp32_path)
+
+        if not quantize:
+            return fp32_path
+
+        if not os.path.exists(int8_path):
+            print("Quantizing ONNX embedding model to int8")
+            tmp_path = f"{int8_path}.tmp"
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, int8_path)
+
+        return int8_path
@@ -1,22 +1,99 @@
+import asyncio
 import httpx
-import pdfplumber
-from typing import List, Dict
-import tempfile
+import io
+import multiprocessing
 import os
+import pdfplumber
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, contextmanager
+from itertools import islice
+from multiprocessing import shared_memory
+from PyPDF2 import PdfReader
+from typing import AsyncIterator, List, Dict, Optional, Tuple, Union
+from app.core import telemetry
 from app.core.config import settings
+from app.core.http import create_http_client
+
+# (page number, start offset, end offset) of a page's text in a document
+PageSpan = Tuple[int, int, int]
+
+# A PDF's bytes, or the name and size of a shared memory block holding them
+PDFSource = Union[bytes, Tuple[str, int]]
 
 
 class PDFProcessor:
-    def __init__(self):
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        executor: Optional[Executor] = None,
+        workers: Optional[int] = None,
+    ):
+        """
+        Args:
+            client: Pooled HTTP client for downloads; one per download if None
+            executor: Where extraction runs; the default thread pool if None
+            workers: Page ranges extracted in parallel per document, usually
+                the executor's worker count
+        """
         self.max_size = settings.max_pdf_size_mb * 1024 * 1024
         self.timeout = settings.pdf_download_timeout
+        self.client = client
+        self.executor = executor
+        self.workers = workers or 1
+        self.backend = settings.pdf_extraction_backend
+        self.download_semaphore = asyncio.Semaphore(settings.pdf_download_concurrency)
 
     async def download_pdf(self, url: str) -> bytes:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    url, timeout=self.timeout, follow_redirects=True
-                )
+        content, _ = await self.fetch_pdf(url)
+        return content
+
+    async def fetch_pdf(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> Tuple[Optional[bytes], Dict[str, Optional[str]]]:
+        """
+        Download a PDF, revalidating against previously seen validators.
+
+        Args:
+            url: The PDF URL
+            etag: ETag from an earlier download, sent as If-None-Match
+            last_modified: Last-Modified from an earlier download
+
+        Returns:
+            Tuple of the PDF bytes (None if the server answered 304 Not
+            Modified) and the response's etag/last_modified validators
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        async with self.download_semaphore:
+            if self.client is not None:
+                return await self._fetch(self.client, url, headers)
+
+            async with create_http_client() as client:
+                return await self._fetch(client, url, headers)
+
+    async def _fetch(
+        self, client: httpx.AsyncClient, url: str, headers: Dict[str, str]
+    ) -> Tuple[Optional[bytes], Dict[str, Optional[str]]]:
+        try:
+            async with client.stream(
+                "GET", url, headers=headers, timeout=self.timeout, follow_redirects=True
+            ) as response:
+                if response.status_code == 304 and headers:
+                    return None, {
+                        "etag": headers.get("If-None-Match"),
+                        "last_modified": headers.get("If-Modified-Since"),
+                    }
+
                 response.raise_for_status()
 
                 content_type = response.headers.get("content-type", "")
@@ -29,55 +106,301 @@ class PDFProcessor:
                 if content_length > self.max_size:
                     raise ValueError(f"PDF file too large: {content_length} bytes")
 
-                return response.content
+                # Enforce the limit while streaming; content-length may be
+                # missing or wrong
+                content = bytearray()
+                async for data in response.aiter_bytes():
+                    content.extend(data)
+                    if len(content) > self.max_size:
+                        raise ValueError(
+                            f"PDF file too large: exceeds {self.max_size} bytes"
+                        )
 
-            except httpx.TimeoutException:
-                raise ValueError(f"Timeout downloading PDF from {url}")
-            except httpx.HTTPStatusError as e:
-                raise ValueError(
-                    f"HTTP error downloading PDF: {e.response.status_code}"
-                )
+                validators = {
+                    "etag": response.headers.get("etag"),
+                    "last_modified": response.headers.get("last-modified"),
+                }
+                telemetry.DOWNLOADED_BYTES.inc(len(content))
+                return bytes(content), validators
+
+        except httpx.TimeoutException:
+            raise ValueError(f"Timeout downloading PDF from {url}")
+        except httpx.HTTPStatusError as e:
+            raise ValueError(f"HTTP error downloading PDF: {e.response.status_code}")
 
     def extract_text_from_pdf(self, pdf_content: bytes) -> str:
-        text_parts = []
+        return _extract_page_range(pdf_content, 0, None, self.backend)
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_content)
-            tmp_file_path = tmp_file.name
+    async def extract_text(self, pdf_content: bytes) -> str:
+        text, _ = await self.extract_pages(pdf_content)
+        return text
 
-        try:
-            with pdfplumber.open(tmp_file_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    try:
-                        text = page.extract_text()
-                        if text:
-                            # Add page number for reference
-                            text_parts.append(f"[Page {page_num}]\n{text}")
-                    except Exception as e:
-                        print(f"Error extracting text from page {page_num}: {e}")
+    async def extract_pages(self, pdf_content: bytes) -> Tuple[str, List[PageSpan]]:
+        """
+        Extract text off the event loop, splitting large PDFs into page ranges.
+
+        Returns:
+            Tuple of the text, with ``[Page N]`` markers, and one
+            ``(page_number, start, end)`` character span into it per page
+            that had text
+        """
+        texts = []
+        pages: List[PageSpan] = []
+        async for text, spans in self.iter_pages(pdf_content):
+            texts.append(text)
+            pages.extend(spans)
+        return "".join(texts), pages
+
+    async def iter_pages(
+        self, pdf_content: bytes
+    ) -> AsyncIterator[Tuple[str, List[PageSpan]]]:
+        """
+        Extract text page range by page range, in page order.
+
+        Ranges of ``pdf_extraction_min_pages_per_task`` pages are extracted
+        in parallel on ``self.executor`` (the default thread pool when None),
+        at most one per worker ahead of the consumer, and each is yielded as
+        soon as it and the ranges before it are done.
+
+        Yields:
+            Tuples of text and page spans. The texts concatenate to the text
+            returned by ``extract_pages`` and the spans are offsets into it.
+        """
+        loop = asyncio.get_running_loop()
+
+        async with self._shared(pdf_content) as source:
+            page_count = await loop.run_in_executor(
+                self.executor, _count_pages, source, self.backend
+            )
+            ranges = iter(self._page_ranges(page_count))
+
+            def submit(start: int, end: int) -> asyncio.Future:
+                return loop.run_in_executor(
+                    self.executor, _extract_pages, source, start, end, self.backend
+                )
+
+            in_flight = deque(
+                submit(*page_range) for page_range in islice(ranges, self.workers)
+            )
+            offset = 0
+            try:
+                while in_flight:
+                    text, spans = await in_flight.popleft()
+                    page_range = next(ranges, None)
+                    if page_range is not None:
+                        in_flight.append(submit(*page_range))
+                    telemetry.PAGES_EXTRACTED.inc(len(spans))
+                    if not text:
                         continue
+
+                    # Ranges are joined like the pages within them
+                    shift = offset
+                    if offset:
+                        text = "\n\n" + text
+                        shift += 2
+                    yield text, [
+                        (page_number, start + shift, end + shift)
+                        for page_number, start, end in spans
+                    ]
+                    offset += len(text)
+            finally:
+                for future in in_flight:
+                    future.cancel()
+                # Tasks already running may still read the shared block
+                if in_flight and not isinstance(source, bytes):
+                    await asyncio.gather(*in_flight, return_exceptions=True)
+
+    @asynccontextmanager
+    async def _shared(self, pdf_content: bytes) -> AsyncIterator[PDFSource]:
+        """
+        The PDF as extraction tasks should receive it.
+
+        Arguments to a process pool are pickled per task, so there the PDF is
+        copied once into shared memory and tasks get the block's name. The
+        block is unlinked when extraction ends, and by the resource tracker
+        if this process dies first. Threads share the bytes.
+        """
+        if not isinstance(self.executor, (ProcessPoolExecutor, ExtractionPool)):
+            yield pdf_content
+            return
+
+        shared = await asyncio.to_thread(_share, pdf_content)
+        try:
+            yield shared.name, len(pdf_content)
         finally:
-            if os.path.exists(tmp_file_path):
-                os.unlink(tmp_file_path)
+            shared.close()
+            shared.unlink()
 
-        return "\n\n".join(text_parts)
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        """Split pages into contiguous ranges of the minimum task size."""
+        if page_count == 0:
+            return [(0, 0)]
 
-    async def process_documents(self, document_urls: List[str]) -> Dict[str, str]:
-        documents = {}
+        size = max(settings.pdf_extraction_min_pages_per_task, 1)
+        return [
+            (start, min(start + size, page_count))
+            for start in range(0, page_count, size)
+        ]
 
-        for url in document_urls:
+    async def process_documents(self, document_urls: List[str]) -> Dict[str, str]:
+        async def process(url: str) -> str:
             try:
                 pdf_content = await self.download_pdf(url)
 
-                text = self.extract_text_from_pdf(pdf_content)
+                text = await self.extract_text(pdf_content)
 
                 if text.strip():
-                    documents[url] = text
+                    return text
                 else:
                     raise ValueError("No text could be extracted from PDF")
 
             except Exception as e:
                 print(f"Error processing {url}: {e}")
-                documents[url] = f"Error: {str(e)}"
+                return f"Error: {str(e)}"
+
+        # Downloads run concurrently, bounded by the download semaphore
+        urls = list(dict.fromkeys(document_urls))
+        texts = await asyncio.gather(*(process(url) for url in urls))
+
+        return dict(zip(urls, texts))
+
+
+class ExtractionPool(Executor):
+    """
+    Process pool for PDF extraction that replaces itself when it breaks.
+
+    A worker that dies mid-task (a parser crash, or the OOM killer on a
+    hostile PDF) breaks a ProcessPoolExecutor for good. The tasks it was
+    running fail with BrokenProcessPool, which fails their documents, and
+    later tasks go to a new pool.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = self._create()
+
+    def _create(self) -> ProcessPoolExecutor:
+        # Spawned workers don't inherit the parent's threads or loaded models
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with self._lock:
+            executor = self._executor
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # Broken by an earlier task; this one never started
+            executor = self._replace(executor)
+            future = executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda done: self._check(done, executor))
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            executor = self._executor
+        executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def _check(self, future: Future, executor: ProcessPoolExecutor):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace(executor)
+
+    def _replace(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Swap in a new pool for ``broken``, unless another task already has."""
+        with self._lock:
+            if self._executor is broken:
+                print("PDF extraction worker died; starting a new pool")
+                self._executor = self._create()
+            executor = self._executor
+        broken.shutdown(wait=False, cancel_futures=True)
+        return executor
+
+
+def extraction_workers() -> int:
+    """Worker processes for PDF extraction."""
+    return settings.pdf_extraction_workers or os.cpu_count() or 1
+
+
+def create_extraction_pool() -> ExtractionPool:
+    """Create the process pool used for PDF text extraction."""
+    return ExtractionPool(workers=extraction_workers())
+
+
+def _share(pdf_content: bytes) -> shared_memory.SharedMemory:
+    shared = shared_memory.SharedMemory(create=True, size=max(len(pdf_content), 1))
+    shared.buf[: len(pdf_content)] = pdf_content
+    return shared
+
+
+def _read_shared(name: str, size: int) -> bytes:
+    shared = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shared.buf[:size])
+    finally:
+        shared.close()
+
+
+@contextmanager
+def _open_pdf(source: PDFSource, backend: str):
+    """Open a PDF from its bytes or a shared memory block and yield its pages."""
+    content = source if isinstance(source, bytes) else _read_shared(*source)
+    stream = io.BytesIO(content)
+
+    if backend == "pdfplumber":
+        with pdfplumber.open(stream) as pdf:
+            yield pdf.pages
+    elif backend == "pypdf2":
+        # Text-only and considerably faster, but ignores layout
+        yield PdfReader(stream).pages
+    else:
+        raise ValueError(f"Unknown PDF extraction backend: {backend}")
+
+
+def _count_pages(source: PDFSource, backend: str) -> int:
+    with _open_pdf(source, backend) as pages:
+        return len(pages)
+
+
+def _extract_page_range(
+    pdf_content: bytes, start: int, end: Optional[int], backend: str
+) -> str:
+    """Extract pages ``[start, end)`` with their ``[Page N]`` markers."""
+    text, _ = _extract_pages(pdf_content, start, end, backend)
+    return text
+
+
+def _extract_pages(
+    source: PDFSource, start: int, end: Optional[int], backend: str
+) -> Tuple[str, List[PageSpan]]:
+    """
+    Extract pages ``[start, end)`` with their ``[Page N]`` markers.
+
+    Returns:
+        Tuple of the text and the ``(page_number, start, end)`` character
+        span of every page in it, marker included
+    """
+    text_parts = []
+    spans: List[PageSpan] = []
+    offset = 0
+
+    with _open_pdf(source, backend) as pages:
+        end = len(pages) if end is None else min(end, len(pages))
+        for page_num in range(start + 1, end + 1):
+            try:
+                text = pages[page_num - 1].extract_text()
+                if text:
+                    # Add page number for reference
+                    part = f"[Page {page_num}]\n{text}"
+                    if text_parts:
+                        offset += 2
+                    text_parts.append(part)
+                    spans.append((page_num, offset, offset + len(part)))
+                    offset += len(part)
+            except Exception as e:
+                print(f"Error extracting text from page {page_num}: {e}")
+                continue
 
-        return documents
+    return "\n\n".join(text_parts), spans
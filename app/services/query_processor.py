@@ -1,4 +1,20 @@
-from typing import Dict, List
+import asyncio
+import contextlib
+import functools
+import httpx
+import time
+import numpy as np
+from concurrent.futures import Executor
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core import telemetry
+from app.services.answer_cache import (
+    chunk_set_key,
+    create_answer_cache,
+    document_set_key,
+)
+from app.services.context_assembler import ContextAssembler
+from app.services.document_cache import DocumentCache
+from app.services.embedding_service import EmbeddingService
 from app.services.pdf_processor import PDFProcessor
 from app.services.text_chunker import TextChunker
 from app.services.vector_store import VectorStore
@@ -7,16 +23,41 @@ from app.core.config import settings
 
 
 class QueryProcessor:
-    def __init__(self):
-        self.pdf_processor = PDFProcessor()
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        extraction_executor: Optional[Executor] = None,
+        embedding_service: Optional[EmbeddingService] = None,
+        extraction_workers: Optional[int] = None,
+    ):
+        self.pdf_processor = PDFProcessor(
+            client=http_client,
+            executor=extraction_executor,
+            workers=extraction_workers,
+        )
         self.text_chunker = TextChunker()
+        self.context_assembler = ContextAssembler()
+        self.document_cache = (
+            DocumentCache() if settings.document_cache_enabled else None
+        )
+        self.answer_cache = (
+            create_answer_cache() if settings.answer_cache_enabled else None
+        )
+        self.embedding_service = embedding_service
         self.vector_store = None
         self.llm_service = None
+        self._validation_tasks = set()
+        # content hash -> in-flight extraction and indexing of that document
+        self._indexing: Dict[str, asyncio.Task] = {}
+        # Bounds concurrent LLM calls when a batch fans out; the gateway
+        # rate-limits and retries per endpoint
+        self.llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+        self.ingest_semaphore = asyncio.Semaphore(settings.ingest_max_documents)
 
     def _get_vector_store(self):
         """Lazy initialization of vector store."""
         if self.vector_store is None:
-            self.vector_store = VectorStore()
+            self.vector_store = VectorStore(embedding_service=self.embedding_service)
         return self.vector_store
 
     def _get_llm_service(self):
@@ -24,8 +65,431 @@ class QueryProcessor:
             self.llm_service = LLMService()
         return self.llm_service
 
+    def load_index(self):
+        """Restore the vector index checkpoint, if one exists."""
+        try:
+            self._get_vector_store().load_index()
+        except ValueError as e:
+            print(f"Starting with an empty vector index: {e}")
+
+    def save_index(self):
+        """Checkpoint the vector index."""
+        if self.vector_store is not None:
+            self.vector_store.save_index()
+
+    async def close(self):
+        if self.document_cache is not None:
+            await self.document_cache.flush_async()
+        if self.answer_cache is not None:
+            await self.answer_cache.close()
+        if self.llm_service is not None:
+            await self.llm_service.close()
+
+    async def drain_validations(self):
+        """Wait for every deferred validation started so far."""
+        while self._validation_tasks:
+            await asyncio.gather(*self._validation_tasks, return_exceptions=True)
+
+    async def _load_document(self, url: str) -> Dict:
+        """
+        Make sure a document URL is indexed and return its document ID.
+
+        Documents are identified by the hash of their content. One that is
+        already indexed or cached skips extraction, chunking and embedding.
+        The document is returned pinned in the vector store, so a concurrent
+        request that sees the URL change can't remove it before this request
+        has searched it; ``_pinned_documents`` releases it.
+
+        Returns:
+            Dictionary with ``doc_id`` and ``cached``
+        """
+        vector_store = self._get_vector_store()
+        cache = self.document_cache
+        known = await cache.lookup_url_async(url) if cache else None
+
+        # Bounds how many downloaded documents are held while they are
+        # ingested, however many URLs a request names. Revalidations take it
+        # too, since a changed document arrives with the response
+        async with self.ingest_semaphore:
+            content = None
+            if known:
+                with telemetry.span("download", url=url, revalidate=True) as span:
+                    content, validators = await self.pdf_processor.fetch_pdf(
+                        url, etag=known["etag"], last_modified=known["last_modified"]
+                    )
+                    span.set_attribute("not_modified", content is None)
+                if content is None:
+                    doc_id = known["content_hash"]
+                    vector_store.pin([doc_id])
+                    if vector_store.has_document(doc_id):
+                        return {"doc_id": doc_id, "cached": True}
+
+                    entry = await cache.get_async(doc_id)
+                    if entry is not None:
+                        try:
+                            with telemetry.span("index", doc_id=doc_id):
+                                await vector_store.add_document_async(
+                                    doc_id, entry["chunks"], entry["embeddings"]
+                                )
+                        except BaseException:
+                            vector_store.release([doc_id])
+                            raise
+                        return {"doc_id": doc_id, "cached": True}
+                    vector_store.release([doc_id])
+
+            if content is None:
+                with telemetry.span("download", url=url):
+                    content, validators = await self.pdf_processor.fetch_pdf(url)
+
+            doc_id = DocumentCache.content_hash(content)
+            vector_store.pin([doc_id])
+            try:
+                indexed = await self._index_document(doc_id, content)
+
+                if cache:
+                    # The URL now serves different content; drop the stale vectors
+                    if known and known["content_hash"] != doc_id:
+                        await vector_store.remove_document_async(known["content_hash"])
+                    await cache.remember_url_async(url, doc_id, **validators)
+            except BaseException:
+                vector_store.release([doc_id])
+                raise
+
+        return {"doc_id": doc_id, "cached": indexed["cached"]}
+
+    async def _index_document(self, doc_id: str, content: bytes) -> Dict:
+        """
+        Index document content unless it already is.
+
+        Concurrent requests for the same content share one extraction and
+        embedding pass, which a cancelled request doesn't abort for the rest.
+
+        Returns:
+            Dictionary with ``cached``: whether the document was already
+            indexed or cached
+        """
+        if self._get_vector_store().has_document(doc_id):
+            return {"cached": True}
+
+        task = self._indexing.get(doc_id)
+        if task is None:
+            task = asyncio.create_task(self._extract_and_index(doc_id, content))
+            self._indexing[doc_id] = task
+            task.add_done_callback(lambda _: self._indexing.pop(doc_id, None))
+        return await asyncio.shield(task)
+
+    async def _extract_and_index(self, doc_id: str, content: bytes) -> Dict:
+        """
+        Ingest (or take from the document cache) and index one document.
+
+        Stage times are recorded on the trace of the request that started
+        the work.
+        """
+        cache = self.document_cache
+        entry = await cache.get_async(doc_id) if cache else None
+        cached = entry is not None
+        timings = {}
+
+        if entry is None:
+            entry = await self._ingest(content, timings)
+            if cache:
+                await cache.put_async(
+                    doc_id, entry["text"], entry["chunks"], entry["embeddings"]
+                )
+
+        started = time.perf_counter()
+        await self._get_vector_store().add_document_async(
+            doc_id, entry["chunks"], entry["embeddings"]
+        )
+        timings["index"] = time.perf_counter() - started
+
+        for stage, seconds in timings.items():
+            telemetry.record_stage(stage, seconds)
+        print(
+            f"Ingested {len(entry['chunks'])} chunks for document {doc_id} ("
+            + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+            + ")"
+        )
+        return {"cached": cached}
+
+    async def _ingest(self, content: bytes, timings: Dict[str, float]) -> Dict:
+        """
+        Extract, chunk and embed a PDF as a pipeline.
+
+        Page ranges reach the chunker as soon as they are extracted, and
+        chunks reach the embedder in batches of ``embedding_batch_size``
+        through a queue of at most ``ingest_queue_batches`` batches. The
+        stages overlap, and only a bounded amount of chunked but not yet
+        embedded text is waiting at any time.
+
+        Args:
+            content: The PDF bytes
+            timings: Filled with the seconds each stage spent working
+
+        Returns:
+            Dictionary with the document ``text``, its ``chunks`` and their
+            ``embeddings``
+        """
+        embedding_service = self._get_vector_store().embedding_service
+        batch_size = embedding_service.batch_size
+        batches: asyncio.Queue = asyncio.Queue(maxsize=settings.ingest_queue_batches)
+        stream = self.text_chunker.stream()
+        texts = []
+        timings.update(extract=0.0, chunk=0.0, embed=0.0)
+
+        async def extract_and_chunk():
+            batch = []
+            try:
+                waited = time.perf_counter()
+                async for text, pages in self.pdf_processor.iter_pages(content):
+                    started = time.perf_counter()
+                    timings["extract"] += started - waited
+                    texts.append(text)
+                    chunks = stream.feed(text, pages)
+                    timings["chunk"] += time.perf_counter() - started
+
+                    for chunk in chunks:
+                        batch.append(chunk)
+                        if len(batch) == batch_size:
+                            await batches.put(batch)
+                            batch = []
+                    waited = time.perf_counter()
+
+                started = time.perf_counter()
+                batch.extend(stream.close())
+                timings["chunk"] += time.perf_counter() - started
+                if batch:
+                    await batches.put(batch)
+            except Exception:
+                # Wake the embedder; awaiting the producer re-raises
+                await batches.put(None)
+                raise
+            await batches.put(None)
+
+        producer = asyncio.create_task(extract_and_chunk())
+        embeddings = []
+        try:
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    break
+                started = time.perf_counter()
+                embeddings.append(
+                    await embedding_service.embed_async([chunk["text"] for chunk in batch])
+                )
+                timings["embed"] += time.perf_counter() - started
+                telemetry.CHUNKS_EMBEDDED.inc(len(batch))
+            await producer
+        finally:
+            producer.cancel()
+
+        if not stream.chunks:
+            raise ValueError("No text could be extracted from PDF")
+
+        return {
+            "text": "".join(texts),
+            "chunks": stream.chunks,
+            "embeddings": np.concatenate(embeddings),
+        }
+
+    async def _load_documents(self, document_urls: List[str]) -> Dict:
+        """
+        Load every document concurrently; PDFProcessor bounds the downloads.
+
+        Returns:
+            Dictionary with ``doc_urls`` (doc_id -> first URL serving it),
+            ``document_errors``, ``documents_cached``, ``documents_processed``,
+            ``total_chunks`` and the ``pinned`` document IDs to release
+        """
+        document_errors = {}
+        doc_urls = {}
+        pinned = []
+        documents_cached = 0
+
+        urls = list(dict.fromkeys(document_urls))
+        tasks = [asyncio.ensure_future(self._load_document(url)) for url in urls]
+        try:
+            with telemetry.span("load_documents", documents=len(urls)):
+                loaded = await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            # Loads that finished before the cancellation hold pins
+            self._get_vector_store().release(
+                task.result()["doc_id"]
+                for task in tasks
+                if task.done() and not task.cancelled() and task.exception() is None
+            )
+            raise
+
+        for url, document in zip(urls, loaded):
+            if isinstance(document, Exception):
+                print(f"Error processing {url}: {document}")
+                document_errors[url] = f"Error: {str(document)}"
+                continue
+
+            doc_urls.setdefault(document["doc_id"], url)
+            pinned.append(document["doc_id"])
+            if document["cached"]:
+                documents_cached += 1
+
+        vector_store = self._get_vector_store()
+        return {
+            "doc_urls": doc_urls,
+            "document_errors": document_errors,
+            "documents_cached": documents_cached,
+            "documents_processed": len(urls) - len(document_errors),
+            "total_chunks": sum(
+                vector_store.document_chunk_count(doc_id) for doc_id in doc_urls
+            ),
+            "pinned": pinned,
+        }
+
+    @contextlib.asynccontextmanager
+    async def _pinned_documents(self, document_urls: List[str]) -> AsyncIterator[Dict]:
+        """
+        Load documents for one request and keep them searchable until the
+        block exits.
+
+        Everything retrieved inside the block is scoped to the request's own
+        documents; answer generation can happen after it, since search
+        results are copies.
+        """
+        documents = await self._load_documents(document_urls)
+        try:
+            yield documents
+        finally:
+            self._get_vector_store().release(documents["pinned"])
+
+    async def _retrieve(self, query: str, doc_urls: Dict[str, str]) -> Dict:
+        """
+        Search the loaded documents and select the context for the LLM.
+
+        Returns:
+            Dictionary with the context ``chunks`` as assembled passages
+            (source metadata attached), their ``context_tokens``, the
+            ``assembly`` stats and the ``cache_key`` for the answer cache, or
+            None when it is disabled
+        """
+        vector_store = self._get_vector_store()
+        with telemetry.span("embed_query"):
+            query_embedding = await vector_store.embedding_service.embed_query_async(
+                query
+            )
+        with telemetry.span("search", documents=len(doc_urls)) as span:
+            relevant_chunks = await vector_store.search_async(
+                query,
+                top_k=settings.top_k_chunks,
+                doc_ids=list(doc_urls),
+                query_embedding=query_embedding,
+                min_similarity=settings.min_similarity,
+            )
+            span.set_attribute("hits", len(relevant_chunks))
+        return self._prepare_context(relevant_chunks, doc_urls, query_embedding)
+
+    def _prepare_context(
+        self,
+        relevant_chunks: List[Dict],
+        doc_urls: Dict[str, str],
+        query_embedding: np.ndarray,
+    ) -> Dict:
+        """Turn search results into the retrieval returned by ``_retrieve``."""
+        with telemetry.span("assemble_context", chunks=len(relevant_chunks)):
+            relevant_chunks, assembly = self.context_assembler.assemble(
+                relevant_chunks
+            )
+
+        # Indexed chunks are shared between URLs serving the same content,
+        # so source metadata is attached per request
+        for chunk in relevant_chunks:
+            chunk.update(self.text_chunker.document_metadata(doc_urls[chunk["doc_id"]]))
+
+        cache_key = None
+        if self.answer_cache is not None:
+            cache_key = (
+                document_set_key(doc_urls),
+                query_embedding,
+                chunk_set_key(relevant_chunks),
+            )
+
+        return {
+            "chunks": relevant_chunks,
+            "context_tokens": assembly["context_tokens"],
+            "assembly": assembly,
+            "cache_key": cache_key,
+        }
+
+    async def _cached_answer(self, cache_key: Optional[Tuple]) -> Optional[Dict]:
+        if cache_key is None:
+            return None
+        try:
+            return await self.answer_cache.get(*cache_key)
+        except Exception as e:
+            print(f"Answer cache lookup failed: {e}")
+            return None
+
+    async def _cache_answer(
+        self, cache_key: Optional[Tuple], result: Dict, entry_id: str = None
+    ) -> Optional[str]:
+        """Store an answer, returning its cache entry ID."""
+        if cache_key is None:
+            return None
+        try:
+            return await self.answer_cache.put(
+                *cache_key,
+                {
+                    "answer": result["answer"],
+                    "confidence_note": result.get("confidence_note"),
+                    "model_used": result["model_used"],
+                },
+                entry_id=entry_id,
+            )
+        except Exception as e:
+            print(f"Answer cache update failed: {e}")
+            return None
+
+    @staticmethod
+    def _sources(chunks: List[Dict]) -> List[Dict]:
+        """Citation for every context chunk: document, pages and offsets."""
+        return [
+            {
+                "source": chunk.get("source"),
+                "document_name": chunk.get("document_name"),
+                "page_start": chunk.get("page_start"),
+                "page_end": chunk.get("page_end"),
+                "start_char": chunk.get("start_char"),
+                "end_char": chunk.get("end_char"),
+                "similarity": chunk.get("similarity"),
+            }
+            for chunk in chunks
+        ]
+
+    @staticmethod
+    def _metadata(documents: Dict, chunks_used: int, retrieval: Dict) -> Dict:
+        return {
+            "chunks_used": chunks_used,
+            "total_chunks": documents["total_chunks"],
+            "documents_processed": documents["documents_processed"],
+            "documents_cached": documents["documents_cached"],
+            "context_tokens": retrieval["context_tokens"],
+            "context_tokens_saved": retrieval["assembly"]["tokens_saved"],
+            "context_assembly": retrieval["assembly"],
+            # The answering model, once there is an answer
+            "model_used": None,
+        }
+
+    @staticmethod
+    def _with_timings(response: Dict) -> Dict:
+        """Attach the request's stage timings and trace ID to its metadata."""
+        if "metadata" in response:
+            response["metadata"]["timings"] = telemetry.timings()
+            response["metadata"]["trace_id"] = telemetry.trace_id()
+        return response
+
     async def process_query(
-        self, query: str, document_urls: List[str], validate: bool = True
+        self,
+        query: str,
+        document_urls: List[str],
+        validation: str = "inline",
+        on_validated: Optional[Callable[[str], Awaitable[None]]] = None,
     ) -> Dict:
         """
         Process a query against documents.
@@ -33,72 +497,364 @@ class QueryProcessor:
         Args:
             query: The user's question
             document_urls: List of PDF URLs to process
-            validate: Whether to validate the answer (Enhancement 1)
+            validation: How to validate the answer (Enhancement 1): "off",
+                "inline" (second LLM call before returning), "deferred" (the
+                answer returns at once and ``on_validated`` later receives
+                the confidence note) or "structured" (answer and confidence
+                note from a single LLM call)
+            on_validated: Async callback for the confidence note in deferred
+                mode
 
         Returns:
             Dictionary with answer and metadata
         """
-        try:
-            print("Step 1: Processing PDFs...")
-            documents = await self.pdf_processor.process_documents(document_urls)
+        with telemetry.trace("query", documents=len(document_urls)):
+            try:
+                print("Step 1: Loading documents...")
+                async with self._pinned_documents(document_urls) as documents:
+                    if not documents["doc_urls"]:
+                        return self._no_documents_response(documents)
+                    print(
+                        f"Loaded {documents['total_chunks']} chunks "
+                        f"({documents['documents_cached']} documents cached)"
+                    )
 
-            valid_docs = {
-                k: v for k, v in documents.items() if not v.startswith("Error:")
-            }
-            if not valid_docs:
-                return {
-                    "answer": "Could not process any of the provided documents.",
-                    "error": "All document processing failed",
-                    "document_errors": documents,
-                }
+                    print("Step 2: Searching for relevant chunks...")
+                    retrieval = await self._retrieve(query, documents["doc_urls"])
 
-            print("Step 2: Chunking documents...")
-            chunks = self.text_chunker.chunk_documents(documents)
-            print(f"Created {len(chunks)} chunks")
+                return self._with_timings(
+                    await self._answer(
+                        query, documents, retrieval, validation, on_validated
+                    )
+                )
+
+            except Exception as e:
+                return self._error_response(e)
+
+    async def process_queries(
+        self,
+        queries: List[str],
+        document_urls: List[str],
+        validation: str = "inline",
+        on_validated: Optional[Callable[[int, str], Awaitable[None]]] = None,
+    ) -> Dict:
+        """
+        Process several queries against one document set.
 
-            print("Step 3: Building vector index...")
-            vector_store = self._get_vector_store()
-            vector_store.build_index(chunks)
+        Documents are loaded once, all queries are embedded in one encode
+        call and searched with one batched index call, and the answers are
+        generated concurrently, bounded by ``llm_max_concurrency``.
+
+        Args:
+            queries: The user's questions
+            document_urls: List of PDF URLs to process
+            validation: How to validate each answer, as for ``process_query``
+            on_validated: Async callback receiving the query's position and
+                its confidence note in deferred mode
+
+        Returns:
+            Dictionary with one ``process_query`` style result per query
+            under ``results``, plus shared metadata
+        """
+        with telemetry.trace(
+            "batch_query", queries=len(queries), documents=len(document_urls)
+        ):
+            try:
+                print(f"Step 1: Loading documents for {len(queries)} queries...")
+                async with self._pinned_documents(document_urls) as documents:
+                    if not documents["doc_urls"]:
+                        return self._no_documents_response(documents)
+
+                    print("Step 2: Searching for relevant chunks...")
+                    doc_urls = documents["doc_urls"]
+                    vector_store = self._get_vector_store()
+                    embedding_service = vector_store.embedding_service
+                    with telemetry.span("embed_query", queries=len(queries)):
+                        query_embeddings = await embedding_service.embed_queries_async(
+                            queries
+                        )
+                    with telemetry.span("search", documents=len(doc_urls)):
+                        search_results = await vector_store.search_batch_async(
+                            query_embeddings,
+                            top_k=settings.top_k_chunks,
+                            doc_ids=list(doc_urls),
+                            min_similarity=settings.min_similarity,
+                            queries=queries,
+                        )
+
+                async def answer(position: int, query: str, retrieval: Dict) -> Dict:
+                    callback = None
+                    if on_validated is not None:
+                        callback = functools.partial(on_validated, position)
+                    try:
+                        async with self.llm_semaphore:
+                            result = await self._answer(
+                                query, documents, retrieval, validation, callback
+                            )
+                    except Exception as e:
+                        result = self._error_response(e)
+                    return {"query": query, **result}
+
+                print("Step 3: Generating answers...")
+                results = await asyncio.gather(
+                    *(
+                        answer(
+                            position,
+                            query,
+                            self._prepare_context(chunks, doc_urls, embedding),
+                        )
+                        for position, (query, chunks, embedding) in enumerate(
+                            zip(queries, search_results, query_embeddings)
+                        )
+                    )
+                )
 
-            print("Step 4: Searching for relevant chunks...")
-            relevant_chunks = vector_store.search(query, top_k=settings.top_k_chunks)
-            if not relevant_chunks:
                 return {
-                    "answer": "No relevant information found in the documents for your query.",
-                    "chunks_found": 0,
+                    "results": results,
+                    "metadata": {
+                        "queries": len(queries),
+                        "total_chunks": documents["total_chunks"],
+                        "documents_processed": documents["documents_processed"],
+                        "documents_cached": documents["documents_cached"],
+                        "timings": telemetry.timings(),
+                        "trace_id": telemetry.trace_id(),
+                    },
                 }
 
-            # Step 5: Generate answer using LLM
-            print("Step 5: Generating answer...")
-            llm_service = self._get_llm_service()
-            result = await llm_service.generate_answer(query, relevant_chunks)
+            except Exception as e:
+                return self._error_response(e)
+
+    async def _answer(
+        self,
+        query: str,
+        documents: Dict,
+        retrieval: Dict,
+        validation: str,
+        on_validated: Optional[Callable[[str], Awaitable[None]]],
+    ) -> Dict:
+        """Generate and validate the answer for one retrieved context."""
+        relevant_chunks = retrieval["chunks"]
+        if not relevant_chunks:
+            return self._no_relevant_response(documents, retrieval)
+
+        # Step 3: Generate answer using LLM, unless a near-identical
+        # question over the same context was answered recently
+        llm_service = self._get_llm_service()
+        result = await self._cached_answer(retrieval["cache_key"])
+        answer_cached = result is not None
+        if answer_cached:
+            print("Step 3: Reusing cached answer")
+        else:
+            print("Step 3: Generating answer...")
+            with telemetry.span("generate", chunks=len(relevant_chunks)) as span:
+                if validation == "structured":
+                    result = await llm_service.generate_answer_with_confidence(
+                        query, relevant_chunks
+                    )
+                else:
+                    result = await llm_service.generate_answer(query, relevant_chunks)
+                # A fallback endpoint's model when the first one failed
+                span.set_attribute("model", result["model_used"])
 
-            # Step 6: Validate answer (Enhancement 1)
-            confidence_note = None
-            if validate:
-                print("Step 6: Validating answer...")
+        # Step 4: Validate answer (Enhancement 1)
+        confidence_note = None
+        if validation != "off":
+            confidence_note = result.get("confidence_note")
+        validation_pending = False
+        if confidence_note is None and validation in ("inline", "structured"):
+            print("Step 4: Validating answer...")
+            with telemetry.span("validate"):
                 confidence_note = await llm_service.validate_answer(
                     query, result["answer"], relevant_chunks
                 )
+            result["confidence_note"] = confidence_note
 
-            # Prepare response
-            response = {
-                "answer": result["answer"],
-                "metadata": {
-                    "chunks_used": result["chunks_used"],
-                    "total_chunks": len(chunks),
-                    "documents_processed": len(valid_docs),
-                    "model_used": result["model_used"],
-                },
-            }
+        entry_id = None
+        if not answer_cached:
+            entry_id = await self._cache_answer(retrieval["cache_key"], result)
 
-            if confidence_note:
-                response["confidence_note"] = confidence_note
+        if confidence_note is None and validation == "deferred" and on_validated:
+            print("Step 4: Validating answer in the background...")
+            self._validate_later(
+                query,
+                result,
+                relevant_chunks,
+                on_validated,
+                cache_key=retrieval["cache_key"],
+                entry_id=entry_id,
+            )
+            validation_pending = True
 
-            return response
+        # Prepare response
+        metadata = self._metadata(
+            documents, len(relevant_chunks), retrieval
+        )
+        metadata["model_used"] = result["model_used"]
+        metadata["answer_cached"] = answer_cached
+        response = {
+            "answer": result["answer"],
+            "metadata": metadata,
+            "sources": self._sources(relevant_chunks),
+        }
 
-        except Exception as e:
-            return {
-                "answer": f"An error occurred while processing your query: {str(e)}",
-                "error": str(e),
-            }
+        if confidence_note:
+            response["confidence_note"] = confidence_note
+        if validation_pending:
+            response["validation_status"] = "pending"
+
+        return response
+
+    @classmethod
+    def _no_relevant_response(cls, documents: Dict, retrieval: Dict) -> Dict:
+        metadata = cls._metadata(documents, 0, retrieval)
+        metadata["answer_cached"] = False
+        return {
+            "answer": "No relevant information found in the documents for your query.",
+            "chunks_found": 0,
+            "metadata": metadata,
+        }
+
+    @staticmethod
+    def _no_documents_response(documents: Dict) -> Dict:
+        return {
+            "answer": "Could not process any of the provided documents.",
+            "error": "All document processing failed",
+            "document_errors": documents["document_errors"],
+        }
+
+    @staticmethod
+    def _error_response(error: Exception) -> Dict:
+        return {
+            "answer": f"An error occurred while processing your query: {str(error)}",
+            "error": str(error),
+        }
+
+    def _validate_later(
+        self,
+        query: str,
+        result: Dict,
+        context_chunks: List[Dict],
+        on_validated: Callable[[str], Awaitable[None]],
+        cache_key: Optional[Tuple] = None,
+        entry_id: Optional[str] = None,
+    ):
+        """
+        Validate an answer in a background task and hand over the note.
+
+        The note is also added to the answer's cache entry, if it has one.
+        """
+
+        async def validate():
+            with telemetry.span("validate", deferred=True):
+                confidence_note = await self._get_llm_service().validate_answer(
+                    query, result["answer"], context_chunks
+                )
+            await on_validated(confidence_note)
+            if entry_id is not None:
+                await self._cache_answer(
+                    cache_key,
+                    dict(result, confidence_note=confidence_note),
+                    entry_id=entry_id,
+                )
+
+        # Keep a reference so the task isn't garbage collected mid-flight
+        task = asyncio.create_task(validate())
+        self._validation_tasks.add(task)
+        task.add_done_callback(self._validation_tasks.discard)
+
+    async def stream_query(
+        self, query: str, document_urls: List[str], validation: str = "inline"
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Process a query, yielding ``(event, data)`` pairs as the pipeline runs.
+
+        Events are ``status`` for each pipeline stage, ``token`` for every
+        piece of answer text, ``answer`` with the full answer and metadata,
+        then ``validation`` with the confidence note once the answer has been
+        delivered. Failures end the stream with an ``error`` event.
+
+        Args:
+            query: The user's question
+            document_urls: List of PDF URLs to process
+            validation: Validation mode; anything but "off" validates the
+                answer after it has been streamed
+        """
+        with telemetry.trace("stream_query", documents=len(document_urls)):
+            try:
+                yield "status", {"stage": "loading_documents"}
+                async with self._pinned_documents(document_urls) as documents:
+                    if not documents["doc_urls"]:
+                        yield "error", {
+                            "error": "All document processing failed",
+                            "document_errors": documents["document_errors"],
+                        }
+                        return
+                    yield "status", {
+                        "stage": "documents_loaded",
+                        "total_chunks": documents["total_chunks"],
+                        "documents_cached": documents["documents_cached"],
+                        "document_errors": documents["document_errors"],
+                        "timings": telemetry.timings(),
+                    }
+
+                    yield "status", {"stage": "searching"}
+                    retrieval = await self._retrieve(query, documents["doc_urls"])
+                relevant_chunks = retrieval["chunks"]
+                if not relevant_chunks:
+                    yield "answer", self._with_timings(
+                        self._no_relevant_response(documents, retrieval)
+                    )
+                    return
+
+                llm_service = self._get_llm_service()
+                metadata = self._metadata(
+                    documents, len(relevant_chunks), retrieval
+                )
+                result = await self._cached_answer(retrieval["cache_key"])
+                metadata["answer_cached"] = result is not None
+
+                if result is not None:
+                    yield "token", {"text": result["answer"]}
+                else:
+                    yield "status", {
+                        "stage": "generating",
+                        "chunks_used": len(relevant_chunks),
+                    }
+                    answer = []
+                    with telemetry.span(
+                        "generate", chunks=len(relevant_chunks), stream=True
+                    ) as span:
+                        async for text, model in llm_service.stream_answer(
+                            query, relevant_chunks
+                        ):
+                            answer.append(text)
+                            if text:
+                                yield "token", {"text": text}
+                        span.set_attribute("model", model)
+                    result = {"answer": "".join(answer), "model_used": model}
+                metadata["model_used"] = result["model_used"]
+
+                yield "answer", self._with_timings(
+                    {
+                        "answer": result["answer"],
+                        "metadata": metadata,
+                        "sources": self._sources(relevant_chunks),
+                    }
+                )
+
+                if validation != "off":
+                    confidence_note = result.get("confidence_note")
+                    if confidence_note is None:
+                        yield "status", {"stage": "validating"}
+                        with telemetry.span("validate"):
+                            confidence_note = await llm_service.validate_answer(
+                                query, result["answer"], relevant_chunks
+                            )
+                        result["confidence_note"] = confidence_note
+                    yield "validation", {"confidence_note": confidence_note}
+
+                if not metadata["answer_cached"]:
+                    await self._cache_answer(retrieval["cache_key"], result)
+
+            except Exception as e:
+                yield "error", {"error": str(e)}
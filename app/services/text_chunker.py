@@ -1,6 +1,7 @@
-from typing import List, Dict
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import bisect
+from typing import List, Dict, Optional, Sequence, Tuple
 from app.core.config import settings
+from app.services.text_splitter import RecursiveTextSplitter, SplitStream
 
 
 class TextChunker:
@@ -8,51 +9,57 @@ class TextChunker:
         self.chunk_size = settings.chunk_size
         self.chunk_overlap = settings.chunk_overlap
 
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""],
-            is_separator_regex=False,
+        # chunk_size and chunk_overlap are measured in chunk_length_unit
+        self.text_splitter = RecursiveTextSplitter.from_unit(
+            settings.chunk_length_unit, self.chunk_size, self.chunk_overlap
         )
 
-    def chunk_text(self, text: str, metadata: Dict = None) -> List[Dict]:
+    def chunk_text(
+        self,
+        text: str,
+        metadata: Dict = None,
+        pages: Optional[Sequence[Tuple[int, int, int]]] = None,
+    ) -> List[Dict]:
         """
         Split text into chunks with metadata.
 
         Args:
             text: The text to chunk
             metadata: Optional metadata to attach to each chunk
+            pages: Optional ``(page_number, start, end)`` character spans of
+                the pages in ``text``, in order, as returned by
+                ``PDFProcessor.extract_pages``
 
         Returns:
-            List of dictionaries containing chunk text and metadata
+            List of dictionaries containing chunk text and metadata. Each
+            chunk has its ``start_char``/``end_char`` offsets in ``text``
+            and, when ``pages`` is given, the ``page_start``/``page_end``
+            it spans.
         """
         if not text or not text.strip():
             return []
 
-        chunks = self.text_splitter.split_text(text)
+        stream = self.stream(metadata)
+        stream.feed(text, pages or ())
+        stream.close()
+        return stream.chunks
 
-        chunk_objects = []
-        for i, chunk in enumerate(chunks):
-            chunk_obj = {
-                "text": chunk,
-                "chunk_index": i,
-                "total_chunks": len(chunks),
-            }
-
-            if metadata:
-                chunk_obj.update(metadata)
+    def stream(self, metadata: Dict = None) -> "ChunkStream":
+        """Start chunking text that arrives in parts; see ``ChunkStream``."""
+        return ChunkStream(self.text_splitter.stream(), metadata)
 
-            chunk_objects.append(chunk_obj)
-
-        return chunk_objects
-
-    def chunk_documents(self, documents: Dict[str, str]) -> List[Dict]:
+    def chunk_documents(
+        self,
+        documents: Dict[str, str],
+        pages: Optional[Dict[str, Sequence[Tuple[int, int, int]]]] = None,
+    ) -> List[Dict]:
         """
         Chunk multiple documents.
 
         Args:
             documents: Dictionary mapping document URLs to their text content
+            pages: Optional dictionary mapping document URLs to their page
+                spans, as taken by ``chunk_text``
 
         Returns:
             List of all chunks from all documents
@@ -63,9 +70,86 @@ class TextChunker:
             if doc_text.startswith("Error:"):
                 continue
 
-            metadata = {"source": doc_url, "document_name": doc_url.split("/")[-1]}
+            metadata = self.document_metadata(doc_url)
 
-            chunks = self.chunk_text(doc_text, metadata)
+            chunks = self.chunk_text(
+                doc_text, metadata, pages.get(doc_url) if pages else None
+            )
             all_chunks.extend(chunks)
 
         return all_chunks
+
+    @staticmethod
+    def document_metadata(doc_url: str) -> Dict:
+        """Metadata identifying the source document of a chunk."""
+        return {"source": doc_url, "document_name": doc_url.split("/")[-1]}
+
+
+class ChunkStream:
+    """
+    Chunks of a document whose text arrives page range by page range.
+
+    Produces the same chunks as ``TextChunker.chunk_text`` on the joined
+    text, returning each one as soon as later text can't change it.
+    ``total_chunks`` is only known at the end and is set on every chunk by
+    ``close``.
+    """
+
+    def __init__(self, split_stream: SplitStream, metadata: Dict = None):
+        self._split_stream = split_stream
+        self.metadata = metadata
+        self.chunks: List[Dict] = []
+        self._page_numbers: List[int] = []
+        self._page_starts: List[int] = []
+
+    def feed(
+        self, text: str, pages: Sequence[Tuple[int, int, int]] = ()
+    ) -> List[Dict]:
+        """
+        Add the next part of the text.
+
+        Args:
+            text: Text following everything fed so far
+            pages: ``(page_number, start, end)`` spans of the pages in
+                ``text``, as offsets into the whole document
+
+        Returns:
+            The chunks completed by this part
+        """
+        for page_number, start, _ in pages:
+            self._page_numbers.append(page_number)
+            self._page_starts.append(start)
+        return self._add(self._split_stream.feed(text))
+
+    def close(self) -> List[Dict]:
+        """Return the remaining chunks once all text has been fed."""
+        chunks = self._add(self._split_stream.close())
+        for chunk in self.chunks:
+            chunk["total_chunks"] = len(self.chunks)
+        return chunks
+
+    def _add(self, split: List[Tuple[str, int]]) -> List[Dict]:
+        chunk_objects = []
+        for text, start in split:
+            end = start + len(text)
+            chunk_obj = {
+                "text": text,
+                "chunk_index": len(self.chunks),
+                "total_chunks": None,
+                "start_char": start,
+                "end_char": end,
+            }
+            if self._page_starts:
+                # Pages whose span starts before the chunk's first and last
+                # character; text between pages belongs to the page before
+                first = max(bisect.bisect_right(self._page_starts, start) - 1, 0)
+                last = max(bisect.bisect_right(self._page_starts, end - 1) - 1, first)
+                chunk_obj["page_start"] = self._page_numbers[first]
+                chunk_obj["page_end"] = self._page_numbers[last]
+
+            if self.metadata:
+                chunk_obj.update(self.metadata)
+
+            self.chunks.append(chunk_obj)
+            chunk_objects.append(chunk_obj)
+        return chunk_objects
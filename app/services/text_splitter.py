@@ -0,0 +1,255 @@
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from app.core.tokens import count_tokens
+
+
+class RecursiveTextSplitter:
+    """
+    Split text on the coarsest separator that occurs in it, recursing into
+    pieces that are still too long, then merge neighbouring pieces into
+    chunks of at most ``chunk_size`` with ``chunk_overlap`` of carry-over.
+
+    Produces the same chunks as LangChain's ``RecursiveCharacterTextSplitter``
+    with literal separators kept at the start of the following piece, but
+    measures every piece once and splits with ``str.split`` instead of
+    regular expressions.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        separators: Sequence[str] = ("\n\n", "\n", ". ", " ", ""),
+        length_function: Callable[[str], int] = len,
+    ):
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Chunk overlap ({chunk_overlap}) is larger than "
+                f"chunk size ({chunk_size})"
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators)
+        self.length_function = length_function
+
+    @classmethod
+    def from_unit(cls, unit: str, chunk_size: int, chunk_overlap: int):
+        """
+        Create a splitter measuring length in ``unit``.
+
+        Args:
+            unit: "characters", or "tokens" of the tiktoken encoding for
+                the configured OpenAI model
+        """
+        if unit == "characters":
+            return cls(chunk_size, chunk_overlap, length_function=len)
+        if unit == "tokens":
+            return cls(chunk_size, chunk_overlap, length_function=count_tokens)
+        raise ValueError(f"Unknown chunk length unit: {unit}")
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for chunk, _ in self._split(text, self.separators, 0)]
+
+    def split_text_with_offsets(self, text: str) -> List[Tuple[str, int]]:
+        """
+        Split text, returning each chunk with the offset of its first
+        character in ``text``.
+        """
+        return self._split(text, self.separators, 0)
+
+    def stream(self) -> "SplitStream":
+        """Start splitting text that arrives in parts; see ``SplitStream``."""
+        return SplitStream(self)
+
+    def _split(
+        self, text: str, separators: List[str], offset: int
+    ) -> List[Tuple[str, int]]:
+        separator = separators[-1]
+        remaining: List[str] = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if candidate in text:
+                separator = candidate
+                remaining = separators[i + 1 :]
+                break
+
+        chunks: List[Tuple[str, int]] = []
+        good: List[str] = []
+        good_offsets: List[int] = []
+        good_lengths: List[int] = []
+        # Pieces are contiguous, so offsets follow from their lengths
+        for piece in _split_keeping_separator(text, separator):
+            length = self.length_function(piece)
+            if length < self.chunk_size:
+                good.append(piece)
+                good_offsets.append(offset)
+                good_lengths.append(length)
+            else:
+                if good:
+                    chunks.extend(self._merge(good, good_offsets, good_lengths)[0])
+                    good, good_offsets, good_lengths = [], [], []
+                if remaining:
+                    chunks.extend(self._split(piece, remaining, offset))
+                else:
+                    chunks.append((piece, offset))
+            offset += len(piece)
+
+        if good:
+            chunks.extend(self._merge(good, good_offsets, good_lengths)[0])
+        return chunks
+
+    def _merge(
+        self,
+        pieces: List[str],
+        offsets: List[int],
+        lengths: List[int],
+        final: bool = True,
+    ) -> Tuple[List[Tuple[str, int]], int]:
+        """
+        Greedily pack pieces into chunks, carrying up to the overlap over.
+
+        Returns:
+            Tuple of the chunks and the index of the first piece of the last
+            chunk. With ``final=False`` that last chunk is left out, since
+            more pieces may still join it.
+        """
+        chunks: List[Tuple[str, int]] = []
+        # The current chunk is pieces[first:i]
+        first = 0
+        total = 0
+
+        for i, length in enumerate(lengths):
+            if total + length > self.chunk_size and i > first:
+                chunk = _join(pieces, offsets, first, i)
+                if chunk is not None:
+                    chunks.append(chunk)
+                while total > self.chunk_overlap or (
+                    total + length > self.chunk_size and total > 0
+                ):
+                    total -= lengths[first]
+                    first += 1
+            total += length
+
+        if final:
+            chunk = _join(pieces, offsets, first, len(pieces))
+            if chunk is not None:
+                chunks.append(chunk)
+        return chunks, first
+
+
+class SplitStream:
+    """
+    Incremental ``RecursiveTextSplitter.split_text_with_offsets``.
+
+    Text is fed in consecutive parts, and every chunk is returned as soon as
+    no later text can change it. The chunks match splitting the whole text
+    at once. Only the unfinished tail is buffered: text after the last
+    top-level separator and the pieces of the chunk being built.
+    """
+
+    def __init__(self, splitter: RecursiveTextSplitter):
+        self.splitter = splitter
+        self.separator = splitter.separators[0]
+        self._tail = ""
+        self._tail_offset = 0
+        # Whether the top-level separator occurs; until it does, the whole
+        # text might have to be split on a finer one
+        self._separated = False
+        self._run: Tuple[List[str], List[int], List[int]] = ([], [], [])
+
+    def feed(self, text: str) -> List[Tuple[str, int]]:
+        """Add the next part of the text and return the chunks it completes."""
+        previous = len(self._tail)
+        self._tail += text
+        if not self._separated:
+            # Only the new text, plus a separator straddling the boundary
+            start = max(previous - len(self.separator) + 1, 0)
+            if not self.separator or self.separator not in self._tail[start:]:
+                return []
+            self._separated = True
+
+        parts = self._tail.split(self.separator)
+        pieces = parts[:1] + [self.separator + part for part in parts[1:-1]]
+        self._tail = parts[-1] if len(parts) == 1 else self.separator + parts[-1]
+
+        chunks = self._add(pieces)
+        # Everything but the chunk still being built is final
+        run_pieces, run_offsets, run_lengths = self._run
+        merged, first = self.splitter._merge(
+            run_pieces, run_offsets, run_lengths, final=False
+        )
+        chunks.extend(merged)
+        self._run = (run_pieces[first:], run_offsets[first:], run_lengths[first:])
+        return chunks
+
+    def close(self) -> List[Tuple[str, int]]:
+        """Return the remaining chunks once all text has been fed."""
+        if not self._separated:
+            chunks = self.splitter._split(
+                self._tail, self.splitter.separators, self._tail_offset
+            )
+        else:
+            chunks = self._add([self._tail])
+            chunks.extend(self._flush())
+        self._tail = ""
+        return chunks
+
+    def _add(self, pieces: List[str]) -> List[Tuple[str, int]]:
+        """Append complete top-level pieces to the run, as ``_split`` does."""
+        splitter = self.splitter
+        chunks: List[Tuple[str, int]] = []
+        run_pieces, run_offsets, run_lengths = self._run
+
+        for piece in pieces:
+            offset = self._tail_offset
+            self._tail_offset += len(piece)
+            if not piece:
+                continue
+
+            length = splitter.length_function(piece)
+            if length < splitter.chunk_size:
+                run_pieces.append(piece)
+                run_offsets.append(offset)
+                run_lengths.append(length)
+                continue
+
+            chunks.extend(self._flush())
+            run_pieces, run_offsets, run_lengths = self._run
+            if len(splitter.separators) > 1:
+                chunks.extend(
+                    splitter._split(piece, splitter.separators[1:], offset)
+                )
+            else:
+                chunks.append((piece, offset))
+
+        return chunks
+
+    def _flush(self) -> List[Tuple[str, int]]:
+        run_pieces, run_offsets, run_lengths = self._run
+        self._run = ([], [], [])
+        if not run_pieces:
+            return []
+        return self.splitter._merge(run_pieces, run_offsets, run_lengths)[0]
+
+
+def _split_keeping_separator(text: str, separator: str) -> List[str]:
+    """Split ``text``, prefixing every piece but the first with ``separator``."""
+    if not separator:
+        return list(text)
+
+    parts = text.split(separator)
+    pieces = parts[:1] + [separator + part for part in parts[1:]]
+    return [piece for piece in pieces if piece]
+
+
+def _join(
+    pieces: List[str], offsets: List[int], first: int, end: int
+) -> Optional[Tuple[str, int]]:
+    """Join ``pieces[first:end]``, stripping surrounding whitespace."""
+    text = "".join(pieces[first:end])
+    stripped = text.lstrip()
+    offset = offsets[first] + len(text) - len(stripped)
+    stripped = stripped.rstrip()
+    return (stripped, offset) if stripped else None
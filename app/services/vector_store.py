@@ -1,97 +1,830 @@
+import asyncio
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict
-import pickle
+from typing import List, Dict, Iterable, Optional, Tuple
+import json
 import os
+import threading
 from app.core.config import settings
+from app.services.chunk_store import ChunkStore
+from app.services.embedding_service import EmbeddingService
+from app.services.lexical_index import LexicalIndex
 
 
 class VectorStore:
-    def __init__(self):
-        try:
-            print(f"Loading embedding model: {settings.embedding_model}")
-            self.embedding_model = SentenceTransformer(settings.embedding_model)
-            print("Embedding model loaded successfully")
-        except Exception as e:
-            print(f"Error loading embedding model: {e}")
-            raise
+    """
+    Long-lived FAISS index shared by all queries.
+
+    Every chunk gets a stable int64 ID that maps back to the document it came
+    from, so documents can be added and removed incrementally and each search
+    can be restricted to the documents a query asked about.
+
+    The index starts as exact flat search and is promoted to the configured
+    approximate index type once it holds ``vector_index_promotion_threshold``
+    vectors.
+
+    With ``hybrid_search_enabled``, a BM25 index over the chunk text is kept
+    under the same chunk IDs and lifecycle, and searches given the query text
+    fuse its keyword hits with the vector hits by reciprocal rank.
+
+    The store is shared by concurrent requests: index and chunk store access
+    is serialized by a lock, so searches and ``*_async`` calls can run on
+    worker threads. Promotion trains the new index outside that lock and
+    only holds it to swap the index in.
+
+    Requests ``pin`` the documents they are about to search; removing a
+    pinned document is deferred until its last pin is released, so a query
+    never loses the chunks it was scoped to mid-flight. Pins have their own
+    lock and ``pin``/``release`` never wait for the index, so they are safe
+    to call on the event loop. A document whose last pin is released while
+    the index is busy is removed by the next search or write.
+    """
+
+    def __init__(self, embedding_service: Optional[EmbeddingService] = None):
+        self.embedding_service = embedding_service or EmbeddingService()
         self.index = None
-        self.chunks = []
+        self.chunks = ChunkStore()
+        # doc_id -> [first chunk ID, chunk count]; IDs are contiguous per document
+        self.documents: Dict[str, List[int]] = {}
         self.dimension = None
+        self.next_id = 0
+        self.lexical = LexicalIndex() if settings.hybrid_search_enabled else None
+
+        self._lock = threading.RLock()
+        # Guards _pins and _stale; taken after _lock when both are needed
+        self._pin_lock = threading.Lock()
+        self._pins: Dict[str, int] = {}
+        self._stale = set()
+        # Bumped whenever the index is replaced wholesale, so a promotion
+        # trained on an older index is thrown away
+        self._generation = 0
+        self._promoting = False
 
     def create_embeddings(self, texts: List[str]) -> np.ndarray:
         """Create embeddings for a list of texts."""
-        # Convert texts to embeddings
-        embeddings = self.embedding_model.encode(
-            texts, convert_to_numpy=True, show_progress_bar=True
-        )
-        return embeddings
+        return self.embedding_service.embed(texts)
+
+    def has_document(self, doc_id: str) -> bool:
+        return doc_id in self.documents
+
+    def add_document(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        embeddings: Optional[np.ndarray] = None,
+    ) -> List[int]:
+        """
+        Add a document's chunks to the index.
+
+        Args:
+            doc_id: Identifier of the source document
+            chunks: Chunk dictionaries to index
+            embeddings: Precomputed embeddings aligned with ``chunks``; computed
+                from the chunk texts when omitted
+
+        Returns:
+            The chunk IDs assigned to the document
+        """
+        if not chunks:
+            raise ValueError("No chunks provided to build index")
+
+        if self.has_document(doc_id):
+            return self._document_ids(doc_id).tolist()
+
+        if embeddings is None:
+            texts = [chunk["text"] for chunk in chunks]
+            embeddings = self.create_embeddings(texts)
+        elif len(embeddings) != len(chunks):
+            raise ValueError("Embeddings do not match the number of chunks")
+
+        # Tokenize outside the lock so searches aren't held up
+        analyzed = LexicalIndex.analyze(chunks) if self.lexical is not None else None
+
+        with self._lock:
+            ids = self._add_document(doc_id, chunks, embeddings, analyzed)
+        self._promote_if_due()
+        return ids
+
+    async def add_document_async(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        embeddings: Optional[np.ndarray] = None,
+    ) -> List[int]:
+        """Add a document on a worker thread; promotion can take seconds."""
+        return await asyncio.to_thread(self.add_document, doc_id, chunks, embeddings)
+
+    def _add_document(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        embeddings: np.ndarray,
+        analyzed: Optional[Dict] = None,
+    ) -> List[int]:
+        # A concurrent request may have added the document meanwhile
+        if self.has_document(doc_id):
+            return self._document_ids(doc_id).tolist()
+
+        if self.index is None:
+            self.dimension = embeddings.shape[1]
+            self.index = faiss.IndexIDMap2(create_flat_index(self.dimension))
+
+        ids = np.arange(self.next_id, self.next_id + len(chunks), dtype="int64")
+        self.index.add_with_ids(embeddings.astype("float32"), ids)
+        self.next_id += len(chunks)
+
+        self.chunks.add(doc_id, ids.tolist(), chunks)
+        self.documents[doc_id] = [int(ids[0]), len(chunks)]
+        if self.lexical is not None:
+            self.lexical.add(ids, analyzed or LexicalIndex.analyze(chunks))
+
+        print(f"Indexed {len(chunks)} chunks for document {doc_id}")
+        self._remove_stale()
+        return ids.tolist()
+
+    def document_chunk_count(self, doc_id: str) -> int:
+        return self.documents[doc_id][1] if doc_id in self.documents else 0
 
-    def build_index(self, chunks: List[Dict]):
-        """Build FAISS index from chunks."""
+    def remove_document(self, doc_id: str):
+        """Remove a document, or mark it for removal while it is pinned."""
+        with self._lock:
+            with self._pin_lock:
+                if doc_id not in self.documents:
+                    return
+                if self._pins.get(doc_id):
+                    self._stale.add(doc_id)
+                    return
+                ids = self._detach(doc_id)
+            self._remove_ids(doc_id, ids)
+
+    async def remove_document_async(self, doc_id: str):
+        """``remove_document`` on a worker thread; it waits for the index lock."""
+        await asyncio.to_thread(self.remove_document, doc_id)
+
+    def _detach(self, doc_id: str) -> np.ndarray:
+        """
+        Unlist a document, holding both locks, and return its chunk IDs.
+
+        From here on ``has_document`` is False, so a request pinning the
+        document again re-adds it rather than searching chunks on their way out.
+        """
+        self._stale.discard(doc_id)
+        ids = self._document_ids(doc_id)
+        del self.documents[doc_id]
+        return ids
+
+    def _remove_ids(self, doc_id: str, ids: np.ndarray):
+        """Drop a detached document's chunks; needs only the index lock."""
+        try:
+            self.index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW graphs can't delete vectors; the orphaned IDs no longer map
+            # to any chunk and are skipped by search
+            pass
+
+        self.chunks.remove(ids.tolist())
+        if self.lexical is not None:
+            self.lexical.remove(ids)
+
+        print(f"Removed {len(ids)} chunks for document {doc_id}")
+
+    def pin(self, doc_ids: Iterable[str]):
+        """
+        Keep documents searchable until ``release`` is called.
+
+        Documents may be pinned before they are added.
+        """
+        with self._pin_lock:
+            for doc_id in doc_ids:
+                self._pins[doc_id] = self._pins.get(doc_id, 0) + 1
+
+    def release(self, doc_ids: Iterable[str]):
+        """
+        Drop pins taken by ``pin``. Documents marked stale are removed now
+        if the index is free, or else by the next search or write.
+        """
+        removable = False
+        with self._pin_lock:
+            for doc_id in doc_ids:
+                count = self._pins.get(doc_id, 0) - 1
+                if count > 0:
+                    self._pins[doc_id] = count
+                    continue
+                self._pins.pop(doc_id, None)
+                removable = removable or doc_id in self._stale
+
+        if removable and self._lock.acquire(blocking=False):
+            try:
+                self._remove_stale()
+            finally:
+                self._lock.release()
+
+    def _remove_stale(self):
+        """Remove stale documents no longer pinned; needs the index lock."""
+        if not self._stale:
+            return
+        with self._pin_lock:
+            detached = {
+                doc_id: self._detach(doc_id)
+                for doc_id in list(self._stale)
+                if not self._pins.get(doc_id) and doc_id in self.documents
+            }
+            # Stale IDs of documents removed by other means
+            self._stale.intersection_update(self.documents)
+        for doc_id, ids in detached.items():
+            self._remove_ids(doc_id, ids)
+
+    @property
+    def index_type(self) -> Optional[str]:
+        if self.index is None:
+            return None
+        return _index_type(_inner_index(self.index))
+
+    def _promote_if_due(self):
+        """Promote the flat index once it reaches the promotion threshold."""
+        with self._lock:
+            due = (
+                not self._promoting
+                and settings.vector_index_type != "flat"
+                and self.index_type == "flat"
+                and self.index.ntotal >= settings.vector_index_promotion_threshold
+            )
+            if not due:
+                return
+            self._promoting = True
+            generation = self._generation
+            # Snapshot the vectors; training can take seconds and runs unlocked
+            vectors = _inner_index(self.index).reconstruct_n(0, self.index.ntotal)
+            ids = faiss.vector_to_array(self.index.id_map).copy()
+
+        try:
+            index = self._promote(settings.vector_index_type, vectors, ids)
+            with self._lock:
+                if self._generation != generation:
+                    return
+                # Catch up with documents added and removed while training
+                current = faiss.vector_to_array(self.index.id_map)
+                added = np.setdiff1d(current, ids)
+                if len(added):
+                    index.add_with_ids(self.index.reconstruct_batch(added), added)
+                removed = np.setdiff1d(ids, current)
+                if len(removed):
+                    try:
+                        index.remove_ids(removed)
+                    except RuntimeError:
+                        # HNSW keeps them as orphans, skipped by search
+                        pass
+                self.index = index
+            print(
+                f"Promoted vector index to {settings.vector_index_type} "
+                f"with {index.ntotal} vectors"
+            )
+        finally:
+            with self._lock:
+                self._promoting = False
+
+    def _promote(self, index_type: str, vectors: np.ndarray, ids: np.ndarray) -> faiss.Index:
+        """Build an approximate index of ``index_type`` over the given vectors."""
+        inner = create_ann_index(index_type, self.dimension)
+        train_ann_index(inner, vectors)
+
+        # IVF indexes store IDs natively, and an IndexIDMap over them goes out
+        # of sync on remove_ids. A hashtable direct map lets them reconstruct
+        # vectors by ID, which scores keyword hits
+        if isinstance(inner, faiss.IndexIVF):
+            inner.set_direct_map_type(faiss.DirectMap.Hashtable)
+            index = inner
+        else:
+            index = faiss.IndexIDMap2(inner)
+        index.add_with_ids(vectors, ids)
+        return index
+
+    def build_index(self, chunks: List[Dict], embeddings: Optional[np.ndarray] = None):
+        """
+        Replace the index contents with ``chunks``.
+
+        Chunks are grouped into documents by their ``source`` metadata.
+        """
         if not chunks:
             raise ValueError("No chunks provided to build index")
 
-        texts = [chunk["text"] for chunk in chunks]
+        if embeddings is None:
+            texts = [chunk["text"] for chunk in chunks]
+            embeddings = self.create_embeddings(texts)
+        elif len(embeddings) != len(chunks):
+            raise ValueError("Embeddings do not match the number of chunks")
 
-        embeddings = self.create_embeddings(texts)
+        positions: Dict[str, List[int]] = {}
+        for position, chunk in enumerate(chunks):
+            positions.setdefault(chunk.get("source", ""), []).append(position)
+
+        with self._lock:
+            self.index = None
+            self.chunks = ChunkStore()
+            self.documents = {}
+            self.next_id = 0
+            self.lexical = LexicalIndex() if settings.hybrid_search_enabled else None
+            self._generation += 1
+            with self._pin_lock:
+                self._stale.clear()
+
+            for doc_id, rows in positions.items():
+                self._add_document(
+                    doc_id, [chunks[row] for row in rows], embeddings[rows]
+                )
+        self._promote_if_due()
+
+    def search(
+        self,
+        query: str,
+        top_k: int = settings.top_k_chunks,
+        doc_ids: Optional[Iterable[str]] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        min_similarity: Optional[float] = None,
+    ) -> List[Dict]:
+        """
+        Search for similar chunks given a query.
+
+        Args:
+            query: The search text
+            top_k: Maximum number of chunks to return
+            doc_ids: Restrict the search to these documents; all documents
+                are searched when None
+            query_embedding: Precomputed embedding of ``query``
+            min_similarity: Drop hits, vector or keyword, whose cosine
+                similarity to the query is below this value
+
+        Each result carries the raw index ``score`` (L2 distance or inner
+        product, depending on ``vector_metric``) and its cosine ``similarity``.
+        With hybrid search it also carries its BM25 ``lexical_score`` and
+        ``fused_score``; ``score`` is None for chunks only found by keywords.
+        """
+        if self.index is None:
+            raise ValueError("Index not built. Call build_index first.")
 
-        self.dimension = embeddings.shape[1]
+        if query_embedding is None:
+            query_embedding = self.embedding_service.embed_query(query)
+        return self.search_batch(
+            query_embedding.reshape(1, -1), top_k, doc_ids, min_similarity, [query]
+        )[0]
 
-        self.index = faiss.IndexFlatL2(self.dimension)
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = settings.top_k_chunks,
+        doc_ids: Optional[Iterable[str]] = None,
+        min_similarity: Optional[float] = None,
+        queries: Optional[List[str]] = None,
+    ) -> List[List[Dict]]:
+        """
+        Search for several queries with a single index call.
 
-        self.index.add(embeddings.astype("float32"))
+        Args:
+            query_embeddings: Matrix with one query embedding per row
+            top_k: Maximum number of chunks to return per query
+            doc_ids: Restrict the search to these documents; all documents
+                are searched when None
+            min_similarity: Drop hits, vector or keyword, whose cosine
+                similarity to the query is below this value
+            queries: Query texts aligned with ``query_embeddings``, for
+                hybrid search; only vectors are searched when None
 
-        self.chunks = chunks
+        Returns:
+            One result list per query row, as returned by ``search``
+        """
+        query_vectors = np.ascontiguousarray(query_embeddings, dtype="float32")
+        with self._lock:
+            self._remove_stale()
+            return self._search_batch(
+                query_vectors, top_k, doc_ids, min_similarity, queries
+            )
 
-        print(f"Built index with {len(chunks)} chunks")
+    async def search_batch_async(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = settings.top_k_chunks,
+        doc_ids: Optional[Iterable[str]] = None,
+        min_similarity: Optional[float] = None,
+        queries: Optional[List[str]] = None,
+    ) -> List[List[Dict]]:
+        """``search_batch`` on a worker thread."""
+        return await asyncio.to_thread(
+            self.search_batch, query_embeddings, top_k, doc_ids, min_similarity, queries
+        )
 
-    def search(self, query: str, top_k: int = settings.top_k_chunks) -> List[Dict]:
-        """Search for similar chunks given a query."""
+    def _search_batch(
+        self,
+        query_vectors: np.ndarray,
+        top_k: int,
+        doc_ids: Optional[Iterable[str]],
+        min_similarity: Optional[float],
+        queries: Optional[List[str]],
+    ) -> List[List[Dict]]:
         if self.index is None:
             raise ValueError("Index not built. Call build_index first.")
 
-        query_embedding = self.create_embeddings([query])[0]
+        selector = None
+        id_ranges = None
+        candidates = len(self.chunks)
+        if doc_ids is not None:
+            id_ranges = [
+                self.documents[doc_id] for doc_id in doc_ids if doc_id in self.documents
+            ]
+            allowed = np.concatenate(
+                [np.empty(0, dtype="int64")]
+                + [np.arange(first, first + count, dtype="int64") for first, count in id_ranges]
+            )
+            if not len(allowed):
+                return [[] for _ in range(len(query_vectors))]
+            candidates = len(allowed)
+            selector = faiss.IDSelectorBatch(allowed)
 
-        distances, indices = self.index.search(
-            query_embedding.reshape(1, -1).astype("float32"),
-            min(top_k, len(self.chunks)),
+        # Fusion needs more than top_k hits from each retriever to rerank
+        hybrid = self.lexical is not None and queries is not None
+        k = min(max(top_k, settings.hybrid_candidates) if hybrid else top_k, candidates)
+        if selector is None:
+            # Vectors HNSW couldn't delete are still in the graph as orphans
+            # that take up hits; fetch enough to make up for them
+            k += self.index.ntotal - len(self.chunks)
+        inner_product = self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+        # A restrictive filter starves the HNSW graph walk, so small
+        # candidate sets are ranked exactly instead
+        exhaustive = (
+            selector is not None
+            and candidates <= settings.vector_search_exhaustive_max
         )
+        if exhaustive and self.index_type == "hnsw":
+            vectors = self.index.reconstruct_batch(allowed)
+            products = query_vectors @ vectors.T
+            if inner_product:
+                exact = products
+                order = np.argsort(-exact, axis=1)[:, :k]
+            else:
+                exact = (
+                    (query_vectors**2).sum(axis=1)[:, None]
+                    - 2 * products
+                    + (vectors**2).sum(axis=1)[None]
+                )
+                order = np.argsort(exact, axis=1)[:, :k]
+            distances = np.take_along_axis(exact, order, axis=1)
+            ids = allowed[order]
+        else:
+            distances, ids = self.index.search(
+                query_vectors,
+                k,
+                params=search_parameters(self.index, selector, exhaustive),
+            )
+
+        # Embeddings are unit length, so squared L2 distance maps directly
+        # onto cosine similarity
+        similarities = distances if inner_product else 1 - distances / 2
+
+        batch_results = []
+        for row in range(len(query_vectors)):
+            # chunk ID -> (score, similarity), best first
+            dense = {}
+            below = {}
+            for dist, similarity, chunk_id in zip(
+                distances[row], similarities[row], ids[row].tolist()
+            ):
+                if chunk_id < 0:
+                    continue
+                if min_similarity is not None and similarity < min_similarity:
+                    below[chunk_id] = float(similarity)
+                    continue
+                dense[chunk_id] = (float(dist), float(similarity))
+
+            lexical = {}
+            if hybrid:
+                lexical_ids, lexical_scores = self.lexical.search(
+                    queries[row], k, id_ranges
+                )
+                lexical = dict(zip(lexical_ids.tolist(), lexical_scores.tolist()))
+                if min_similarity is not None:
+                    # RRF only sees ranks, so a keyword match must also be
+                    # close enough in meaning to stand on its own
+                    lexical = {
+                        chunk_id: score
+                        for chunk_id, score in lexical.items()
+                        if chunk_id in dense
+                        or self._relevant(query_vectors[row], chunk_id, below, min_similarity)
+                    }
+                ranked = reciprocal_rank_fusion([list(dense), list(lexical)])
+            else:
+                ranked = [(chunk_id, None) for chunk_id in dense]
+
+            results = []
+            for chunk_id, fused_score in ranked:
+                if len(results) == top_k:
+                    break
 
-        results = []
-        for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-            if idx < len(self.chunks):
-                chunk = self.chunks[idx].copy()
-                chunk["score"] = float(dist)
-                chunk["rank"] = i + 1
+                # Only the returned rows are materialized from the chunk store
+                chunk = self.chunks.get(chunk_id)
+                if chunk is None:
+                    continue
+                score, similarity = dense.get(chunk_id, (None, None))
+                if similarity is None:
+                    similarity = self._similarity(query_vectors[row], chunk_id)
+                chunk["score"] = score
+                chunk["similarity"] = similarity
+                if hybrid:
+                    chunk["lexical_score"] = lexical.get(chunk_id)
+                    chunk["fused_score"] = fused_score
+                chunk["rank"] = len(results) + 1
                 results.append(chunk)
+            batch_results.append(results)
 
-        return results
+        return batch_results
 
-    def save_index(self, path: str = settings.faiss_index_path):
+    async def search_async(
+        self,
+        query: str,
+        top_k: int = settings.top_k_chunks,
+        doc_ids: Optional[Iterable[str]] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        min_similarity: Optional[float] = None,
+    ) -> List[Dict]:
+        """
+        Search on a worker thread, sharing the query encode with other
+        concurrent searches.
+        """
+        if query_embedding is None:
+            query_embedding = await self.embedding_service.embed_query_async(query)
+        results = await self.search_batch_async(
+            query_embedding.reshape(1, -1), top_k, doc_ids, min_similarity, [query]
+        )
+        return results[0]
+
+    def save_index(self, path: Optional[str] = None):
+        path = path or settings.faiss_index_path
+        with self._lock:
+            self._save_index(path)
+
+    def _save_index(self, path: str):
         os.makedirs(path, exist_ok=True)
 
-        # Save FAISS index
+        # Save FAISS index; an empty store replaces an index it rejected
+        index_path = os.path.join(path, "index.faiss")
         if self.index is not None:
-            faiss.write_index(self.index, os.path.join(path, "index.faiss"))
+            faiss.write_index(self.index, index_path)
+        elif os.path.exists(index_path):
+            os.remove(index_path)
+
+        # Save chunks as a columnar store and reopen it memory-mapped
+        chunks_path = os.path.join(path, "chunks")
+        self.chunks.save(chunks_path)
+        self.chunks = ChunkStore.open(chunks_path)
+
+        # The keyword index is compacted and reopened the same way
+        if self.lexical is not None:
+            lexical_path = os.path.join(path, "lexical")
+            self.lexical.save(lexical_path)
+            self.lexical = LexicalIndex.open(lexical_path)
+
+        with open(os.path.join(path, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "documents": self.documents,
+                    "dimension": self.dimension,
+                    "next_id": self.next_id,
+                    **index_provenance(),
+                },
+                f,
+            )
 
-        # Save chunks and metadata
-        with open(os.path.join(path, "chunks.pkl"), "wb") as f:
-            pickle.dump({"chunks": self.chunks, "dimension": self.dimension}, f)
+    def load_index(self, path: Optional[str] = None):
+        """
+        Restore a saved index.
 
-    def load_index(self, path: str = settings.faiss_index_path):
+        Raises:
+            ValueError: When there is no index at ``path``, or it was built
+                with a different embedding model, dimension, chunking or
+                metric. The caller starts a new index, which replaces it on
+                the next save.
+        """
+        path = path or settings.faiss_index_path
         index_path = os.path.join(path, "index.faiss")
-        chunks_path = os.path.join(path, "chunks.pkl")
+        metadata_path = os.path.join(path, "index.json")
 
-        if not os.path.exists(index_path) or not os.path.exists(chunks_path):
+        if not os.path.exists(index_path) or not os.path.exists(metadata_path):
             raise ValueError(f"Index files not found at {path}")
 
+        with open(metadata_path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        # Vectors from another model, or chunks cut differently, would be
+        # searched alongside new ones without any error
+        for key, expected in index_provenance().items():
+            if data.get(key) != expected:
+                raise ValueError(
+                    f"Index at {path} was built with {key} {data.get(key)!r}, "
+                    f"not {expected!r}"
+                )
+        dimension = getattr(self.embedding_service, "dimension", None)
+        if dimension is not None and data["dimension"] not in (None, dimension):
+            raise ValueError(
+                f"Index at {path} holds {data['dimension']}-dimensional vectors, "
+                f"not {dimension}"
+            )
+
         # Load FAISS index
-        self.index = faiss.read_index(index_path)
+        index = faiss.read_index(index_path)
+        if index.metric_type != vector_metric():
+            raise ValueError(
+                f"Index at {path} was built for a different vector_metric"
+            )
+        if isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.NoMap:
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+        # Chunk text is paged in lazily as searches touch it
+        chunks = ChunkStore.open(os.path.join(path, "chunks"))
+
+        lexical = None
+        if settings.hybrid_search_enabled:
+            lexical_path = os.path.join(path, "lexical")
+            if os.path.exists(os.path.join(lexical_path, "vocabulary.json")):
+                lexical = LexicalIndex.open(lexical_path)
+            else:
+                lexical = build_lexical_index(chunks, data["documents"])
 
-        # Load chunks and metadata
-        with open(chunks_path, "rb") as f:
-            data = pickle.load(f)
-            self.chunks = data["chunks"]
+        with self._lock:
+            self.index = index
+            self.chunks = chunks
+            self.lexical = lexical
+            self.documents = data["documents"]
             self.dimension = data["dimension"]
+            self.next_id = data["next_id"]
+            self._generation += 1
+            with self._pin_lock:
+                self._stale.clear()
+
+    def _relevant(
+        self,
+        query_vector: np.ndarray,
+        chunk_id: int,
+        known: Dict[int, float],
+        min_similarity: float,
+    ) -> bool:
+        """Whether a keyword hit is at least ``min_similarity`` similar to the query."""
+        similarity = known.get(chunk_id)
+        if similarity is None:
+            similarity = self._similarity(query_vector, chunk_id)
+        return similarity is not None and similarity >= min_similarity
+
+    def _similarity(self, query_vector: np.ndarray, chunk_id: int) -> Optional[float]:
+        """Cosine similarity of a chunk the vector search didn't return."""
+        try:
+            vector = self.index.reconstruct(chunk_id)
+        except RuntimeError:
+            # Vectors orphaned in an HNSW graph, or IVF indexes saved
+            # without a direct map
+            return None
+        # Embeddings are unit length, so either metric reduces to a dot product
+        return float(query_vector @ vector)
+
+    def _document_ids(self, doc_id: str) -> np.ndarray:
+        first, count = self.documents[doc_id]
+        return np.arange(first, first + count, dtype="int64")
+
+
+def index_provenance() -> Dict:
+    """The settings a saved index's vectors and chunks were produced with."""
+    return {
+        "embedding_model": settings.embedding_model,
+        # Quantized backends produce slightly different vectors
+        "embedding_backend": settings.embedding_backend,
+        "chunking": {
+            "chunk_size": settings.chunk_size,
+            "chunk_overlap": settings.chunk_overlap,
+            "chunk_length_unit": settings.chunk_length_unit,
+            "pdf_extraction_backend": settings.pdf_extraction_backend,
+        },
+    }
+
+
+def build_lexical_index(chunks: ChunkStore, documents: Dict[str, List[int]]) -> LexicalIndex:
+    """Index the text of saved chunks, for indexes saved without one."""
+    lexical = LexicalIndex()
+    for first, count in documents.values():
+        ids = np.arange(first, first + count, dtype="int64")
+        lexical.add(ids, LexicalIndex.analyze([chunks.get(int(i)) for i in ids]))
+
+    print(f"Built keyword index for {len(lexical)} saved chunks")
+    return lexical
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[int]], k: Optional[int] = None
+) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked ID lists by summing ``1 / (k + rank)`` over the lists.
+
+    Args:
+        rankings: Lists of IDs, best first
+        k: Damping constant; ``rrf_k`` when None
+
+    Returns:
+        ``(id, fused score)`` pairs, best first; ties keep the order in which
+        IDs first appear, so earlier rankings win them
+    """
+    k = settings.rrf_k if k is None else k
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda entry: -entry[1])
+
+
+def vector_metric() -> int:
+    """FAISS metric for ``vector_metric``: "l2" or "cosine" (inner product)."""
+    if settings.vector_metric == "cosine":
+        return faiss.METRIC_INNER_PRODUCT
+    if settings.vector_metric == "l2":
+        return faiss.METRIC_L2
+    raise ValueError(f"Unknown vector metric: {settings.vector_metric}")
+
+
+def create_flat_index(dimension: int) -> faiss.Index:
+    if vector_metric() == faiss.METRIC_INNER_PRODUCT:
+        return faiss.IndexFlatIP(dimension)
+    return faiss.IndexFlatL2(dimension)
+
+
+def create_ann_index(index_type: str, dimension: int) -> faiss.Index:
+    """Create an empty approximate nearest-neighbour index."""
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(
+            dimension, settings.vector_index_hnsw_m, vector_metric()
+        )
+        index.hnsw.efConstruction = settings.vector_index_ef_construction
+        return index
+
+    if index_type == "ivfpq":
+        if dimension % settings.vector_index_pq_m:
+            raise ValueError(
+                f"vector_index_pq_m ({settings.vector_index_pq_m}) must divide "
+                f"the embedding dimension ({dimension})"
+            )
+        quantizer = create_flat_index(dimension)
+        return faiss.IndexIVFPQ(
+            quantizer,
+            dimension,
+            settings.vector_index_nlist,
+            settings.vector_index_pq_m,
+            settings.vector_index_pq_nbits,
+            vector_metric(),
+        )
+
+    raise ValueError(f"Unknown vector index type: {index_type}")
+
+
+def train_ann_index(index: faiss.Index, vectors: np.ndarray):
+    """Train IVF centroids and PQ codebooks on a sample of ``vectors``."""
+    if index.is_trained:
+        return
+
+    # k-means gains little beyond a few hundred points per centroid
+    sample_size = settings.vector_index_nlist * 256
+    if len(vectors) > sample_size:
+        rows = np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)
+        vectors = vectors[rows]
+
+    index.train(vectors)
+
+
+def search_parameters(
+    index: faiss.Index, selector: Optional[faiss.IDSelector], exhaustive: bool
+) -> faiss.SearchParameters:
+    """
+    Build per-search parameters for ``index`` (optionally an IndexIDMap).
+
+    IVF searches probe every list when ``exhaustive`` so that a filtered
+    search cannot miss allowed vectors living in unprobed lists.
+    """
+    inner = _inner_index(index)
+    index_type = _index_type(inner)
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(
+            sel=selector, efSearch=settings.vector_index_ef_search
+        )
+    if index_type == "ivfpq":
+        nprobe = inner.nlist if exhaustive else settings.vector_index_nprobe
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+
+    return faiss.SearchParameters(sel=selector)
+
+
+def _inner_index(index: faiss.Index) -> faiss.Index:
+    """Unwrap an IndexIDMap to the index doing the actual search."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def _index_type(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
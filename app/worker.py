@@ -0,0 +1,73 @@
+"""
+Celery worker running queued query jobs when JOB_BACKEND=redis.
+
+Each worker process loads its own embedding model and vector index and keeps
+one event loop for its lifetime. Extraction runs on threads; scale with more
+worker processes instead.
+
+Usage:
+    celery -A app.worker worker --concurrency 2
+"""
+import asyncio
+
+from celery.signals import worker_process_shutdown
+from app.core.celery_app import celery_app
+from app.core.http import create_http_client
+from app.services.embedding_service import EmbeddingService
+from app.services.job_queue import RedisJobQueue, run_job
+from app.services.query_processor import QueryProcessor
+
+_worker = None
+
+
+def get_worker() -> dict:
+    """Create this process's event loop, query processor and job queue."""
+    global _worker
+    if _worker is None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        embedding_service = EmbeddingService()
+        embedding_service.warm_up()
+        http_client = create_http_client()
+        query_processor = QueryProcessor(
+            http_client=http_client, embedding_service=embedding_service
+        )
+        query_processor.load_index()
+
+        _worker = {
+            "loop": loop,
+            "http_client": http_client,
+            "query_processor": query_processor,
+            "job_queue": RedisJobQueue(),
+        }
+    return _worker
+
+
+@celery_app.task(name="run_job", bind=True)
+def run_job_task(self, job_id: str):
+    worker = get_worker()
+    loop, job_queue = worker["loop"], worker["job_queue"]
+
+    job = loop.run_until_complete(job_queue.get(job_id))
+    if job is None:
+        print(f"Job {job_id} expired before a worker picked it up")
+        return
+
+    query_processor = worker["query_processor"]
+    # Acked late, so a job whose worker died is delivered again while its
+    # record still says processing
+    redelivered = bool((self.request.delivery_info or {}).get("redelivered"))
+    loop.run_until_complete(run_job(job_queue, query_processor, job, redelivered))
+    # Deferred validations would otherwise stall until the next job
+    loop.run_until_complete(query_processor.drain_validations())
+
+
+@worker_process_shutdown.connect
+def close_worker(**kwargs):
+    if _worker is None:
+        return
+    loop = _worker["loop"]
+    loop.run_until_complete(_worker["query_processor"].close())
+    loop.run_until_complete(_worker["job_queue"].close())
+    loop.run_until_complete(_worker["http_client"].aclose())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Stress the shared embedding service and vector store with overlapping
+queries on different documents, and check that no request sees another
+request's sources.
+
+Documents are embedded from several threads at once, then many concurrent
+requests each pin one document, (re)index it if needed, search it and
+release it, while a churn task keeps removing documents the way a changed
+URL does. Exits non-zero if any search returns a chunk from outside its
+document or finds its pinned document gone.
+
+Usage:
+    python -m benchmarks.concurrent_queries [--documents 50] [--requests 2000] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.embedding_service import EmbeddingService
+from app.services.vector_store import VectorStore
+
+WORDS = (
+    "roof coverage policy clause deductible wind mitigation inspection shingle "
+    "underwriting age premium claim exclusion dwelling hurricane endorsement"
+).split()
+
+
+def make_documents(count: int, chunks_per_document: int) -> dict:
+    """Documents sharing one vocabulary, so only the filter keeps them apart."""
+    rng = random.Random(0)
+    documents = {}
+    for number in range(count):
+        doc_id = f"doc-{number:04d}"
+        documents[doc_id] = [
+            {
+                "text": f"{doc_id} section {index}: "
+                + " ".join(rng.choices(WORDS, k=60)),
+                "chunk_index": index,
+                "total_chunks": chunks_per_document,
+            }
+            for index in range(chunks_per_document)
+        ]
+    return documents
+
+
+async def run(args) -> int:
+    embedding_service = EmbeddingService()
+    vector_store = VectorStore(embedding_service=embedding_service)
+    documents = make_documents(args.documents, args.chunks)
+
+    # Concurrent encodes through the one shared model
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        embeddings = dict(
+            zip(
+                documents,
+                pool.map(
+                    lambda chunks: embedding_service.embed(
+                        [chunk["text"] for chunk in chunks]
+                    ),
+                    documents.values(),
+                ),
+            )
+        )
+    print(
+        f"Embedded {args.documents} documents on {args.threads} threads "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+    crossovers = 0
+    missing = 0
+    latencies = []
+    limit = asyncio.Semaphore(args.concurrency)
+    done = asyncio.Event()
+
+    async def request(number: int):
+        nonlocal crossovers, missing
+        rng = random.Random(number)
+        doc_id = rng.choice(list(documents))
+        query = " ".join(rng.choices(WORDS, k=8))
+
+        async with limit:
+            begin = time.perf_counter()
+            vector_store.pin([doc_id])
+            try:
+                if not vector_store.has_document(doc_id):
+                    await vector_store.add_document_async(
+                        doc_id, documents[doc_id], embeddings[doc_id]
+                    )
+                # Give the churn task a chance to try removing the document
+                await asyncio.sleep(0)
+                results = await vector_store.search_async(
+                    query, top_k=5, doc_ids=[doc_id]
+                )
+            finally:
+                vector_store.release([doc_id])
+            latencies.append(time.perf_counter() - begin)
+
+        if not results:
+            missing += 1
+        crossovers += sum(result["doc_id"] != doc_id for result in results)
+
+    async def churn():
+        rng = random.Random(-1)
+        while not done.is_set():
+            vector_store.remove_document(rng.choice(list(documents)))
+            await asyncio.sleep(0.001)
+
+    churn_task = asyncio.create_task(churn())
+    start = time.perf_counter()
+    await asyncio.gather(*(request(number) for number in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await churn_task
+
+    latencies.sort()
+    print(
+        f"{args.requests} requests at concurrency {args.concurrency}: "
+        f"{args.requests / elapsed:.1f} req/s, "
+        f"p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms"
+    )
+    print(f"Foreign chunks returned: {crossovers}")
+    print(f"Searches that lost their pinned document: {missing}")
+    return 1 if crossovers or missing else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=20, help="Chunks per document")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=8, help="Embedding threads")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
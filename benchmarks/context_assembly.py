@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Measure the prompt tokens context assembly saves and what it costs.
+
+Builds policy-like documents (as tests.stubs generates for its
+PDFs), with the same notice repeated on every page the way headers and
+disclaimers are. Each document is chunked with the configured overlap and
+indexed. The benchmark searches for each query and compares the tokens of
+the retrieved chunks sent verbatim with the assembled context:
+adjacent chunks merged, near-duplicates dropped, packed to
+MAX_CONTEXT_TOKENS.
+
+Usage:
+    python -m benchmarks.context_assembly [--documents 20] [--pages 20] [--queries 200]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.context_assembler import ContextAssembler
+from app.services.embedding_service import EmbeddingService
+from app.services.text_chunker import TextChunker
+from app.services.vector_store import VectorStore
+from benchmarks.fixtures import corpus_queries
+from tests.stubs import page_lines
+
+NOTICE = (
+    "IMPORTANT NOTICE: This policy is a legal contract between you and the "
+    "company. Read it carefully. Coverage is subject to all terms, conditions "
+    "and exclusions. Contact your agent with any questions about your coverage "
+    "or to report a claim, and keep this document with your important papers."
+)
+
+
+def make_document(document: int, pages: int):
+    """Text with ``[Page N]`` markers and its page spans, as extraction returns."""
+    rng = random.Random(document)
+    parts = []
+    spans = []
+    offset = 0
+    for page in range(pages):
+        # One paragraph per clause, so chunk boundaries fall between words
+        body = "\n".join(page_lines(rng, document, page)).replace(".\n", ". ")
+        text = f"[Page {page + 1}]\n{NOTICE}\n\n{body}\n\n"
+        spans.append((page + 1, offset, offset + len(text)))
+        parts.append(text)
+        offset += len(text)
+    return "".join(parts), spans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    embedding_service = EmbeddingService()
+    vector_store = VectorStore(embedding_service=embedding_service)
+    chunker = TextChunker()
+    doc_ids = []
+    for document in range(args.documents):
+        text, spans = make_document(document, args.pages)
+        doc_id = f"policy-{document:03d}"
+        vector_store.add_document(doc_id, chunker.chunk_text(text, {}, spans))
+        doc_ids.append(doc_id)
+
+    queries = corpus_queries(args.queries, args.documents, args.pages)
+    # Half the queries span every document, so the notice is retrieved from several
+    results = [
+        vector_store.search(
+            query, doc_ids=doc_ids if number % 2 else [random.Random(number).choice(doc_ids)]
+        )
+        for number, query in enumerate(queries)
+    ]
+
+    assembler = ContextAssembler()
+    totals = {}
+    latencies = []
+    for chunks in results:
+        start = time.perf_counter()
+        _, stats = assembler.assemble(chunks)
+        latencies.append(time.perf_counter() - start)
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+
+    retrieved = totals["tokens_retrieved"]
+    print(
+        f"{len(results)} queries, top_k={settings.top_k_chunks}, "
+        f"chunk_size={settings.chunk_size}, chunk_overlap={settings.chunk_overlap}, "
+        f"budget={settings.max_context_tokens} tokens"
+    )
+    print(f"tokens retrieved per query   {retrieved / len(results):>8.1f}")
+    print(f"tokens sent per query        {totals['context_tokens'] / len(results):>8.1f}")
+    for key, label in (
+        ("overlap_tokens_saved", "saved by merging"),
+        ("duplicate_tokens_saved", "saved by deduplication"),
+        ("budget_tokens_saved", "left out for the budget"),
+        ("tokens_saved", "saved in total"),
+    ):
+        print(f"{label:<28} {totals[key] / len(results):>8.1f}  ({totals[key] / retrieved:.1%})")
+    print(
+        f"chunks merged {totals['chunks_merged']}, duplicates dropped "
+        f"{totals['duplicates_dropped']}, of {totals['chunks_retrieved']} retrieved"
+    )
+    latencies = np.array(latencies) * 1000
+    print(
+        f"assembly p50 {np.percentile(latencies, 50):.2f} ms, "
+        f"p99 {np.percentile(latencies, 99):.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
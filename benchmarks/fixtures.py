@@ -0,0 +1,104 @@
+"""
+Helpers shared by the benchmarks: a corpus of generated PDFs with questions
+about it, peak memory and latency percentiles. The PDF generator and stub
+servers live in tests/stubs.py.
+"""
+import os
+import random
+import resource
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from tests.stubs import generate_pdf
+
+
+def write_corpus(directory: str, documents: int, pages: int) -> List[str]:
+    """Write ``documents`` generated PDFs into ``directory``; returns file names."""
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for document in range(documents):
+        name = f"policy-{document:03d}.pdf"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(generate_pdf(pages, document))
+        names.append(name)
+    return names
+
+
+def corpus_queries(count: int, documents: int, pages: int, seed: int = 0) -> List[str]:
+    """Questions about clauses that exist in a ``write_corpus`` corpus."""
+    rng = random.Random(seed)
+    templates = [
+        "What does clause {} say about the deductible?",
+        "Which exclusions apply under clause {}?",
+        "Is roof damage covered by clause {}?",
+        "What notice period does clause {} require?",
+    ]
+    return [
+        rng.choice(templates).format(
+            f"{rng.randrange(documents) + 1}.{rng.randrange(pages) + 1}.1"
+        )
+        for _ in range(count)
+    ]
+
+
+def process_tree_rss(pid: Optional[int] = None) -> int:
+    """
+    Resident bytes of a process and its descendants, such as the
+    extraction pool's workers. Needs Linux's /proc; elsewhere falls back to
+    this process's own peak.
+    """
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    pending = [pid or os.getpid()]
+    total = 0
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+    except FileNotFoundError:
+        if pid is None and not total:
+            # ru_maxrss is kilobytes on Linux, bytes on macOS
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return total
+
+
+class PeakRSS:
+    """Sample ``process_tree_rss`` on a thread; ``peak_mb`` after the block."""
+
+    def __init__(self, pid: Optional[int] = None, interval: float = 0.02):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self.peak = process_tree_rss(self.pid)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, process_tree_rss(self.pid))
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+
+    @property
+    def peak_mb(self) -> float:
+        return self.peak / (1024 * 1024)
+
+
+def latency_percentiles(seconds: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99 of latencies in seconds, as milliseconds."""
+    if not len(seconds):
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2)}
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Compare vector-only and hybrid (BM25 + vector, reciprocal rank fusion)
+retrieval: hit rate at k, mean reciprocal rank and search latency.
+
+The corpus is synthetic policy text in which every chunk cites its own
+clause number and form code. Half of the queries ask about a clause or code
+(exact terms that embeddings blur together), the other half reuse a chunk's
+wording without them. Query embeddings are computed up front, so latencies
+cover the search alone.
+
+Usage:
+    python -m benchmarks.hybrid_search [--chunks 20000] [--queries 500]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.services.embedding_service import EmbeddingService
+from app.services.vector_store import VectorStore
+
+WORDS = (
+    "roof coverage policy deductible wind mitigation inspection shingle "
+    "underwriting age premium claim exclusion dwelling hurricane endorsement "
+    "water damage liability replacement cost schedule limit insured flood "
+    "mold sewer backup foundation plumbing wiring electrical panel furnace "
+    "chimney gutter fence pool trampoline dog bite theft burglary vandalism "
+    "fire smoke lightning hail tornado earthquake sinkhole collapse freeze "
+    "renewal cancellation notice lapse grace period payment installment "
+    "mortgagee lienholder beneficiary appraisal adjuster estimate invoice "
+    "contractor permit code upgrade ordinance law vacancy occupancy tenant "
+    "landlord condominium association assessment jewelry art collectibles "
+    "electronics appliances vehicle boat trailer golf cart business equipment "
+    "medical payments guest injury lawsuit defense settlement subrogation "
+    "depreciation actual cash value roofing material tile metal slate wood "
+    "asphalt solar panels skylight attic insulation window door garage shed"
+).split()
+KS = (1, 3, 5, 10)
+
+
+def make_corpus(count: int, chunks_per_document: int):
+    """Chunks of shared vocabulary, each with a unique clause and form code."""
+    rng = random.Random(0)
+    documents = {}
+    for number in range(count // chunks_per_document):
+        doc_id = f"policy-{number:05d}"
+        documents[doc_id] = []
+        for index in range(chunks_per_document):
+            clause = f"{number + 1}.{index + 1}"
+            code = f"HO-{number * chunks_per_document + index:06d}"
+            body = " ".join(rng.choices(WORDS, k=60))
+            documents[doc_id].append(
+                {
+                    "text": f"Clause {clause} (form {code}): {body}",
+                    "chunk_index": index,
+                    "total_chunks": chunks_per_document,
+                    "clause": clause,
+                    "code": code,
+                    "body": body,
+                }
+            )
+    return documents
+
+
+def make_queries(documents: dict, count: int):
+    """(query, target document, target chunk index) triples."""
+    rng = random.Random(1)
+    doc_ids = list(documents)
+    queries = []
+    for number in range(count):
+        doc_id = rng.choice(doc_ids)
+        chunk = rng.choice(documents[doc_id])
+        if number % 2:
+            query = rng.choice(
+                [
+                    f"What does clause {chunk['clause']} say?",
+                    f"Which terms apply under form {chunk['code']}?",
+                ]
+            )
+        else:
+            words = chunk["body"].split()
+            start = rng.randint(0, len(words) - 12)
+            query = " ".join(words[start : start + 12])
+        queries.append((query, doc_id, chunk["chunk_index"]))
+    return queries
+
+
+def evaluate(name, search, queries, embeddings):
+    ranks = []
+    latencies = []
+    for (query, doc_id, chunk_index), embedding in zip(queries, embeddings):
+        start = time.perf_counter()
+        results = search(query, embedding)
+        latencies.append(time.perf_counter() - start)
+        rank = next(
+            (
+                result["rank"]
+                for result in results
+                if result["doc_id"] == doc_id and result["chunk_index"] == chunk_index
+            ),
+            None,
+        )
+        ranks.append(rank)
+
+    hits = [
+        sum(rank is not None and rank <= k for rank in ranks) / len(ranks) for k in KS
+    ]
+    mrr = sum(1 / rank for rank in ranks if rank is not None) / len(ranks)
+    latencies = np.array(latencies) * 1000
+    print(
+        f"{name:<10}"
+        + "".join(f"{hit:>8.3f}" for hit in hits)
+        + f"{mrr:>8.3f}"
+        + f"{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 99):>9.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--chunks-per-document", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    embedding_service = EmbeddingService()
+    vector_store = VectorStore(embedding_service=embedding_service)
+    if vector_store.lexical is None:
+        parser.error("hybrid_search_enabled is off")
+
+    documents = make_corpus(args.chunks, args.chunks_per_document)
+    start = time.perf_counter()
+    for doc_id, chunks in documents.items():
+        vector_store.add_document(doc_id, chunks)
+    print(
+        f"Indexed {len(vector_store.chunks)} chunks in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+
+    queries = make_queries(documents, args.queries)
+    embeddings = embedding_service.embed([query for query, _, _ in queries])
+    top_k = max(KS)
+
+    def vector(query, embedding):
+        return vector_store.search_batch(embedding.reshape(1, -1), top_k)[0]
+
+    def hybrid(query, embedding):
+        return vector_store.search_batch(
+            embedding.reshape(1, -1), top_k, queries=[query]
+        )[0]
+
+    header = "".join(f"{f'hit@{k}':>8}" for k in KS)
+    print(f"{'search':<10}{header}{'MRR':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for kind, selected in (
+        ("all", slice(None)),
+        ("exact", slice(1, None, 2)),
+        ("wording", slice(0, None, 2)),
+    ):
+        print(f"-- {kind} queries")
+        evaluate("vector", vector, queries[selected], embeddings[selected])
+        evaluate("hybrid", hybrid, queries[selected], embeddings[selected])
+
+
+if __name__ == "__main__":
+    main()
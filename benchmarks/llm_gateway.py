@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Compare a bare OpenAI client with the LLM gateway against stub servers
+that inject faults: a server-side rate limit answering 429 with
+Retry-After, 500s and a slow tail.
+
+Scenarios, each on fresh stubs with the same seed:
+    direct      one AsyncOpenAI client, no retries
+    gateway     the gateway on the faulty endpoint: retries, backoff, hedging
+    failover    the gateway with a second, healthy endpoint to hedge and
+                fall back to
+
+Reports success rate, p50/p95/p99 latency and how many requests reached the
+servers.
+
+Usage:
+    python -m benchmarks.llm_gateway [--requests 300] [--concurrency 16] [--server-rps 80] [--rate-limit-rps 0]
+"""
+import argparse
+import asyncio
+import time
+
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.services.llm_gateway import LLMGateway
+from benchmarks.fixtures import latency_percentiles
+from tests.stubs import StubOpenAI
+
+MESSAGES = [
+    {"role": "system", "content": "You answer questions about insurance policies."},
+    {"role": "user", "content": "Is roof damage from wind covered?"},
+]
+
+
+async def drive(call, requests: int, concurrency: int):
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with limit:
+            started = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, failures
+
+
+async def scenario(name: str, args) -> dict:
+    faults = {
+        "rate_limit_rps": args.server_rps,
+        "errors": args.errors,
+        "slow": args.slow,
+        "slow_latency_ms": args.slow_latency_ms,
+    }
+    with StubOpenAI(args.latency_ms, **faults) as faulty, StubOpenAI(
+        args.latency_ms, seed=1
+    ) as healthy:
+        if name == "direct":
+            client = AsyncOpenAI(api_key="stub", base_url=faulty.base_url, max_retries=0)
+
+            async def call():
+                return await client.chat.completions.create(
+                    model=settings.openai_model, messages=MESSAGES
+                )
+
+            close = client.close
+        else:
+            endpoints = [{"name": "faulty", "base_url": faulty.base_url}]
+            if name == "failover":
+                endpoints.append({"name": "healthy", "base_url": healthy.base_url})
+            for endpoint in endpoints:
+                endpoint["rate_limit_rps"] = args.rate_limit_rps
+            gateway = LLMGateway(endpoints)
+
+            async def call():
+                return await gateway.complete("answer", messages=MESSAGES)
+
+            close = gateway.close
+
+        started = time.perf_counter()
+        latencies, failures = await drive(call, args.requests, args.concurrency)
+        seconds = time.perf_counter() - started
+        await close()
+        return {
+            "succeeded": len(latencies) / args.requests,
+            "failures": failures,
+            "seconds": seconds,
+            "sent": faulty.requests + healthy.requests,
+            "faults": sum(faulty.faults.values()),
+            **latency_percentiles(latencies),
+        }
+
+
+async def run(args):
+    settings.openai_api_key = "stub"
+    print(
+        f"{'scenario':<10}{'ok':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'sent':>7}{'faults':>8}{'wall s':>8}"
+    )
+    for name in ("direct", "gateway", "failover"):
+        result = await scenario(name, args)
+        print(
+            f"{name:<10}{result['succeeded']:>8.1%}"
+            + "".join(
+                f"{result[key]:>9.0f}" if result[key] is not None else f"{'-':>9}"
+                for key in ("p50_ms", "p95_ms", "p99_ms")
+            )
+            + f"{result['sent']:>7}{result['faults']:>8}{result['seconds']:>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--server-rps", type=float, default=80, help="faulty server's rate limit")
+    parser.add_argument("--errors", type=float, default=0.05)
+    parser.add_argument("--slow", type=float, default=0.05)
+    parser.add_argument("--slow-latency-ms", type=float, default=3000)
+    parser.add_argument(
+        "--rate-limit-rps", type=float, default=0, help="gateway token bucket, per endpoint"
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compare PDF extraction backends on a corpus of local sample PDFs.
+
+Usage:
+    python -m benchmarks.pdf_extraction path/to/pdfs [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+from app.services.pdf_processor import _count_pages, _extract_page_range
+
+BACKENDS = ["pdfplumber", "pypdf2"]
+
+
+def load_corpus(path: str) -> dict:
+    """Read every PDF under path into memory so disk I/O isn't measured."""
+    files = sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True))
+    corpus = {}
+    for file_path in files:
+        with open(file_path, "rb") as f:
+            corpus[file_path] = f.read()
+    return corpus
+
+
+def benchmark_backend(backend: str, corpus: dict, repeat: int) -> dict:
+    pages = sum(_count_pages(content, backend) for content in corpus.values())
+    characters = 0
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for content in corpus.values():
+            characters += len(_extract_page_range(content, 0, None, backend))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "pages": pages * repeat,
+        "seconds": elapsed,
+        "pages_per_sec": pages * repeat / elapsed if elapsed else 0.0,
+        "chars_per_page": characters / (pages * repeat) if pages else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="Directory containing sample PDFs")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.path)
+    if not corpus:
+        print(f"No PDFs found under {args.path}")
+        sys.exit(1)
+
+    print(f"Corpus: {len(corpus)} PDFs, {sum(map(len, corpus.values()))} bytes")
+    print(f"{'backend':<12}{'pages':>8}{'seconds':>10}{'pages/sec':>12}{'chars/page':>12}")
+    for backend in BACKENDS:
+        result = benchmark_backend(backend, corpus, args.repeat)
+        print(
+            f"{result['backend']:<12}{result['pages']:>8}{result['seconds']:>10.2f}"
+            f"{result['pages_per_sec']:>12.1f}{result['chars_per_page']:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the RAG pipeline that runs entirely offline.
+
+Generated PDFs come from a local file server. Answers come from a stub
+OpenAI-compatible server with a fixed latency. Runs therefore repeat and
+can be compared across commits.
+
+``run`` drives the services in process. It downloads, extracts, chunks,
+embeds and indexes each document, then searches. After that it answers
+queries through QueryProcessor: first cold, ingesting the documents
+itself, then warm. Each stage reports:
+
+- throughput
+- p50/p95/p99 latency
+- peak RSS of the process and its extraction workers
+
+``--output`` writes the results as JSON. ``--baseline`` compares them with
+an earlier file and exits non-zero if any stage regressed past
+``--threshold``.
+
+``load`` serves the same documents and stub, then drives a running API at
+a target rate. It POSTs /query, then polls /jobs/{id} until each job
+finishes. Start the API against the stub first, e.g.
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 OPENAI_API_KEY=stub python main.py
+
+Usage:
+    python -m benchmarks.pipeline run [--documents 8] [--pages 40] [--queries 50] [--output run.json] [--baseline base.json]
+    python -m benchmarks.pipeline load [--api http://localhost:8080] [--qps 5] [--duration 60] [--api-pid PID]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.http import create_http_client
+from app.services.embedding_service import EmbeddingService
+from app.services.pdf_processor import PDFProcessor, create_extraction_pool
+from app.services.query_processor import QueryProcessor
+from app.services.text_chunker import TextChunker
+from app.services.vector_store import VectorStore
+from benchmarks.fixtures import PeakRSS, corpus_queries, latency_percentiles, write_corpus
+from tests.stubs import FileServer, StubOpenAI
+
+MB = 1024 * 1024
+
+
+class Stage:
+    """Latencies, units of work, wall time and peak RSS of one stage."""
+
+    def __init__(self, unit: str, pid: Optional[int] = None):
+        self.unit = unit
+        self.latencies: List[float] = []
+        self.units = 0.0
+        self.errors = 0
+        self.seconds = 0.0
+        self._rss = PeakRSS(pid)
+
+    def __enter__(self):
+        self._rss.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self._started
+        self._rss.__exit__(*exc_info)
+
+    def record(self, seconds: float, units: float = 1):
+        self.latencies.append(seconds)
+        self.units += units
+
+    def summary(self) -> Dict:
+        return {
+            "count": len(self.latencies),
+            "unit": self.unit,
+            "units": round(self.units, 3),
+            "seconds": round(self.seconds, 3),
+            "throughput": round(self.units / self.seconds, 3) if self.seconds else None,
+            **latency_percentiles(self.latencies),
+            "peak_rss_mb": round(self._rss.peak_mb, 1),
+            "errors": self.errors,
+        }
+
+
+async def run_stages(
+    urls: List[str],
+    queries: List[str],
+    client: httpx.AsyncClient,
+    pool,
+    embedding_service: EmbeddingService,
+) -> Dict[str, Stage]:
+    """Each ingest stage over every document in turn, then search."""
+    pdf_processor = PDFProcessor(client=client, executor=pool, workers=pool.workers)
+    chunker = TextChunker()
+    vector_store = VectorStore(embedding_service=embedding_service)
+    stages = {}
+
+    contents = []
+    with Stage("MB") as stages["download"]:
+        for url in urls:
+            started = time.perf_counter()
+            content, _ = await pdf_processor.fetch_pdf(url)
+            stages["download"].record(time.perf_counter() - started, len(content) / MB)
+            contents.append(content)
+
+    extracted = []
+    with Stage("pages") as stages["extract"]:
+        for content in contents:
+            started = time.perf_counter()
+            text, pages = await pdf_processor.extract_pages(content)
+            stages["extract"].record(time.perf_counter() - started, len(pages))
+            extracted.append((text, pages))
+
+    documents = []
+    with Stage("chunks") as stages["chunk"]:
+        for url, (text, pages) in zip(urls, extracted):
+            started = time.perf_counter()
+            chunks = chunker.chunk_text(text, chunker.document_metadata(url), pages)
+            stages["chunk"].record(time.perf_counter() - started, len(chunks))
+            documents.append(chunks)
+
+    embeddings = []
+    with Stage("chunks") as stages["embed"]:
+        for chunks in documents:
+            started = time.perf_counter()
+            embeddings.append(embedding_service.embed([chunk["text"] for chunk in chunks]))
+            stages["embed"].record(time.perf_counter() - started, len(chunks))
+
+    doc_ids = [f"doc-{number}" for number in range(len(documents))]
+    with Stage("chunks") as stages["index"]:
+        for doc_id, chunks, vectors in zip(doc_ids, documents, embeddings):
+            started = time.perf_counter()
+            vector_store.add_document(doc_id, chunks, vectors)
+            stages["index"].record(time.perf_counter() - started, len(chunks))
+
+    with Stage("queries") as stages["search"]:
+        for query in queries:
+            started = time.perf_counter()
+            vector_store.search(query, doc_ids=doc_ids)
+            stages["search"].record(time.perf_counter() - started)
+
+    return stages
+
+
+async def run_queries(
+    urls: List[str],
+    queries: List[str],
+    client: httpx.AsyncClient,
+    pool,
+    embedding_service: EmbeddingService,
+    args,
+) -> Dict[str, Stage]:
+    """Answer one query cold (ingesting the documents), then the rest warm."""
+    processor = QueryProcessor(
+        http_client=client,
+        extraction_executor=pool,
+        embedding_service=embedding_service,
+        extraction_workers=pool.workers,
+    )
+    stages = {}
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def answer(stage: Stage, query: str):
+        async with limit:
+            started = time.perf_counter()
+            response = await processor.process_query(query, urls, args.validation)
+            stage.record(time.perf_counter() - started)
+            if "error" in response:
+                stage.errors += 1
+                print(f"Query failed: {response['error']}")
+
+    with Stage("queries") as stages["query_cold"]:
+        await answer(stages["query_cold"], queries[0])
+    with Stage("queries") as stages["query"]:
+        await asyncio.gather(*(answer(stages["query"], query) for query in queries))
+    await processor.drain_validations()
+    await processor.close()
+    return stages
+
+
+async def run_pipeline(args) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="rag-pipeline-")
+    try:
+        # Fresh index and document cache; answers only from the stub
+        settings.faiss_index_path = os.path.join(workdir, "index")
+        settings.answer_cache_enabled = args.answer_cache
+        settings.completion_cache_enabled = args.answer_cache
+        settings.openai_api_key = "stub"
+
+        names = write_corpus(os.path.join(workdir, "pdfs"), args.documents, args.pages)
+        queries = corpus_queries(args.queries, args.documents, args.pages)
+
+        with FileServer(os.path.join(workdir, "pdfs")) as files, StubOpenAI(
+            args.llm_latency_ms
+        ) as llm:
+            settings.openai_base_url = llm.base_url
+            urls = [files.url(name) for name in names]
+
+            embedding_service = EmbeddingService()
+            embedding_service.warm_up()
+            with create_extraction_pool() as pool:
+                async with create_http_client() as client:
+                    stages = await run_stages(urls, queries, client, pool, embedding_service)
+                    stages.update(
+                        await run_queries(
+                            urls, queries, client, pool, embedding_service, args
+                        )
+                    )
+            llm_requests = llm.requests
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "parameters": {
+            key: value for key, value in vars(args).items()
+            if key not in ("mode", "output", "baseline", "threshold")
+        },
+        "settings": {
+            "embedding_model": settings.embedding_model,
+            "embedding_backend": settings.embedding_backend,
+            "pdf_extraction_backend": settings.pdf_extraction_backend,
+            "chunk_size": settings.chunk_size,
+            "vector_index_type": settings.vector_index_type,
+            "hybrid_search_enabled": settings.hybrid_search_enabled,
+        },
+        "llm_requests": llm_requests,
+        "stages": {name: stage.summary() for name, stage in stages.items()},
+    }
+
+
+def print_stages(stages: Dict[str, Dict]):
+    print(
+        f"{'stage':<12}{'count':>7}{'throughput':>18}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>9}{'errors':>8}"
+    )
+    for name, stage in stages.items():
+        throughput = f"{stage['throughput']:.1f} {stage['unit']}/s"
+        print(
+            f"{name:<12}{stage['count']:>7}{throughput:>18}"
+            f"{stage['p50_ms']:>10.1f}{stage['p95_ms']:>10.1f}{stage['p99_ms']:>10.1f}"
+            f"{stage['peak_rss_mb']:>9.0f}{stage['errors']:>8}"
+        )
+
+
+def compare(baseline: Dict, result: Dict, threshold: float) -> bool:
+    """
+    Print per-stage changes against a baseline run.
+
+    Returns:
+        True if any stage's p50 latency rose, or its throughput fell, by
+        more than ``threshold`` percent
+    """
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'} ({baseline.get('created_at')}):")
+    print(f"{'stage':<12}{'p50':>10}{'p99':>10}{'throughput':>12}{'peak RSS':>10}")
+    regressed = False
+    for name, stage in result["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if before is None:
+            continue
+        changes = {
+            key: percent_change(before.get(key), stage.get(key))
+            for key in ("p50_ms", "p99_ms", "throughput", "peak_rss_mb")
+        }
+        flag = ""
+        if (changes["p50_ms"] or 0) > threshold or (changes["throughput"] or 0) < -threshold:
+            regressed = True
+            flag = "  REGRESSED"
+        print(
+            f"{name:<12}"
+            + "".join(
+                f"{format_change(changes[key]):>{width}}"
+                for key, width in (("p50_ms", 10), ("p99_ms", 10), ("throughput", 12), ("peak_rss_mb", 10))
+            )
+            + flag
+        )
+    return regressed
+
+
+def percent_change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def format_change(change: Optional[float]) -> str:
+    return "n/a" if change is None else f"{change:+.1f}%"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load(args) -> Dict:
+    """Submit queries to the API at ``args.qps`` and poll each job to the end."""
+    workdir = tempfile.mkdtemp(prefix="rag-load-")
+    total = int(args.qps * args.duration)
+    submit = Stage("requests", pid=args.api_pid)
+    complete = Stage("jobs", pid=args.api_pid)
+    statuses = Counter()
+    try:
+        names = write_corpus(workdir, args.documents, args.pages)
+        queries = corpus_queries(total, args.documents, args.pages)
+        with FileServer(workdir, args.host, args.files_port) as files, StubOpenAI(
+            args.llm_latency_ms, args.host, args.llm_port
+        ) as llm:
+            urls = [files.url(name) for name in names]
+            print(f"Serving {len(urls)} PDFs at {files.url('')}; stub LLM at {llm.base_url}")
+            limits = httpx.Limits(max_connections=args.connections)
+
+            async with httpx.AsyncClient(
+                base_url=args.api, timeout=args.timeout, limits=limits
+            ) as client:
+
+                async def query(text: str):
+                    started = time.perf_counter()
+                    try:
+                        response = await client.post(
+                            "/query", json={"query": text, "document_urls": urls}
+                        )
+                        submit.record(time.perf_counter() - started)
+                        if response.status_code == 429:
+                            statuses["rejected"] += 1
+                            return
+                        response.raise_for_status()
+                        job_id = response.json()["job_id"]
+
+                        while True:
+                            await asyncio.sleep(args.poll_interval)
+                            response = await client.get(f"/jobs/{job_id}")
+                            response.raise_for_status()
+                            job = response.json()
+                            if job["status"] not in ("pending", "processing"):
+                                break
+                            if time.perf_counter() - started > args.timeout:
+                                statuses["timed_out"] += 1
+                                return
+                    except httpx.HTTPError as e:
+                        statuses["http_error"] += 1
+                        print(f"Request failed: {e!r}")
+                        return
+
+                    complete.record(time.perf_counter() - started)
+                    if job["status"] != "completed" or (job.get("result") or {}).get(
+                        "metadata"
+                    ) is None:
+                        complete.errors += 1
+                    statuses[job["status"]] += 1
+
+                # Open loop: send on schedule whether or not earlier jobs finished
+                tasks = []
+                with submit, complete:
+                    started = time.perf_counter()
+                    for number in range(total):
+                        delay = started + number / args.qps - time.perf_counter()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        tasks.append(asyncio.create_task(query(queries[number])))
+                    sending = time.perf_counter() - started
+                    await asyncio.gather(*tasks)
+            llm_requests = llm.requests
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "benchmark": "load",
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "parameters": {
+            key: value for key, value in vars(args).items()
+            if key not in ("mode", "output")
+        },
+        "submitted": total,
+        "achieved_qps": round(total / sending, 2) if sending else None,
+        "completed_qps": round(statuses["completed"] / complete.seconds, 2)
+        if complete.seconds
+        else None,
+        "statuses": dict(statuses),
+        "llm_requests": llm_requests,
+        "stages": {"submit": submit.summary(), "complete": complete.summary()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    run = modes.add_parser("run", help="benchmark each stage in process")
+    run.add_argument("--documents", type=int, default=8)
+    run.add_argument("--pages", type=int, default=40)
+    run.add_argument("--queries", type=int, default=50)
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--llm-latency-ms", type=float, default=200)
+    run.add_argument("--validation", default="off", choices=["off", "deferred", "inline", "structured"])
+    run.add_argument("--answer-cache", action="store_true", help="keep the answer and completion caches on")
+    run.add_argument("--output", help="write results as JSON")
+    run.add_argument("--baseline", help="earlier --output to compare against")
+    run.add_argument("--threshold", type=float, default=10, help="regression threshold, percent")
+
+    load = modes.add_parser("load", help="drive a running API at a target QPS")
+    load.add_argument("--api", default="http://localhost:8080")
+    load.add_argument("--qps", type=float, default=5)
+    load.add_argument("--duration", type=float, default=60)
+    load.add_argument("--documents", type=int, default=2)
+    load.add_argument("--pages", type=int, default=40)
+    load.add_argument("--host", default="127.0.0.1", help="address the API reaches the servers on")
+    load.add_argument("--files-port", type=int, default=8765)
+    load.add_argument("--llm-port", type=int, default=8766)
+    load.add_argument("--llm-latency-ms", type=float, default=200)
+    load.add_argument("--poll-interval", type=float, default=0.25)
+    load.add_argument("--timeout", type=float, default=300)
+    load.add_argument("--connections", type=int, default=200)
+    load.add_argument(
+        "--api-pid", type=int, help="report the API process tree's peak RSS (default: this process)"
+    )
+    load.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    if getattr(args, "api_pid", None) and not os.path.exists(f"/proc/{args.api_pid}"):
+        parser.error(f"no process {args.api_pid}")
+
+    if args.mode == "run":
+        result = asyncio.run(run_pipeline(args))
+        print_stages(result["stages"])
+    else:
+        result = asyncio.run(run_load(args))
+        print_stages(result["stages"])
+        print(
+            f"achieved {result['achieved_qps']} submits/s of {args.qps} targeted, "
+            f"{result['completed_qps']} completions/s; statuses {result['statuses']}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if getattr(args, "baseline", None):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(baseline, result, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Measure what the prompt layout and the completion cache save per LLM call.
+
+Simulates sessions of follow-up questions: each session asks --questions
+questions about one part of a policy, and retrieval returns the same
+--top-k chunks in a different rank order each time, as paraphrased
+questions do. A --repeat share of questions is asked again verbatim. Every
+call goes, one at a time, to a stub OpenAI server that models provider
+prompt caching: a prompt prefix of at least --cache-min-tokens words seen
+before is reported as cached.
+
+Layouts:
+    legacy      the prompt as it used to be built: indented templates,
+                chunks in rank order, no completion cache
+    current     LLMService: precompiled templates, chunks in document
+                order, exact-match completion cache
+
+Reports prompt tokens per call (tiktoken), the share the provider served
+from its cache, the calls that reached the server and call latency.
+
+Usage:
+    python -m benchmarks.prompt_cache [--sessions 20] [--questions 10] [--repeat 0.2]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+from typing import Dict, List, Tuple
+
+from app.core.config import settings
+from app.core.tokens import count_tokens
+from app.services.llm_service import LLMService
+from benchmarks.fixtures import corpus_queries, latency_percentiles
+from tests.stubs import StubOpenAI, page_lines
+
+
+def legacy_messages(query: str, context_chunks: List[Dict]) -> List[Dict]:
+    """The answer prompt as built before precompiled templates, for comparison."""
+    context_parts = []
+    for chunk in context_chunks:
+        source = chunk.get("document_name", "Unknown")
+        text = chunk["text"]
+        context_parts.append(f"[Source: {source}]\n{text}")
+
+    context = "\n\n---\n\n".join(context_parts)
+
+    system_prompt = """You are a helpful assistant that answers questions based solely on the provided context.
+                            Your task is to answer the user's question using ONLY the information from the provided documents.
+
+                            Important rules:
+                            1. Only use information explicitly stated in the provided context
+                            2. If the answer cannot be found in the context, clearly state that
+                            3. Do not make assumptions or add information not present in the context
+                            4. Quote or reference specific parts of the context when possible
+                            5. Be concise but thorough in your answer"""
+
+    user_prompt = f"""Context from documents:
+                            {context}
+
+                            Question: {query}
+
+                            Please answer the question based only on the provided context."""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def make_chunks(document: int, count: int, words: int) -> List[Dict]:
+    """Policy-like chunks of about ``words`` words, as search returns them."""
+    rng = random.Random(document)
+    text = " ".join(
+        line for page in range(count) for line in page_lines(rng, document, page) if line
+    ).split()
+    return [
+        {
+            "doc_id": f"policy-{document:03d}",
+            "document_name": f"policy-{document:03d}.pdf",
+            "chunk_index": index,
+            "text": " ".join(text[index * words : (index + 1) * words]),
+        }
+        for index in range(count)
+    ]
+
+
+def make_calls(args) -> List[Tuple[str, List[Dict]]]:
+    """Every session's questions with the chunks retrieved for each, in rank order."""
+    rng = random.Random(0)
+    calls = []
+    for session in range(args.sessions):
+        chunks = make_chunks(session, args.top_k * 4, args.chunk_words)
+        retrieved = rng.sample(chunks, args.top_k)
+        asked = []
+        for query in corpus_queries(args.questions, args.sessions, 20, seed=session):
+            if asked and rng.random() < args.repeat:
+                calls.append(rng.choice(asked))
+                continue
+            call = (query, rng.sample(retrieved, len(retrieved)))
+            asked.append(call)
+            calls.append(call)
+    return calls
+
+
+async def run_layout(layout: str, calls, args) -> Dict:
+    with StubOpenAI(args.latency_ms, prompt_cache_min_tokens=args.cache_min_tokens) as stub:
+        settings.openai_base_url = stub.base_url
+        settings.completion_cache_enabled = layout == "current"
+        service = LLMService()
+        latencies = []
+        prompt_tokens = 0
+        # The service logs every call's usage
+        with contextlib.redirect_stdout(io.StringIO()):
+            for query, chunks in calls:
+                if layout == "legacy":
+                    messages = legacy_messages(query, chunks)
+                else:
+                    messages = service._answer_messages(query, chunks)
+                prompt_tokens += sum(count_tokens(message["content"]) for message in messages)
+
+                started = time.perf_counter()
+                if layout == "legacy":
+                    await service.gateway.complete(
+                        "answer", messages=messages, temperature=0.1, max_tokens=1000
+                    )
+                else:
+                    await service.generate_answer(query, chunks)
+                latencies.append(time.perf_counter() - started)
+        await service.close()
+        return {
+            "sent": stub.requests,
+            "prompt_tokens": prompt_tokens / len(calls),
+            "cached": stub.usage["cached_tokens"] / max(stub.usage["prompt_tokens"], 1),
+            "mean_ms": 1000 * sum(latencies) / len(latencies),
+            **latency_percentiles(latencies),
+        }
+
+
+async def run(args):
+    settings.openai_api_key = "stub"
+    calls = make_calls(args)
+    print(
+        f"{len(calls)} calls, {args.sessions} sessions, top_k={args.top_k}, "
+        f"~{args.chunk_words} words per chunk, prompt cache from {args.cache_min_tokens} words"
+    )
+    print(
+        f"{'layout':<9}{'sent':>6}{'prompt tokens':>15}{'cached':>9}"
+        f"{'p50 ms':>9}{'mean ms':>9}"
+    )
+    for layout in ("legacy", "current"):
+        result = await run_layout(layout, calls, args)
+        print(
+            f"{layout:<9}{result['sent']:>6}{result['prompt_tokens']:>15.1f}"
+            f"{result['cached']:>9.1%}{result['p50_ms']:>9.1f}{result['mean_ms']:>9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--repeat", type=float, default=0.2, help="share asked again verbatim")
+    parser.add_argument("--top-k", type=int, default=settings.top_k_chunks)
+    parser.add_argument("--chunk-words", type=int, default=250)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Compare text splitting throughput in MB/sec: the built-in recursive splitter
+measuring characters and tiktoken tokens, against LangChain's
+RecursiveCharacterTextSplitter when it is installed (whose chunks the
+character mode must reproduce exactly).
+
+Usage:
+    python -m benchmarks.text_splitting [--mb 5] [--pdfs path/to/pdfs]
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.pdf_processor import _extract_page_range
+from app.services.text_splitter import RecursiveTextSplitter
+
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+
+def load_text(pdf_path: str, megabytes: float) -> str:
+    """Text of local PDFs, or synthetic paragraphs of policy-like prose."""
+    if pdf_path:
+        texts = []
+        for file_path in sorted(glob.glob(os.path.join(pdf_path, "**", "*.pdf"), recursive=True)):
+            with open(file_path, "rb") as f:
+                texts.append(_extract_page_range(f.read(), 0, None, "pypdf2"))
+        return "\n\n".join(texts)
+
+    rng = np.random.default_rng(0)
+    words = (
+        "roof coverage policy clause deductible wind mitigation inspection shingle "
+        "underwriting age premium claim exclusion dwelling hurricane endorsement"
+    ).split()
+    paragraphs = []
+    size = 0
+    while size < megabytes * 1024 * 1024:
+        sentences = [
+            " ".join(rng.choice(words, size=rng.integers(5, 30))).capitalize()
+            for _ in range(rng.integers(1, 12))
+        ]
+        lines = [". ".join(sentences[i : i + 3]) + "." for i in range(0, len(sentences), 3)]
+        paragraphs.append("\n".join(lines))
+        size += len(paragraphs[-1]) + 2
+    return "\n\n".join(paragraphs)
+
+
+def measure(name: str, split, text: str) -> list:
+    start = time.perf_counter()
+    chunks = split(text)
+    elapsed = time.perf_counter() - start
+    megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+    print(f"{name:<24}{megabytes / elapsed:>10.2f}{len(chunks):>10}")
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mb", type=float, default=5, help="Synthetic text size")
+    parser.add_argument("--pdfs", help="Directory of sample PDFs to split")
+    args = parser.parse_args()
+
+    text = load_text(args.pdfs, args.mb)
+    size, overlap = settings.chunk_size, settings.chunk_overlap
+    print(f"chunk_size {size}, chunk_overlap {overlap}")
+    print(f"{'splitter':<24}{'MB/sec':>10}{'chunks':>10}")
+
+    characters = measure(
+        "built-in characters",
+        RecursiveTextSplitter.from_unit("characters", size, overlap).split_text,
+        text,
+    )
+
+    try:
+        measure(
+            "built-in tokens",
+            RecursiveTextSplitter.from_unit("tokens", size, overlap).split_text,
+            text,
+        )
+    except Exception as e:
+        print(f"built-in tokens skipped: {e}")
+
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        print("langchain characters skipped: langchain is not installed")
+        return
+
+    reference = measure(
+        "langchain characters",
+        RecursiveCharacterTextSplitter(
+            chunk_size=size,
+            chunk_overlap=overlap,
+            length_function=len,
+            separators=SEPARATORS,
+            is_separator_regex=False,
+        ).split_text,
+        text,
+    )
+    print(f"Identical chunks: {characters == reference}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Report recall@k versus query latency and memory per vector for each vector
+index mode, sweeping efSearch (HNSW) and nprobe (IVF-PQ).
+
+Vectors are synthetic and clustered so the benchmark runs without the
+embedding model. Usage:
+    python -m benchmarks.vector_index [--vectors 200000] [--dimension 384]
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.vector_store import (
+    create_ann_index,
+    search_parameters,
+    train_ann_index,
+)
+
+
+def make_vectors(count: int, dimension: int, clusters: int, seed: int) -> np.ndarray:
+    """Gaussian blobs, which resemble sentence embeddings better than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype("float32")
+    labels = rng.integers(0, clusters, size=count)
+    noise = rng.normal(scale=0.4, size=(count, dimension)).astype("float32")
+    return centers[labels] + noise
+
+
+def memory_per_vector(index: faiss.Index) -> float:
+    return faiss.serialize_index(index).nbytes / index.ntotal
+
+
+def measure(index, queries, ground_truth, k) -> dict:
+    params = search_parameters(index, None, exhaustive=False)
+
+    start = time.perf_counter()
+    _, ids = index.search(queries, k, params=params)
+    elapsed = time.perf_counter() - start
+
+    hits = sum(
+        len(set(found) & set(expected)) for found, expected in zip(ids, ground_truth)
+    )
+    return {
+        "recall": hits / (len(queries) * k),
+        "latency_ms": elapsed * 1000 / len(queries),
+    }
+
+
+def report(mode, parameter, build_seconds, memory, result):
+    print(
+        f"{mode:<8}{parameter:<16}{build_seconds:>9.1f}{memory:>12.1f}"
+        f"{result['recall']:>10.3f}{result['latency_ms']:>12.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--k", type=int, default=settings.top_k_chunks)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dimension, clusters=256, seed=0)
+    queries = make_vectors(args.queries, args.dimension, clusters=256, seed=1)
+
+    print(f"{args.vectors} vectors, {args.queries} queries, d={args.dimension}, k={args.k}")
+    print(
+        f"{'mode':<8}{'parameter':<16}{'build s':>9}{'bytes/vec':>12}"
+        f"{'recall':>10}{'ms/query':>12}"
+    )
+
+    start = time.perf_counter()
+    flat = faiss.IndexFlatL2(args.dimension)
+    flat.add(vectors)
+    build_seconds = time.perf_counter() - start
+    _, ground_truth = flat.search(queries, args.k)
+    report(
+        "flat",
+        "exact",
+        build_seconds,
+        memory_per_vector(flat),
+        measure(flat, queries, ground_truth, args.k),
+    )
+
+    sweeps = {
+        "hnsw": ("efSearch", "vector_index_ef_search", [16, 32, 64, 128, 256]),
+        "ivfpq": ("nprobe", "vector_index_nprobe", [1, 4, 16, 64, 256]),
+    }
+    for mode, (name, setting, values) in sweeps.items():
+        start = time.perf_counter()
+        index = create_ann_index(mode, args.dimension)
+        train_ann_index(index, vectors)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+        memory = memory_per_vector(index)
+
+        original = getattr(settings, setting)
+        for value in values:
+            setattr(settings, setting, value)
+            result = measure(index, queries, ground_truth, args.k)
+            report(mode, f"{name}={value}", build_seconds, memory, result)
+        setattr(settings, setting, original)
+
+
+if __name__ == "__main__":
+    main()
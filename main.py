@@ -1,19 +1,67 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException, status
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, HttpUrl
-from typing import List, Optional, Dict
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
+from typing import List, Literal, Optional, Dict
+import functools
+import json
 import uvicorn
-import uuid
 from datetime import datetime
 
+from app.services.embedding_service import EmbeddingService
+from app.services.job_queue import (
+    JobQueue,
+    QueueFullError,
+    create_job_queue,
+    run_job,
+)
+from app.services.pdf_processor import create_extraction_pool
 from app.services.query_processor import QueryProcessor
+from app.core import telemetry
 from app.core.config import settings
+from app.core.http import create_http_client
+from app.core.tokens import get_encoding
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Own the pooled HTTP client, extraction pool, embedding model, vector
+    index and job queue for the app's lifetime. The model is loaded and
+    warmed before the first request, and the index is restored at startup
+    and checkpointed at shutdown.
+    """
+    global _query_processor, _job_queue
+    embedding_service = EmbeddingService()
+    embedding_service.warm_up()
+    get_encoding()
+
+    with create_extraction_pool() as extraction_pool:
+        async with create_http_client() as http_client:
+            _query_processor = QueryProcessor(
+                http_client=http_client,
+                extraction_executor=extraction_pool,
+                embedding_service=embedding_service,
+                extraction_workers=extraction_pool.workers,
+            )
+            _query_processor.load_index()
+            job_queue = get_job_queue()
+            yield
+            await job_queue.stop()
+            await job_queue.close()
+            _job_queue = None
+            _query_processor.save_index()
+            await _query_processor.close()
+            _query_processor = None
+
 
 # Create FastAPI instance
 app = FastAPI(
     title=settings.api_title,
     description="API for querying documents using LLM",
     version=settings.api_version,
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -26,17 +74,29 @@ app.add_middleware(
 )
 
 
+ValidationMode = Literal["off", "deferred", "inline", "structured"]
+
+
 class QueryRequest(BaseModel):
     query: str
     document_urls: List[HttpUrl]
+    validation: Optional[ValidationMode] = None  # defaults to settings.validation_mode
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(min_length=1)
+    document_urls: List[HttpUrl]
+    validation: Optional[ValidationMode] = None  # defaults to settings.validation_mode
 
 
 class QueryResponse(BaseModel):
     answer: str
+    query: Optional[str] = None
     confidence_note: Optional[str] = None
     job_id: Optional[str] = None
     status: Optional[str] = None
     metadata: Optional[Dict] = None
+    sources: Optional[List[Dict]] = None
 
 
 class JobStatusResponse(BaseModel):
@@ -44,13 +104,15 @@ class JobStatusResponse(BaseModel):
     status: str
     created_at: str
     completed_at: Optional[str] = None
+    validation_status: Optional[str] = None
     result: Optional[QueryResponse] = None
+    results: Optional[List[QueryResponse]] = None
+    metadata: Optional[Dict] = None
     error: Optional[str] = None
 
 
-jobs: Dict[str, Dict] = {}
-
 _query_processor = None
+_job_queue = None
 
 
 def get_query_processor():
@@ -61,25 +123,69 @@ def get_query_processor():
     return _query_processor
 
 
-async def process_query_background(job_id: str, query: str, document_urls: List[str]):
+def get_job_queue() -> JobQueue:
+    """Lazy initialization of the job queue and its workers."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = create_job_queue()
+        _job_queue.start(
+            functools.partial(run_job, _job_queue, get_query_processor())
+        )
+    return _job_queue
+
+
+async def submit_job(kind: str, payload: Dict) -> Dict:
+    """Queue a job, answering 429 when the queue is full."""
     try:
-        jobs[job_id]["status"] = "processing"
+        return await get_job_queue().submit(kind, payload)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+
 
-        query_processor = get_query_processor()
-        result = await query_processor.process_query(
-            query=query,
-            document_urls=[str(url) for url in document_urls],
-            validate=True,
+def job_status_response(job: Dict) -> JobStatusResponse:
+    response = JobStatusResponse(
+        job_id=job["job_id"],
+        status=job["status"],
+        created_at=job["created_at"],
+        completed_at=job.get("completed_at"),
+        error=job.get("error"),
+    )
+
+    result = job.get("result")
+    if job["status"] != "completed" or result is None:
+        return response
+
+    # Deferred validation notes arrive separately from the result
+    notes = job["confidence_notes"]
+    items = result["results"] if "results" in result else [result]
+    responses = []
+    pending = False
+    for position, item in enumerate(items):
+        if item.get("validation_status") == "pending" and position not in notes:
+            pending = True
+        responses.append(
+            QueryResponse(
+                answer=item["answer"],
+                query=item.get("query"),
+                confidence_note=notes.get(position, item.get("confidence_note")),
+                metadata=item.get("metadata"),
+                sources=item.get("sources"),
+            )
         )
+    if any("validation_status" in item for item in items):
+        response.validation_status = "pending" if pending else "completed"
 
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["completed_at"] = datetime.now().isoformat()
-        jobs[job_id]["result"] = result
+    if "results" in result:
+        response.results = responses
+        response.metadata = result["metadata"]
+    else:
+        response.result = responses[0]
 
-    except Exception as e:
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["completed_at"] = datetime.now().isoformat()
-        jobs[job_id]["error"] = str(e)
+    return response
 
 
 @app.get("/")
@@ -91,57 +197,75 @@ async def root():
 async def hello_world():
     return {"message": "Hello World!"}
 
-
 @app.post("/query", response_model=QueryResponse)
-async def query_documents(request: QueryRequest, background_tasks: BackgroundTasks):
-    job_id = str(uuid.uuid4())
-
-    jobs[job_id] = {
-        "job_id": job_id,
-        "status": "pending",
-        "created_at": datetime.now().isoformat(),
-        "query": request.query,
-        "document_urls": [str(url) for url in request.document_urls],
-    }
-
-    background_tasks.add_task(
-        process_query_background, job_id, request.query, request.document_urls
+async def query_documents(request: QueryRequest):
+    job = await submit_job(
+        "query",
+        {
+            "query": request.query,
+            "document_urls": [str(url) for url in request.document_urls],
+            "validation": request.validation or settings.validation_mode,
+        },
     )
 
     return QueryResponse(
         answer="Query is being processed. Use the job_id to check status.",
         status="pending",
-        job_id=job_id,
+        job_id=job["job_id"],
+    )
+
+
+@app.post("/query-batch", response_model=QueryResponse)
+async def query_documents_batch(request: BatchQueryRequest):
+    """
+    Answer many questions against one document set as a single job.
+
+    The documents are loaded and indexed once and all questions are searched
+    together; per-question results appear under ``results`` in the job.
+    """
+    job = await submit_job(
+        "batch",
+        {
+            "queries": request.queries,
+            "document_urls": [str(url) for url in request.document_urls],
+            "validation": request.validation or settings.validation_mode,
+        },
+    )
+
+    return QueryResponse(
+        answer=f"{len(request.queries)} queries are being processed. Use the job_id to check status.",
+        status="pending",
+        job_id=job["job_id"],
     )
 
 
 @app.get("/jobs/{job_id}", response_model=JobStatusResponse)
 async def get_job_status(job_id: str):
     """Get the status of a query job."""
-    if job_id not in jobs:
+    job = await get_job_queue().get(job_id)
+    if job is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found"
         )
 
-    job = jobs[job_id]
+    return job_status_response(job)
 
-    response = JobStatusResponse(
-        job_id=job["job_id"],
-        status=job["status"],
-        created_at=job["created_at"],
-        completed_at=job.get("completed_at"),
-        error=job.get("error"),
-    )
 
-    if job["status"] == "completed" and "result" in job:
-        result = job["result"]
-        response.result = QueryResponse(
-            answer=result["answer"],
-            confidence_note=result.get("confidence_note"),
-            metadata=result.get("metadata"),
+@app.post("/jobs/{job_id}/cancel", response_model=JobStatusResponse)
+async def cancel_job(job_id: str):
+    """Cancel a pending or running job."""
+    job = await get_job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found"
+        )
+    if job["status"] != "cancelled":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job {job_id} already {job['status']}",
         )
 
-    return response
+    return job_status_response(job)
 
 
 @app.post("/query-sync", response_model=QueryResponse)
@@ -149,21 +273,53 @@ async def query_documents_sync(request: QueryRequest):
     """
     Synchronous endpoint for testing - processes query immediately.
     Note: This may timeout for large documents.
+
+    In deferred validation mode the answer is returned with a job_id whose
+    record receives the confidence note once validation finishes.
     """
     try:
-        query_processor = get_query_processor()
-        result = await query_processor.process_query(
-            query=request.query,
-            document_urls=[str(url) for url in request.document_urls],
-            validate=True,
-        )
-
-        return QueryResponse(
-            answer=result["answer"],
-            confidence_note=result.get("confidence_note"),
-            status="completed",
-            metadata=result.get("metadata"),
-        )
+        validation = request.validation or settings.validation_mode
+        document_urls = [str(url) for url in request.document_urls]
+        job_id = None
+        on_validated = None
+        if validation == "deferred":
+            job_queue = get_job_queue()
+            job = await job_queue.create(
+                "query",
+                {
+                    "query": request.query,
+                    "document_urls": document_urls,
+                    "validation": validation,
+                },
+            )
+            job_id = job["job_id"]
+            on_validated = functools.partial(job_queue.attach_confidence_note, job_id)
+
+        try:
+            query_processor = get_query_processor()
+            result = await query_processor.process_query(
+                query=request.query,
+                document_urls=document_urls,
+                validation=validation,
+                on_validated=on_validated,
+            )
+
+            if job_id:
+                await job_queue.complete(job_id, result)
+
+            return QueryResponse(
+                answer=result["answer"],
+                confidence_note=result.get("confidence_note"),
+                job_id=job_id,
+                status="completed",
+                metadata=result.get("metadata"),
+                sources=result.get("sources"),
+            )
+        except Exception as e:
+            # Otherwise the job would stay "processing" until it expires
+            if job_id:
+                await job_queue.fail(job_id, str(e))
+            raise
 
     except Exception as e:
         raise HTTPException(
@@ -171,6 +327,66 @@ async def query_documents_sync(request: QueryRequest):
         )
 
 
+@app.post("/query-stream")
+async def query_documents_stream(request: QueryRequest):
+    """
+    Stream pipeline progress, then the answer token by token, as
+    Server-Sent Events. Unless validation is "off", the validation note
+    arrives as a trailing event.
+    """
+    query_processor = get_query_processor()
+
+    async def events():
+        async for event, data in query_processor.stream_query(
+            query=request.query,
+            document_urls=[str(url) for url in request.document_urls],
+            validation=request.validation or settings.validation_mode,
+        ):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/answer-cache/stats")
+async def answer_cache_stats():
+    """Answer cache hit/miss counters, for tuning the similarity threshold."""
+    answer_cache = get_query_processor().answer_cache
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await answer_cache.stats()}
+
+
+@app.get("/completion-cache/stats")
+async def completion_cache_stats():
+    """Exact-match completion cache hit/miss counters of this process."""
+    if not settings.completion_cache_enabled:
+        return {"enabled": False}
+    llm_service = get_query_processor().llm_service
+    if llm_service is None:
+        # Created on the first answer
+        return {"enabled": True, "hits": 0, "misses": 0, "hit_rate": 0.0, "entries": 0}
+    return {"enabled": True, **llm_service.completion_cache.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage latency histograms and pipeline counters for Prometheus."""
+    return PlainTextResponse(
+        telemetry.render_metrics(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/traces")
+async def traces(limit: int = 20):
+    """The spans of recently finished requests, most recent first."""
+    return {"enabled": telemetry.enabled(), "traces": telemetry.recent_traces(limit)}
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
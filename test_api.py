@@ -99,6 +99,39 @@ def test_sync_query():
         print(f"Error: {response.text}")
 
 
+def test_stream_query():
+    """Test the streaming query endpoint"""
+    print("\nTesting streaming query endpoint...")
+
+    payload = {
+        "query": "What year was the roof installed?",
+        "document_urls": [
+            "https://storage.googleapis.com/ff-interview/backend-engineer-take-home-project/wind_inspection_report.pdf"
+        ],
+    }
+
+    start = time.time()
+    first_token = None
+    with requests.post(f"{API_URL}/query-stream", json=payload, stream=True) as response:
+        print(f"Status: {response.status_code}")
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: ") :]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: ") :])
+                if event == "token":
+                    if first_token is None:
+                        first_token = time.time() - start
+                    print(data["text"], end="", flush=True)
+                else:
+                    print(f"\n[{event}] {json.dumps(data)}")
+
+    if first_token is not None:
+        print(f"\nTime to first token: {first_token:.2f}s")
+    print(f"Total time: {time.time() - start:.2f}s")
+
+
 if __name__ == "__main__":
     print("Document Query API Test Script")
     print("=" * 50)
@@ -112,6 +145,7 @@ if __name__ == "__main__":
 
         # Optionally test sync endpoint
         # test_sync_query()
+        # test_stream_query()
 
     except requests.exceptions.ConnectionError:
         print("Error: Could not connect to API. Is the server running?")
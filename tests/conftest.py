@@ -0,0 +1,151 @@
+"""
+Shared fixtures. Tests run offline: embeddings come from a hashing
+embedder instead of a sentence-transformers model, tokens are counted by
+a word encoding instead of tiktoken's downloaded BPE files, documents come
+from a local file server and completions from the stub OpenAI server in
+tests/stubs.py.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+import pytest
+import tiktoken
+
+from app.core import tokens
+from app.core.config import settings
+from app.services.lexical_index import tokenize
+from tests.stubs import FileServer, StubOpenAI, generate_pdf
+
+
+class HashingEmbedder:
+    """
+    Stands in for EmbeddingService: each word is hashed to one of
+    ``dimension`` buckets, so texts sharing words are similar.
+    """
+
+    def __init__(self, dimension: int = 64, delay: float = 0.0):
+        self.dimension = dimension
+        self.batch_size = settings.embedding_batch_size
+        # Seconds each encode takes, to widen race windows in tests
+        self.delay = delay
+
+    def warm_up(self):
+        pass
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                bucket = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16)
+                embeddings[row, bucket % self.dimension] += 1
+            if not embeddings[row].any():
+                embeddings[row, 0] = 1
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    async def embed_async(self, texts: List[str]) -> np.ndarray:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.embed(texts)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    async def embed_query_async(self, text: str) -> np.ndarray:
+        return (await self.embed_async([text]))[0]
+
+    async def embed_queries_async(self, texts: List[str]) -> np.ndarray:
+        return await self.embed_async(texts)
+
+
+class GatedEmbedder(HashingEmbedder):
+    """Holds the next query embedding, after ``hold``, until ``release``."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate: Optional[asyncio.Event] = None
+        self.entered = asyncio.Event()
+        self._armed = False
+
+    def hold(self):
+        self.gate = asyncio.Event()
+        self.entered = asyncio.Event()
+        self._armed = True
+
+    def release(self):
+        if self.gate is not None:
+            self.gate.set()
+
+    async def embed_query_async(self, text: str):
+        if self._armed:
+            self._armed = False
+            self.entered.set()
+            await self.gate.wait()
+        return await super().embed_query_async(text)
+
+
+class WordEncoding:
+    """
+    Stands in for a tiktoken encoding: one token per word, number or
+    punctuation mark, with the whitespace before it, roughly as GPT
+    encodings split English.
+    """
+
+    PIECES = re.compile(r"\s*(?:\w+|[^\w\s])|\s+")
+
+    def encode(self, text: str, disallowed_special=()) -> List[int]:
+        return [zlib.crc32(piece.encode("utf-8")) for piece in self.PIECES.findall(text)]
+
+
+def write_pdf(path: str, document: int, mtime: float = None) -> bytes:
+    """Write a two-page generated policy and return its bytes."""
+    content = generate_pdf(2, document)
+    with open(path, "wb") as f:
+        f.write(content)
+    if mtime is not None:
+        # Last-Modified has one-second resolution
+        os.utime(path, (mtime, mtime))
+    return content
+
+
+@pytest.fixture
+def documents(tmp_path, monkeypatch):
+    """
+    A directory of PDFs served over HTTP, with the LLM pointed at the stub
+    server. Yields the directory and its FileServer.
+    """
+    monkeypatch.setattr(settings, "pdf_extraction_backend", "pypdf2")
+    monkeypatch.setattr(settings, "min_similarity", 0.0)
+    directory = tmp_path / "pdfs"
+    directory.mkdir()
+    with FileServer(str(directory)) as files, StubOpenAI(latency_ms=0) as llm:
+        monkeypatch.setattr(settings, "openai_base_url", llm.base_url)
+        yield directory, files
+
+
+@pytest.fixture
+def embedder() -> HashingEmbedder:
+    return HashingEmbedder()
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(tmp_path, monkeypatch):
+    """Keep every test's index and caches in its own directory."""
+    monkeypatch.setattr(settings, "faiss_index_path", str(tmp_path / "index"))
+    monkeypatch.setattr(settings, "openai_api_key", "test")
+    monkeypatch.setattr(settings, "answer_cache_enabled", False)
+    monkeypatch.setattr(settings, "completion_cache_enabled", False)
+    monkeypatch.setattr(settings, "job_backend", "memory")
+
+
+@pytest.fixture(autouse=True)
+def offline_tokens(monkeypatch):
+    """Count tokens without tiktoken's encodings, which are downloaded on first use."""
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: WordEncoding())
+    tokens.get_encoding.cache_clear()
+    yield
+    tokens.get_encoding.cache_clear()
@@ -0,0 +1,347 @@
+"""
+Offline stand-ins for the pipeline's external inputs, shared by the tests
+and the benchmarks: generated PDFs, a local file server in place of
+document URLs and a stub OpenAI-compatible chat completions server.
+"""
+import functools
+import hashlib
+import http.server
+import json
+import math
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+WORDS = (
+    "roof coverage policy deductible wind mitigation inspection shingle "
+    "underwriting age premium claim exclusion dwelling hurricane endorsement "
+    "water damage liability replacement cost schedule limit insured flood "
+    "mold sewer backup foundation plumbing wiring electrical panel furnace "
+    "renewal cancellation notice lapse grace period payment installment "
+    "mortgagee appraisal adjuster estimate contractor permit ordinance vacancy"
+).split()
+
+LINES_PER_PAGE = 48
+CHARACTERS_PER_LINE = 90
+
+
+def page_lines(rng: random.Random, document: int, page: int) -> List[str]:
+    """Policy-like lines for one page, with numbered clauses to ask about."""
+    lines = []
+    while len(lines) < LINES_PER_PAGE:
+        lines.append(f"Clause {document + 1}.{page + 1}.{len(lines) + 1} (form HO-{rng.randint(100, 999)})")
+        for _ in range(rng.randint(3, 8)):
+            line = []
+            while sum(len(word) + 1 for word in line) < CHARACTERS_PER_LINE:
+                line.append(rng.choice(WORDS))
+            lines.append(" ".join(line).capitalize() + ".")
+        lines.append("")
+    return lines[:LINES_PER_PAGE]
+
+
+def generate_pdf(pages: int, document: int = 0) -> bytes:
+    """
+    Build a text PDF of ``pages`` letter-size pages in Helvetica.
+
+    Written directly (one content stream per page, standard font, no
+    compression), so no PDF library is needed and the bytes are the same on
+    every run for the same arguments.
+    """
+    rng = random.Random(document)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for page in range(pages):
+        operations = ["BT", "/F1 10 Tf", "14 TL", "72 740 Td"]
+        for line in page_lines(rng, document, page):
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            operations.append(f"({escaped}) Tj T*")
+        operations.append("ET")
+        stream = "\n".join(operations).encode("latin-1")
+
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_number = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % content_number
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(output)
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose: cancelled hedges, timeouts
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Server:
+    """Serve a handler on a daemon thread for the duration of a with block."""
+
+    def __init__(self, handler, host: str, port: int):
+        self._server = _HTTPServer((host, port), handler)
+        self.host = host
+        self.port = self._server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FileServer(_Server):
+    """
+    Serve a directory over HTTP, with Last-Modified and 304 revalidation,
+    in place of real document URLs.
+    """
+
+    def __init__(self, directory: str, host: str = "127.0.0.1", port: int = 0):
+        super().__init__(functools.partial(_QuietHandler, directory=directory), host, port)
+
+    def url(self, name: str) -> str:
+        return f"http://{self.host}:{self.port}/{name}"
+
+
+class StubOpenAI(_Server):
+    """
+    OpenAI-compatible ``/v1/chat/completions`` with a fixed latency.
+
+    Plain completions answer after ``latency_ms``; streamed ones spread the
+    same latency over their tokens. JSON mode returns an answer and a
+    confidence note. Usage is reported as whitespace-separated words.
+
+    Prompt caching is modelled on OpenAI's: a prompt whose first
+    ``prompt_cache_min_tokens`` or more words, in ``prompt_cache_block_tokens``
+    steps, match an earlier prompt reports that prefix as
+    ``usage.prompt_tokens_details.cached_tokens``.
+
+    Above ``rate_limit_rps`` (one second of burst) requests get a 429 with
+    ``retry-after-ms``/``Retry-After`` set to when the next would pass, as
+    OpenAI does. Faults are also injected at random (seeded): ``errors`` of
+    requests get a 500 and ``slow`` take ``slow_latency_ms`` instead.
+    ``script`` answers the first requests, in order, with the given error
+    statuses and headers, before any other fault applies.
+    """
+
+    ANSWER = (
+        "Based on the provided context, the clause covers wind and hail damage "
+        "to the roof after the deductible, subject to the listed exclusions."
+    )
+
+    def __init__(
+        self,
+        latency_ms: float = 200,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rate_limit_rps: float = 0,
+        errors: float = 0,
+        slow: float = 0,
+        slow_latency_ms: float = 5000,
+        seed: int = 0,
+        prompt_cache_min_tokens: int = 1024,
+        prompt_cache_block_tokens: int = 128,
+        script: Sequence[Tuple[int, Dict[str, str]]] = (),
+    ):
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        self.faults = {"scripted": 0, "rate_limited": 0, "error": 0, "slow": 0}
+        self._script = list(script)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = rate_limit_rps
+        self._updated = time.monotonic()
+        self.usage = {"prompt_tokens": 0, "cached_tokens": 0}
+        # Digests of every prompt prefix seen, one per block
+        self._prefixes = set()
+        stub = self
+
+        def cached_tokens(words: List[str]) -> int:
+            """Words of the longest cached prefix, and cache this prompt's."""
+            block = prompt_cache_block_tokens
+            digest = hashlib.sha256()
+            cached = 0
+            with stub._lock:
+                for end in range(block, len(words) + 1, block):
+                    digest.update(" ".join(words[end - block : end]).encode() + b"\0")
+                    prefix = digest.digest()
+                    if prefix in stub._prefixes and end >= prompt_cache_min_tokens:
+                        cached = end
+                    stub._prefixes.add(prefix)
+            return cached
+
+        def fault() -> Tuple[Optional[str], Any]:
+            """
+            The fault to inject, with the status and headers of a scripted
+            one or the seconds until a token for a 429.
+            """
+            with stub._lock:
+                stub.requests += 1
+                if stub._script:
+                    stub.faults["scripted"] += 1
+                    return "scripted", stub._script.pop(0)
+                if rate_limit_rps > 0:
+                    now = time.monotonic()
+                    stub._tokens = min(
+                        rate_limit_rps, stub._tokens + (now - stub._updated) * rate_limit_rps
+                    )
+                    stub._updated = now
+                    if stub._tokens < 1:
+                        stub.faults["rate_limited"] += 1
+                        return "rate_limited", (1 - stub._tokens) / rate_limit_rps
+                    stub._tokens -= 1
+                draw = stub._rng.random()
+                for name, rate in (("error", errors), ("slow", slow)):
+                    if draw < rate:
+                        stub.faults[name] += 1
+                        return name, 0.0
+                    draw -= rate
+            return None, 0.0
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            # Keep-alive, as real providers do, so client connection reuse counts
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                except ValueError:
+                    return  # the client gave up mid-request
+                injected, detail = fault()
+                if injected == "scripted":
+                    self._fail(*detail)
+                elif injected == "rate_limited":
+                    self._fail(
+                        429,
+                        {
+                            "retry-after-ms": f"{detail * 1000:.0f}",
+                            "Retry-After": str(math.ceil(detail)),
+                        },
+                    )
+                elif injected == "error":
+                    self._fail(500)
+                elif body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._complete(body, slow_latency_ms / 1000 if injected else stub.latency)
+
+            def _fail(self, status: int, headers: Dict[str, str] = None):
+                data = json.dumps({"error": {"message": "injected fault", "type": "stub"}}).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _complete(self, body: Dict, latency: float):
+                time.sleep(latency)
+                content = stub.ANSWER
+                if body.get("response_format", {}).get("type") == "json_object":
+                    content = json.dumps(
+                        {"answer": stub.ANSWER, "confidence_note": "Supported by the context."}
+                    )
+                words = [
+                    word
+                    for message in body.get("messages", [])
+                    for word in [message.get("role", "")] + str(message.get("content", "")).split()
+                ]
+                prompt_tokens = len(words) - len(body.get("messages", []))
+                cached = min(cached_tokens(words), prompt_tokens)
+                with stub._lock:
+                    stub.usage["prompt_tokens"] += prompt_tokens
+                    stub.usage["cached_tokens"] += cached
+                data = json.dumps(
+                    {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": len(content.split()),
+                            "total_tokens": prompt_tokens + len(content.split()),
+                            "prompt_tokens_details": {"cached_tokens": cached},
+                        },
+                    }
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body: Dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                # No length to delimit the stream, so closing the connection ends it
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                words = stub.ANSWER.split()
+                base = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                }
+                for word in words:
+                    time.sleep(stub.latency / len(words))
+                    delta = {"index": 0, "delta": {"content": word + " "}, "finish_reason": None}
+                    self._event({**base, "choices": [delta]})
+                self._event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def _event(self, data: Dict):
+                self.wfile.write(b"data: " + json.dumps(data).encode() + b"\n\n")
+                self.wfile.flush()
+
+        super().__init__(Handler, host, port)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
@@ -0,0 +1,120 @@
+import asyncio
+
+import fakeredis
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.answer_cache import AnswerCache, RedisAnswerCache
+
+DOCUMENTS = "documents"
+CHUNKS = "chunks"
+
+
+def vector(*values: float) -> np.ndarray:
+    embedding = np.zeros(8, dtype="float32")
+    embedding[: len(values)] = values
+    return embedding / np.linalg.norm(embedding)
+
+
+def axis(number: int) -> np.ndarray:
+    """Unit vector along one axis, dissimilar to every other axis."""
+    return vector(*[0] * number, 1)
+
+
+def answer(text: str):
+    return {"answer": text, "model_used": "gpt-4o"}
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request, monkeypatch):
+    """Runs a test's coroutine against a fresh cache of each backend."""
+    monkeypatch.setattr(settings, "answer_cache_max_entries", 3)
+
+    def run(test):
+        async def go():
+            if request.param == "memory":
+                cache = AnswerCache()
+            else:
+                cache = RedisAnswerCache(client=fakeredis.FakeAsyncRedis())
+            try:
+                return await test(cache)
+            finally:
+                await cache.close()
+
+        return asyncio.run(go())
+
+    return run
+
+
+def test_reuses_answers_only_above_the_similarity_threshold(backend):
+    async def test(cache):
+        await cache.put(DOCUMENTS, vector(1), CHUNKS, answer("covered"))
+        # cosine 0.995 and 0.707 against a threshold of 0.95
+        near = await cache.get(DOCUMENTS, vector(1, 0.1), CHUNKS)
+        far = await cache.get(DOCUMENTS, vector(1, 1), CHUNKS)
+        return near, far, await cache.stats()
+
+    near, far, stats = backend(test)
+    assert near == answer("covered")
+    assert far is None
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_answers_are_kept_to_their_document_and_chunk_set(backend):
+    async def test(cache):
+        await cache.put(DOCUMENTS, vector(1), CHUNKS, answer("covered"))
+        return (
+            await cache.get("other documents", vector(1), CHUNKS),
+            await cache.get(DOCUMENTS, vector(1), "other chunks"),
+        )
+
+    assert backend(test) == (None, None)
+
+
+def test_least_recently_used_answers_are_evicted(backend):
+    async def test(cache):
+        for number in range(3):
+            await cache.put(DOCUMENTS, axis(number), CHUNKS, answer(str(number)))
+            await asyncio.sleep(0.01)
+        # Used again, so the second entry is now the least recent
+        await cache.get(DOCUMENTS, axis(0), CHUNKS)
+        await asyncio.sleep(0.01)
+        await cache.put(DOCUMENTS, axis(3), CHUNKS, answer("3"))
+        return [
+            await cache.get(DOCUMENTS, axis(number), CHUNKS)
+            for number in range(4)
+        ]
+
+    assert backend(test) == [answer("0"), None, answer("2"), answer("3")]
+
+
+def test_expired_answers_are_not_reused(backend, monkeypatch):
+    monkeypatch.setattr(settings, "answer_cache_ttl_seconds", 1)
+
+    async def test(cache):
+        await cache.put(DOCUMENTS, vector(1), CHUNKS, answer("covered"))
+        await asyncio.sleep(1.1)
+        return await cache.get(DOCUMENTS, vector(1), CHUNKS)
+
+    assert backend(test) is None
+
+
+def test_redis_lookups_compare_only_the_most_recent_entries(monkeypatch):
+    monkeypatch.setattr(settings, "answer_cache_redis_candidates", 2)
+
+    async def test():
+        cache = RedisAnswerCache(client=fakeredis.FakeAsyncRedis())
+        try:
+            for number in range(3):
+                await cache.put(DOCUMENTS, axis(number), CHUNKS, answer(str(number)))
+                await asyncio.sleep(0.01)
+            return [
+                await cache.get(DOCUMENTS, axis(number), CHUNKS)
+                for number in (2, 1, 0)
+            ]
+        finally:
+            await cache.close()
+
+    # Still stored, but older than the two entries a lookup compares
+    assert asyncio.run(test()) == [answer("2"), answer("1"), None]
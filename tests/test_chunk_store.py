@@ -0,0 +1,89 @@
+import json
+import os
+
+import numpy as np
+
+from app.services.chunk_store import ChunkStore
+
+
+def chunks(*texts: str, **fields) -> list:
+    return [
+        dict({"text": text, "chunk_index": index, "total_chunks": len(texts)}, **fields)
+        for index, text in enumerate(texts)
+    ]
+
+
+def saved(store: ChunkStore, path: str) -> ChunkStore:
+    store.save(path)
+    return ChunkStore.open(path)
+
+
+def test_saved_chunks_reopen_lazily(tmp_path):
+    store = ChunkStore()
+    store.add("home", [0, 1], chunks("Roof coverage.", "Dépendance — 10 000 €", page_start=2))
+    store.add("auto", [2], chunks("Collision coverage.", start_char=0, end_char=19))
+    expected = [store.get(chunk_id) for chunk_id in range(3)]
+
+    reopened = saved(store, str(tmp_path))
+
+    # Text stays on disk until a row is read
+    assert isinstance(reopened._text, np.memmap)
+    assert len(reopened) == 3
+    assert [reopened.get(chunk_id) for chunk_id in range(3)] == expected
+    assert expected[1] == {
+        "text": "Dépendance — 10 000 €",
+        "chunk_index": 1,
+        "total_chunks": 2,
+        "start_char": None,
+        "end_char": None,
+        "page_start": 2,
+        "page_end": None,
+        "doc_id": "home",
+    }
+    assert reopened.get(3) is None
+
+
+def test_removed_chunks_are_tombstoned_until_saved(tmp_path):
+    store = ChunkStore()
+    store.add("home", [0, 1], chunks("Roof coverage.", "Hail damage."))
+    store.add("auto", [2, 3], chunks("Collision coverage.", "Glass breakage."))
+    store = saved(store, str(tmp_path / "first"))
+
+    store.remove([0, 1])
+    # Added since the save, and removed again before the next one
+    store.add("boat", [4], chunks("Hull coverage."))
+    store.remove([4])
+
+    assert len(store) == 2
+    assert 0 not in store and 4 not in store
+    assert store.get(1) is None
+    assert store.get(2)["text"] == "Collision coverage."
+
+    compacted = saved(store, str(tmp_path / "second"))
+    assert compacted._ids.tolist() == [2, 3]
+    assert not compacted._deleted
+    assert os.path.getsize(tmp_path / "second" / "text.bin") == len(
+        "Collision coverage.Glass breakage."
+    )
+    with open(tmp_path / "second" / "documents.json", encoding="utf-8") as f:
+        assert json.load(f) == ["auto"]
+    assert [compacted.get(chunk_id)["doc_id"] for chunk_id in (2, 3)] == ["auto", "auto"]
+
+
+def test_saving_over_an_open_store_leaves_it_readable(tmp_path):
+    path = str(tmp_path)
+    store = ChunkStore()
+    store.add("home", [0, 1], chunks("Roof coverage.", "Hail damage."))
+    reopened = saved(store, path)
+
+    reopened.remove([0])
+    reopened.add("auto", [2], chunks("Collision coverage."))
+    latest = saved(reopened, path)
+
+    # The replaced files are still mapped by the earlier store
+    assert reopened.get(1)["text"] == "Hail damage."
+    assert latest.get(0) is None
+    assert [latest.get(chunk_id)["text"] for chunk_id in (1, 2)] == [
+        "Hail damage.",
+        "Collision coverage.",
+    ]
@@ -0,0 +1,178 @@
+import random
+
+import pytest
+
+from app.core import telemetry
+from app.core.config import settings
+from app.core.tokens import count_tokens
+from app.services.context_assembler import ContextAssembler
+from tests.stubs import WORDS
+
+DOCUMENT = "http://example.com/policies/home.pdf"
+
+
+def words(count: int, seed: int) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def chunk(
+    text: str, index: int, start: int = None, end: int = None, doc_id: str = DOCUMENT, **extra
+):
+    """A search result for ``text[start:end]``, or all of it without offsets."""
+    result = {
+        "text": text[start:end],
+        "doc_id": doc_id,
+        "source": doc_id,
+        "chunk_index": index,
+        "start_char": start,
+        "end_char": len(text) if start is not None and end is None else end,
+        "similarity": 0.5,
+    }
+    result.update(extra)
+    return result
+
+
+@pytest.fixture(autouse=True)
+def assembly_settings(monkeypatch):
+    monkeypatch.setattr(settings, "max_context_tokens", 4000)
+    monkeypatch.setattr(settings, "context_merge_adjacent", True)
+    monkeypatch.setattr(settings, "context_dedup_threshold", 0.8)
+
+
+def test_adjacent_chunks_are_merged_sending_their_overlap_once():
+    text = words(120, seed=0)
+    other = words(40, seed=1)
+    # Chunks 0-2 overlap by a few words each; chunk 4 stands apart
+    spans = [(0, 260), (220, 480), (440, 700), None, (800, None)]
+    results = [
+        chunk(text, 1, *spans[1], similarity=0.9, page_start=1, page_end=2),
+        chunk(other, 0, 0, doc_id="http://example.com/other.pdf", similarity=0.8),
+        chunk(text, 4, *spans[4], similarity=0.7, page_start=3, page_end=3),
+        chunk(text, 0, *spans[0], similarity=0.6, page_start=1, page_end=1),
+        chunk(text, 2, *spans[2], similarity=0.4, page_start=2, page_end=2),
+    ]
+
+    passages, stats = ContextAssembler().assemble(results)
+
+    assert [passage["chunk_indexes"] for passage in passages] == [[0, 1, 2], [0], [4]]
+    merged = passages[0]
+    assert merged["text"] == text[0:700]
+    assert (merged["start_char"], merged["end_char"]) == (0, 700)
+    assert (merged["page_start"], merged["page_end"]) == (1, 2)
+    # Ranked and scored as the best of its chunks
+    assert (merged["rank"], merged["similarity"]) == (0, 0.9)
+    assert stats["chunks_merged"] == 2
+    shared = count_tokens(text[220:260]) + count_tokens(text[440:480])
+    assert abs(stats["overlap_tokens_saved"] - shared) <= 2
+
+
+def test_chunks_without_offsets_are_joined_on_their_shared_text():
+    text = words(60, seed=0)
+    middle = len(text) // 2
+    results = [
+        chunk(text[: middle + 40], 0),
+        chunk(text[middle:], 1),
+    ]
+
+    passages, _ = ContextAssembler().assemble(results)
+
+    assert [passage["text"] for passage in passages] == [text]
+
+
+def test_merging_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(settings, "context_merge_adjacent", False)
+    text = words(120, seed=0)
+    results = [chunk(text, 0, 0, 400), chunk(text, 1, 360, None)]
+
+    passages, stats = ContextAssembler().assemble(results)
+
+    assert [passage["chunk_indexes"] for passage in passages] == [[0], [1]]
+    assert stats["chunks_merged"] == 0
+
+
+def test_near_duplicate_passages_are_dropped():
+    boilerplate = words(80, seed=2)
+    # The same boilerplate on another page, one word different
+    variant = boilerplate.rsplit(" ", 1)[0] + " amended"
+    distinct = words(80, seed=3)
+    results = [
+        chunk(boilerplate, 0, doc_id="a.pdf"),
+        chunk(distinct, 0, doc_id="b.pdf"),
+        chunk(variant, 5, doc_id="c.pdf"),
+    ]
+
+    passages, stats = ContextAssembler().assemble(results)
+
+    assert [passage["doc_id"] for passage in passages] == ["a.pdf", "b.pdf"]
+    assert stats["duplicates_dropped"] == 1
+    assert stats["duplicate_tokens_saved"] == count_tokens(variant)
+
+
+def test_near_duplicates_are_kept_when_dedup_is_off(monkeypatch):
+    monkeypatch.setattr(settings, "context_dedup_threshold", 0)
+    boilerplate = words(80, seed=2)
+    results = [chunk(boilerplate, 0, doc_id="a.pdf"), chunk(boilerplate, 0, doc_id="b.pdf")]
+
+    passages, stats = ContextAssembler().assemble(results)
+
+    assert len(passages) == 2
+    assert stats["duplicates_dropped"] == 0
+
+
+def test_passages_are_packed_best_first_into_the_token_budget(monkeypatch):
+    passages = [words(size, seed=10 + number) for number, size in enumerate([40, 40, 60, 10])]
+    sizes = [count_tokens(passage) for passage in passages]
+    # Room for the first two and the small last one, not the third
+    monkeypatch.setattr(settings, "max_context_tokens", sizes[0] + sizes[1] + sizes[3])
+    results = [chunk(passage, 0, doc_id=f"{number}.pdf") for number, passage in enumerate(passages)]
+
+    selected, stats = ContextAssembler().assemble(results)
+
+    assert [passage["doc_id"] for passage in selected] == ["0.pdf", "1.pdf", "3.pdf"]
+    assert stats["budget_dropped"] == 1
+    assert stats["budget_tokens_saved"] == sizes[2]
+    assert stats["context_tokens"] == settings.max_context_tokens
+
+
+def test_the_top_passage_is_kept_even_over_budget(monkeypatch):
+    monkeypatch.setattr(settings, "max_context_tokens", 10)
+    results = [
+        chunk(words(40, seed=4), 0, doc_id="a.pdf"),
+        chunk(words(5, seed=5), 0, doc_id="b.pdf"),
+    ]
+
+    selected, stats = ContextAssembler().assemble(results)
+
+    assert [passage["doc_id"] for passage in selected] == ["a.pdf"]
+    assert stats["budget_dropped"] == 1
+
+
+def test_tokens_saved_adds_up_and_is_counted(monkeypatch):
+    text = words(120, seed=0)
+    boilerplate = words(80, seed=2)
+    results = [
+        chunk(text, 0, 0, 400),
+        chunk(text, 1, 360, None),
+        chunk(boilerplate, 0, doc_id="a.pdf"),
+        chunk(boilerplate, 0, doc_id="b.pdf"),
+        chunk(words(200, seed=6), 0, doc_id="c.pdf"),
+    ]
+    retrieved = sum(count_tokens(result["text"]) for result in results)
+    monkeypatch.setattr(settings, "max_context_tokens", retrieved // 2)
+    counted = telemetry.CONTEXT_TOKENS_SAVED.value()
+
+    passages, stats = ContextAssembler().assemble(results)
+
+    assert stats["tokens_retrieved"] == retrieved
+    assert stats["context_tokens"] == sum(count_tokens(passage["text"]) for passage in passages)
+    assert stats["tokens_saved"] == retrieved - stats["context_tokens"]
+    assert stats["tokens_saved"] == (
+        stats["overlap_tokens_saved"]
+        + stats["duplicate_tokens_saved"]
+        + stats["budget_tokens_saved"]
+    )
+    assert min(
+        stats["overlap_tokens_saved"], stats["duplicate_tokens_saved"], stats["budget_tokens_saved"]
+    ) > 0
+    assert telemetry.CONTEXT_TOKENS_SAVED.value() == counted + stats["tokens_saved"]
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.document_cache import DocumentCache
+
+
+def put(cache: DocumentCache, content: bytes, url: str) -> str:
+    content_hash = DocumentCache.content_hash(content)
+    chunks = [{"text": content.decode(), "chunk_index": 0}]
+    cache.put(content_hash, content.decode(), chunks, np.ones((1, 4), dtype="float32"))
+    cache.remember_url(url, content_hash, etag=f'"{content_hash[:8]}"')
+    return content_hash
+
+
+def test_processes_sharing_a_cache_keep_each_others_entries(tmp_path):
+    # Two processes, each with its own copy of the manifest
+    first = DocumentCache(path=str(tmp_path))
+    second = DocumentCache(path=str(tmp_path))
+
+    a = put(first, b"policy a", "http://example.com/a.pdf")
+    b = put(second, b"policy b", "http://example.com/b.pdf")
+    # Written after the other process's entry; must not drop it
+    assert first.get(a) is not None
+
+    restarted = DocumentCache(path=str(tmp_path))
+    assert restarted.get(a) is not None
+    assert restarted.get(b) is not None
+    assert restarted.lookup_url("http://example.com/a.pdf")["content_hash"] == a
+    assert restarted.lookup_url("http://example.com/b.pdf")["content_hash"] == b
+
+
+def test_removed_entries_stay_removed_for_other_processes(tmp_path):
+    first = DocumentCache(path=str(tmp_path))
+    a = put(first, b"policy a", "http://example.com/a.pdf")
+    # Started after the entry was written, so it lists it too
+    second = DocumentCache(path=str(tmp_path))
+
+    # Unreadable in the first process, which discards it
+    (tmp_path / first._entry_key(a) / "chunks.json").write_text("{")
+    assert first.get(a) is None
+    put(second, b"policy b", "http://example.com/b.pdf")
+
+    restarted = DocumentCache(path=str(tmp_path))
+    assert restarted.lookup_url("http://example.com/a.pdf") is None
+    assert restarted.lookup_url("http://example.com/b.pdf") is not None
+
+
+def test_entries_are_not_shared_across_backends(tmp_path, monkeypatch):
+    cache = DocumentCache(path=str(tmp_path))
+    content_hash = put(cache, b"policy a", "http://example.com/a.pdf")
+
+    for setting, value in [
+        ("embedding_backend", "onnx-int8"),
+        ("pdf_extraction_backend", "pypdf2"),
+    ]:
+        with monkeypatch.context() as patch:
+            patch.setattr(settings, setting, value)
+            assert DocumentCache(path=str(tmp_path)).get(content_hash) is None
+    assert DocumentCache(path=str(tmp_path)).get(content_hash) is not None
+
+
+def test_hits_batch_their_manifest_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "document_cache_access_flush_seconds", 3600)
+    cache = DocumentCache(path=str(tmp_path))
+    content_hash = put(cache, b"policy a", "http://example.com/a.pdf")
+    manifest = tmp_path / "manifest.json"
+    written = manifest.read_text()
+
+    assert asyncio.run(cache.get_async(content_hash)) is not None
+    assert manifest.read_text() == written
+
+    cache.flush()
+    key = cache._entry_key(content_hash)
+    assert json.loads(manifest.read_text())["entries"][key]["last_access"] > (
+        json.loads(written)["entries"][key]["last_access"]
+    )
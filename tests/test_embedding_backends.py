@@ -0,0 +1,62 @@
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from app.core.config import settings
+from app.services.embedding_service import EmbeddingService
+from app.services.text_chunker import TextChunker
+from tests.stubs import page_lines
+
+# Lowest cosine similarity to the torch backend's vector allowed for any
+# text; MiniLM measures above 0.9999 for all three
+MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.99, "torch-int8": 0.99}
+
+
+def sample_texts() -> list:
+    rng = random.Random(0)
+    text = "\n".join(
+        line for page in range(6) for line in page_lines(rng, 0, page) if line
+    )
+    chunks = [chunk["text"] for chunk in TextChunker().chunk_text(text)]
+    return chunks + [
+        "What is the deductible for roof damage?",
+        "Does the policy cover flood?",
+        "grace period",
+    ]
+
+
+def load(backend: str, monkeypatch) -> EmbeddingService:
+    monkeypatch.setattr(settings, "embedding_backend", backend)
+    try:
+        return EmbeddingService()
+    except OSError as e:
+        # The model is downloaded on first use
+        pytest.skip(f"Embedding model unavailable: {e}")
+
+
+def test_cpu_backends_agree_with_torch(monkeypatch):
+    pytest.importorskip("onnxruntime")
+    texts = sample_texts()
+    reference = load("torch", monkeypatch).embed(texts)
+
+    for backend, threshold in MIN_COSINE.items():
+        embeddings = load(backend, monkeypatch).embed(texts)
+        assert embeddings.shape == reference.shape
+        # Vectors are normalized, so the row-wise dot product is the cosine
+        cosine = (embeddings * reference).sum(axis=1)
+        assert cosine.min() >= threshold, f"{backend}: min cosine {cosine.min():.5f}"
+
+
+def test_torch_backend_runs_without_onnx():
+    # The app, worker and their services import no ONNX module until an
+    # onnx backend is configured
+    check = (
+        "import sys, main, app.worker; "
+        "loaded = sorted(m for m in sys.modules if m.split('.')[0] in ('onnx', 'onnxruntime')); "
+        "assert not loaded, loaded"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", check], cwd=root, check=True)
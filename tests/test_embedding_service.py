@@ -0,0 +1,102 @@
+import asyncio
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.embedding_service import EmbeddingService
+
+QUERIES = [
+    "What is the deductible for roof damage?",
+    "Does the policy cover flood?",
+    "When is the premium due?",
+]
+
+
+@pytest.fixture(scope="module")
+def model():
+    try:
+        return EmbeddingService()
+    except OSError as e:
+        # The model is downloaded on first use
+        pytest.skip(f"Embedding model unavailable: {e}")
+
+
+@pytest.fixture
+def service(model, monkeypatch):
+    """The shared model with an empty query cache, recording every encode batch."""
+    encode = model._encode
+    batches = []
+
+    def recording(texts, **kwargs):
+        batches.append(list(texts))
+        return encode(texts, **kwargs)
+
+    monkeypatch.setattr(model, "_encode", recording)
+    monkeypatch.setattr(model, "_cache", OrderedDict())
+    monkeypatch.setattr(model, "batches", batches, raising=False)
+    return model
+
+
+def test_concurrent_queries_share_one_encode(service):
+    async def run():
+        return await asyncio.gather(
+            *(service.embed_query_async(query) for query in QUERIES + QUERIES[:1])
+        )
+
+    embeddings = asyncio.run(run())
+
+    assert service.batches == [QUERIES]
+    reference = service.embed(QUERIES)
+    for embedding, expected in zip(embeddings, list(reference) + [reference[0]]):
+        assert np.allclose(embedding, expected, atol=1e-5)
+        assert np.linalg.norm(embedding) == pytest.approx(1, abs=1e-5)
+
+
+def test_queries_apart_are_encoded_separately(service, monkeypatch):
+    monkeypatch.setattr(service, "coalesce_delay", 0.01)
+
+    async def run():
+        first = asyncio.create_task(service.embed_query_async(QUERIES[0]))
+        await asyncio.sleep(0.1)
+        await service.embed_query_async(QUERIES[1])
+        await first
+
+    asyncio.run(run())
+    assert service.batches == [QUERIES[:1], QUERIES[1:2]]
+
+
+def test_cached_queries_skip_the_model(service, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_query_cache_size", 2)
+
+    async def run():
+        for query in QUERIES:
+            await service.embed_query_async(query)
+        # The first query was evicted, the last two are still cached
+        return await service.embed_queries_async(QUERIES)
+
+    embeddings = asyncio.run(run())
+
+    assert service.batches == [QUERIES[:1], QUERIES[1:2], QUERIES[2:], QUERIES[:1]]
+    assert embeddings.shape == (3, service.dimension)
+    # Cached vectors are shared, so callers can't modify them
+    assert not service.embed_query(QUERIES[2]).flags.writeable
+    assert len(service.batches) == 4
+
+
+def test_a_failed_encode_fails_every_waiting_query(service, monkeypatch):
+    def encode(texts, **kwargs):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(service, "_encode", encode)
+
+    async def run():
+        return await asyncio.gather(
+            *(service.embed_query_async(query) for query in QUERIES),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not service._cache
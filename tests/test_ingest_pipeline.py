@@ -0,0 +1,154 @@
+import asyncio
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.pdf_processor import PDFProcessor
+from app.services.query_processor import QueryProcessor
+from tests.conftest import HashingEmbedder, write_pdf
+from tests.stubs import generate_pdf
+
+QUERY = "What does clause 1.1.1 say about the roof deductible?"
+
+
+class RecordingEmbedder(HashingEmbedder):
+    """Notes how far extraction had got each time a batch is embedded."""
+
+    def __init__(self, progress: dict, delay: float = 0.0):
+        super().__init__(delay=delay)
+        self.progress = progress
+        self.calls = []
+
+    async def embed_async(self, texts):
+        self.calls.append((dict(self.progress), len(texts)))
+        embeddings = await super().embed_async(texts)
+        self.progress["embedded"] += len(texts)
+        return embeddings
+
+
+def paragraphs(count: int) -> list:
+    """Page texts long enough that every page becomes its own chunk."""
+    return [
+        f"[Page {page}]\n" + f"Clause {page} covers the roof. " * 8
+        for page in range(1, count + 1)
+    ]
+
+
+def fake_pages(monkeypatch, pages: list, progress: dict):
+    async def iter_pages(self, content):
+        offset = 0
+        for number, page in enumerate(pages, start=1):
+            text = page if number == 1 else "\n\n" + page
+            start = offset + len(text) - len(page)
+            offset += len(text)
+            progress["pages"] += 1
+            yield text, [(number, start, offset)]
+            await asyncio.sleep(0)
+
+    monkeypatch.setattr(PDFProcessor, "iter_pages", iter_pages)
+
+
+def test_pipelined_ingest_matches_ingesting_in_phases(monkeypatch):
+    monkeypatch.setattr(settings, "pdf_extraction_backend", "pypdf2")
+    monkeypatch.setattr(settings, "pdf_extraction_min_pages_per_task", 2)
+    monkeypatch.setattr(settings, "embedding_batch_size", 4)
+    content = generate_pdf(6, 0)
+    embedder = HashingEmbedder()
+    processor = QueryProcessor(embedding_service=embedder, extraction_workers=2)
+    timings = {}
+
+    async def run():
+        text, pages = await processor.pdf_processor.extract_pages(content)
+        return await processor._ingest(content, timings), text, pages
+
+    entry, text, pages = asyncio.run(run())
+
+    assert entry["text"] == text
+    assert entry["chunks"] == processor.text_chunker.chunk_text(text, pages=pages)
+    assert np.array_equal(
+        entry["embeddings"], embedder.embed([chunk["text"] for chunk in entry["chunks"]])
+    )
+    assert set(timings) == {"extract", "chunk", "embed"}
+    assert all(seconds >= 0 for seconds in timings.values())
+
+
+def test_chunks_are_embedded_in_batches_while_pages_arrive(monkeypatch):
+    monkeypatch.setattr(settings, "chunk_size", 300)
+    monkeypatch.setattr(settings, "chunk_overlap", 0)
+    monkeypatch.setattr(settings, "embedding_batch_size", 2)
+    monkeypatch.setattr(settings, "ingest_queue_batches", 2)
+    progress = {"pages": 0, "embedded": 0}
+    fake_pages(monkeypatch, paragraphs(40), progress)
+    embedder = RecordingEmbedder(progress, delay=0.005)
+    processor = QueryProcessor(embedding_service=embedder)
+
+    entry = asyncio.run(processor._ingest(b"%PDF", {}))
+
+    assert len(entry["chunks"]) == 40
+    assert [size for _, size in embedder.calls] == [2] * 20
+    # Embedding starts long before the last page is extracted
+    assert embedder.calls[0][0]["pages"] < 10
+    # Extraction never runs further ahead than the queue allows: the queued
+    # batches, one being filled, one waiting to be queued and one embedding
+    ahead = max(seen["pages"] - seen["embedded"] for seen, _ in embedder.calls)
+    assert ahead <= (settings.ingest_queue_batches + 3) * settings.embedding_batch_size
+
+
+def test_stage_timings_are_reported(documents):
+    directory, files = documents
+    write_pdf(str(directory / "policy.pdf"), 0)
+
+    async def run():
+        processor = QueryProcessor(embedding_service=HashingEmbedder())
+        try:
+            return await processor.process_query(
+                QUERY, [files.url("policy.pdf")], validation="off"
+            )
+        finally:
+            await processor.close()
+
+    timings = asyncio.run(run())["metadata"]["timings"]
+    for stage in ("download", "extract", "chunk", "embed", "index"):
+        assert timings[f"{stage}_ms"] >= 0
+
+
+def test_downloads_are_held_to_ingest_max_documents(documents, monkeypatch):
+    """Revalidations that return new content count against the limit too."""
+    directory, files = documents
+    monkeypatch.setattr(settings, "ingest_max_documents", 2)
+    names = [f"policy-{number}.pdf" for number in range(5)]
+    for number, name in enumerate(names):
+        write_pdf(str(directory / name), number, mtime=1_000_000)
+    urls = [files.url(name) for name in names]
+
+    fetching = {"now": 0, "most": 0}
+    fetch_pdf = PDFProcessor.fetch_pdf
+
+    async def counted_fetch_pdf(self, url, etag=None, last_modified=None):
+        fetching["now"] += 1
+        fetching["most"] = max(fetching["most"], fetching["now"])
+        try:
+            await asyncio.sleep(0.05)
+            return await fetch_pdf(self, url, etag=etag, last_modified=last_modified)
+        finally:
+            fetching["now"] -= 1
+
+    monkeypatch.setattr(PDFProcessor, "fetch_pdf", counted_fetch_pdf)
+
+    async def run():
+        processor = QueryProcessor(embedding_service=HashingEmbedder())
+        try:
+            first = await processor.process_query(QUERY, urls, validation="off")
+            # Every URL now serves new content
+            for number, name in enumerate(names):
+                write_pdf(str(directory / name), number + 5, mtime=2_000_000)
+            fetching["most"] = 0
+            second = await processor.process_query(QUERY, urls, validation="off")
+            return first, second
+        finally:
+            await processor.close()
+
+    first, second = asyncio.run(run())
+    assert "error" not in first and "error" not in second, second
+    assert second["metadata"]["documents_cached"] == 0
+    assert fetching["most"] == 2
@@ -0,0 +1,248 @@
+import asyncio
+import functools
+import time
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app import worker
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.services.job_queue import JobQueue, QueueFullError, RedisJobQueue, run_job
+from tests.conftest import HashingEmbedder
+
+QUERY = {
+    "query": "What is the roof deductible?",
+    "document_urls": ["http://127.0.0.1:1/policy.pdf"],
+    "validation": "off",
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The app with its lifespan, a hashing embedder and no job workers."""
+    monkeypatch.setattr(main, "EmbeddingService", HashingEmbedder)
+    monkeypatch.setattr(settings, "job_workers", 0)
+    monkeypatch.setattr(settings, "job_queue_max_size", 2)
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def redis_queue(monkeypatch):
+    sent = []
+    monkeypatch.setattr(
+        celery_app, "send_task", lambda name, args, task_id: sent.append(task_id)
+    )
+    queue = RedisJobQueue(client=fakeredis.FakeAsyncRedis(decode_responses=True))
+    queue.sent = sent
+    return queue
+
+
+def test_full_queue_answers_429(client):
+    for _ in range(2):
+        assert client.post("/query", json=QUERY).json()["status"] == "pending"
+
+    response = client.post("/query", json=QUERY)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_cancel_pending_job(client):
+    job_id = client.post("/query", json=QUERY).json()["job_id"]
+
+    response = client.post(f"/jobs/{job_id}/cancel")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "cancelled"
+    # Cancelling again is a no-op, and a cancelled job no longer holds a queue slot
+    assert client.post(f"/jobs/{job_id}/cancel").json()["status"] == "cancelled"
+    assert client.post("/jobs/unknown/cancel").status_code == 404
+    for _ in range(2):
+        assert client.post("/query", json=QUERY).status_code == 200
+
+
+def test_finished_jobs_expire(monkeypatch):
+    monkeypatch.setattr(settings, "job_ttl_seconds", 0.05)
+
+    async def run():
+        queue = JobQueue()
+        job = await queue.create("query", QUERY)
+        await queue.complete(job["job_id"], {"answer": "yes"})
+        assert (await queue.get(job["job_id"]))["status"] == "completed"
+        time.sleep(0.1)
+        return await queue.get(job["job_id"])
+
+    assert asyncio.run(run()) is None
+
+
+def test_oldest_finished_jobs_dropped_beyond_record_cap(monkeypatch):
+    monkeypatch.setattr(settings, "job_max_records", 2)
+
+    async def run():
+        queue = JobQueue()
+        jobs = [await queue.create("query", QUERY) for _ in range(3)]
+        for job in jobs:
+            await queue.complete(job["job_id"], {"answer": "yes"})
+        return [await queue.get(job["job_id"]) for job in jobs]
+
+    oldest, *rest = asyncio.run(run())
+    assert oldest is None
+    assert all(job["status"] == "completed" for job in rest)
+
+
+def test_redis_queue_rejects_submissions_beyond_capacity(redis_queue, monkeypatch):
+    monkeypatch.setattr(redis_queue, "max_queued", 1)
+
+    async def run():
+        job = await redis_queue.submit("query", QUERY)
+        with pytest.raises(QueueFullError):
+            await redis_queue.submit("query", QUERY)
+        # A started job frees its slot
+        assert await redis_queue.start_job(job["job_id"])
+        await redis_queue.submit("query", QUERY)
+
+    asyncio.run(run())
+    assert len(redis_queue.sent) == 2
+
+
+def test_redis_completion_cannot_resurrect_cancelled_job(redis_queue):
+    async def run():
+        job = await redis_queue.submit("query", QUERY)
+        job_id = job["job_id"]
+        assert await redis_queue.start_job(job_id)
+        # Cancelled from another process while the worker runs it
+        assert (await redis_queue.cancel(job_id))["status"] == "cancelled"
+        assert await redis_queue.is_cancelled(job_id)
+
+        await redis_queue.complete(job_id, {"answer": "late"})
+        await redis_queue.fail(job_id, "late")
+        assert not await redis_queue.start_job(job_id)
+        return await redis_queue.get(job_id)
+
+    job = asyncio.run(run())
+    assert job["status"] == "cancelled"
+    assert job["result"] is None and job["error"] is None
+
+
+def test_redis_job_records_expire(redis_queue, monkeypatch):
+    monkeypatch.setattr(redis_queue, "ttl", 1)
+
+    async def run():
+        job = await redis_queue.create("query", QUERY)
+        job_id = job["job_id"]
+        await redis_queue.complete(job_id, {"answer": "yes"})
+        await redis_queue.attach_confidence_note(job_id, "Supported.")
+        completed = await redis_queue.get(job_id)
+        assert 0 < await redis_queue.client.ttl(redis_queue._job_key(job_id)) <= 1
+        await asyncio.sleep(1.1)
+        return completed, await redis_queue.get(job_id)
+
+    completed, expired = asyncio.run(run())
+    assert completed["status"] == "completed"
+    assert completed["result"] == {"answer": "yes"}
+    assert completed["confidence_notes"] == {0: "Supported."}
+    assert expired is None
+
+
+def test_query_sync_marks_deferred_job_failed(client, monkeypatch):
+    job_queue = main.get_job_queue()
+    created = []
+    create = job_queue.create
+
+    async def recording_create(kind, payload):
+        job = await create(kind, payload)
+        created.append(job["job_id"])
+        return job
+
+    async def failing_process_query(**kwargs):
+        raise RuntimeError("extraction pool died")
+
+    monkeypatch.setattr(job_queue, "create", recording_create)
+    monkeypatch.setattr(
+        main.get_query_processor(), "process_query", failing_process_query
+    )
+
+    response = client.post("/query-sync", json=dict(QUERY, validation="deferred"))
+    assert response.status_code == 500
+
+    job = client.get(f"/jobs/{created[0]}").json()
+    assert job["status"] == "failed"
+    assert job["error"] == "extraction pool died"
+
+
+class StubProcessor:
+    """Answers every query, or holds it until ``release`` when ``hold`` is set."""
+
+    def __init__(self, hold: bool = False):
+        self.started = asyncio.Event()
+        self.gate = asyncio.Event()
+        if not hold:
+            self.gate.set()
+
+    async def process_query(self, **kwargs):
+        self.started.set()
+        await self.gate.wait()
+        return {"answer": "yes"}
+
+    async def drain_validations(self):
+        pass
+
+
+def test_redis_redelivered_job_starts_again(redis_queue):
+    async def run():
+        job_id = (await redis_queue.submit("query", QUERY))["job_id"]
+        assert await redis_queue.start_job(job_id)
+        # A duplicate delivery doesn't start the job twice; a redelivery
+        # after its worker died does
+        assert not await redis_queue.start_job(job_id)
+        assert await redis_queue.start_job(job_id, redelivered=True)
+        await redis_queue.complete(job_id, {"answer": "yes"})
+        assert not await redis_queue.start_job(job_id, redelivered=True)
+
+    asyncio.run(run())
+
+
+def test_worker_runs_redelivered_job(redis_queue, monkeypatch):
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(
+        worker,
+        "_worker",
+        {"loop": loop, "job_queue": redis_queue, "query_processor": StubProcessor()},
+    )
+
+    async def died_mid_run():
+        job_id = (await redis_queue.submit("query", QUERY))["job_id"]
+        await redis_queue.start_job(job_id)
+        return job_id
+
+    try:
+        job_id = loop.run_until_complete(died_mid_run())
+        worker.run_job_task.push_request(delivery_info={"redelivered": True})
+        try:
+            worker.run_job_task.run(job_id)
+        finally:
+            worker.run_job_task.pop_request()
+        job = loop.run_until_complete(redis_queue.get(job_id))
+    finally:
+        loop.close()
+
+    assert job["status"] == "completed"
+    assert job["result"] == {"answer": "yes"}
+
+
+def test_jobs_interrupted_by_shutdown_are_failed():
+    async def run():
+        queue = JobQueue()
+        processor = StubProcessor(hold=True)
+        queue.start(functools.partial(run_job, queue, processor))
+        job_id = (await queue.submit("query", QUERY))["job_id"]
+        await processor.started.wait()
+        await queue.stop()
+        return await queue.get(job_id)
+
+    job = asyncio.run(run())
+    assert job["status"] == "failed"
+    assert job["error"] == "Interrupted before the job finished"
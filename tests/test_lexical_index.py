@@ -0,0 +1,156 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.lexical_index import LexicalIndex, terms, tokenize
+from app.services.vector_store import VectorStore, reciprocal_rank_fusion
+
+DOCUMENTS = [
+    [
+        "Clause 4.2.1 excludes flood damage under form HO-3.",
+        "Roof damage from wind is covered. Roof repairs need an inspection.",
+    ],
+    [
+        "The premium is due at the start of the policy term.",
+        "Wind mitigation credits lower the premium.",
+        "Flood coverage is sold separately.",
+    ],
+]
+
+
+def index_of(*documents) -> LexicalIndex:
+    """Index documents under contiguous chunk IDs, like the vector store."""
+    index = LexicalIndex()
+    first = 0
+    for texts in documents:
+        ids = np.arange(first, first + len(texts), dtype="int64")
+        index.add(ids, LexicalIndex.analyze([{"text": text} for text in texts]))
+        first += len(texts)
+    return index
+
+
+def bm25(query: str, texts: list) -> dict:
+    """BM25 computed directly from its definition."""
+    k1, b = settings.bm25_k1, settings.bm25_b
+    documents = [terms(text) for text in texts]
+    average = sum(map(len, documents)) / len(documents)
+    scores = {}
+    for term in set(terms(query)):
+        df = sum(term in document for document in documents)
+        idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+        for chunk_id, document in enumerate(documents):
+            tf = document.count(term)
+            if tf:
+                scores[chunk_id] = scores.get(chunk_id, 0) + idf * tf * (k1 + 1) / (
+                    tf + k1 * (1 - b + b * len(document) / average)
+                )
+    return scores
+
+
+def search(index: LexicalIndex, query: str, top_k: int = 10, id_ranges=None) -> dict:
+    ids, scores = index.search(query, top_k, id_ranges)
+    return dict(zip(ids.tolist(), scores.tolist()))
+
+
+def test_codes_are_single_tokens():
+    assert tokenize("Clause 4.2.1 of form HO-3, n/a.") == [
+        "clause", "4.2.1", "of", "form", "ho-3", "n/a"
+    ]
+
+
+def test_scores_follow_bm25():
+    texts = DOCUMENTS[0] + DOCUMENTS[1]
+    index = index_of(*DOCUMENTS)
+
+    for query in ["roof damage", "flood premium wind", "HO-3", "the"]:
+        expected = bm25(query, texts)
+        found = search(index, query)
+        assert list(found) == sorted(expected, key=lambda chunk_id: -expected[chunk_id])
+        assert found == pytest.approx(expected, rel=1e-5)
+
+
+def test_id_ranges_filter_results_but_not_statistics():
+    index = index_of(*DOCUMENTS)
+
+    everywhere = search(index, "flood wind")
+    second = search(index, "flood wind", id_ranges=[(2, 3)])
+
+    assert set(second) == {3, 4}
+    assert second == {chunk_id: everywhere[chunk_id] for chunk_id in second}
+    assert list(index.search("flood wind", 1)[0]) == [next(iter(everywhere))]
+
+
+def test_removed_chunks_stop_matching_and_are_compacted_on_save(tmp_path):
+    index = index_of(*DOCUMENTS)
+    index.remove([0, 1])
+    # Scored as if only the second document had ever been indexed
+    expected = {
+        chunk_id + 2: score for chunk_id, score in bm25("flood premium", DOCUMENTS[1]).items()
+    }
+
+    assert len(index) == 3
+    assert search(index, "flood premium") == pytest.approx(expected)
+    assert search(index, "HO-3 roof") == {}
+
+    index.save(str(tmp_path))
+    reopened = LexicalIndex.open(str(tmp_path))
+    assert "ho-3" not in reopened._vocabulary
+    assert set(reopened._ids.tolist()) == {2, 3, 4}
+    assert search(reopened, "flood premium") == pytest.approx(expected)
+
+
+def test_reopened_index_merges_saved_and_new_postings(tmp_path):
+    index = index_of(DOCUMENTS[0])
+    index.save(str(tmp_path))
+    reopened = LexicalIndex.open(str(tmp_path))
+
+    ids = np.arange(2, 5, dtype="int64")
+    reopened.add(ids, LexicalIndex.analyze([{"text": text} for text in DOCUMENTS[1]]))
+
+    assert search(reopened, "flood wind premium") == pytest.approx(
+        search(index_of(*DOCUMENTS), "flood wind premium")
+    )
+
+
+def test_reciprocal_rank_fusion_favours_hits_found_by_both():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4]], k=60)
+
+    assert [chunk_id for chunk_id, _ in fused] == [3, 1, 2, 4]
+    assert dict(fused) == pytest.approx(
+        {1: 1 / 61, 2: 1 / 62, 3: 1 / 63 + 1 / 61, 4: 1 / 62}
+    )
+    # Ties go to the earlier ranking
+    assert [chunk_id for chunk_id, _ in reciprocal_rank_fusion([[5], [6]])] == [5, 6]
+
+
+def test_hybrid_search_fuses_keyword_and_vector_ranks(embedder, monkeypatch):
+    monkeypatch.setattr(settings, "hybrid_search_enabled", True)
+    store = VectorStore(embedding_service=embedder)
+    for number, texts in enumerate(DOCUMENTS):
+        store.add_document(
+            f"doc-{number}",
+            [{"text": text, "chunk_index": index} for index, text in enumerate(texts)],
+        )
+    chunk_ids = {text: chunk_id for chunk_id, text in enumerate(DOCUMENTS[0] + DOCUMENTS[1])}
+    query = "Which clause excludes flood under HO-3?"
+
+    results = store.search(query, top_k=5)
+
+    # Without query texts only vectors are searched
+    dense = store.search_batch(embedder.embed_query(query).reshape(1, -1), top_k=5)[0]
+    keyword = search(store.lexical, query)
+    expected = reciprocal_rank_fusion(
+        [[chunk_ids[hit["text"]] for hit in dense], list(keyword)]
+    )
+    assert [chunk_ids[result["text"]] for result in results] == [
+        chunk_id for chunk_id, _ in expected
+    ]
+    assert [result["fused_score"] for result in results] == pytest.approx(
+        [score for _, score in expected]
+    )
+    for result in results:
+        assert result["lexical_score"] == pytest.approx(keyword.get(chunk_ids[result["text"]]))
+    # The exact clause and form codes put their chunk first
+    assert results[0]["text"] == DOCUMENTS[0][0]
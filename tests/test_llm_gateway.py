@@ -0,0 +1,176 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from app.core import telemetry
+from app.core.config import settings
+from app.services.llm_gateway import LLMError, LLMGateway, retry_after
+from tests.stubs import StubOpenAI
+
+REQUEST = {"messages": [{"role": "user", "content": "Is roof damage covered?"}]}
+
+
+def endpoints(*stubs: StubOpenAI):
+    return [
+        {"name": f"endpoint-{number}", "base_url": stub.base_url, "model": f"model-{number}"}
+        for number, stub in enumerate(stubs)
+    ]
+
+
+def complete(*stubs: StubOpenAI, operation: str = "answer"):
+    """One routed completion: the answering endpoint's name and the seconds it took."""
+
+    async def run():
+        gateway = LLMGateway(endpoints(*stubs))
+        try:
+            started = time.monotonic()
+            endpoint, _ = await gateway.complete_routed(operation, **REQUEST)
+            return endpoint.name, time.monotonic() - started
+        finally:
+            await gateway.close()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "llm_backoff_base_seconds", 0.1)
+    monkeypatch.setattr(settings, "llm_hedge_quantile", 0)
+
+
+def test_retry_after_reads_every_header_form():
+    later = formatdate(time.time() + 30, usegmt=True)
+    assert retry_after(httpx.Headers({"retry-after-ms": "1500", "Retry-After": "9"})) == 1.5
+    assert retry_after(httpx.Headers({"Retry-After": "3"})) == 3
+    assert 28 <= retry_after(httpx.Headers({"Retry-After": later})) <= 30
+    assert retry_after(httpx.Headers({"Retry-After": formatdate(0, usegmt=True)})) == 0
+    assert retry_after(httpx.Headers({"Retry-After": "soon"})) is None
+    assert retry_after(httpx.Headers({})) is None
+
+
+def test_server_errors_are_retried_with_backoff():
+    with StubOpenAI(latency_ms=0, script=[(500, {}), (503, {})]) as stub:
+        name, seconds = complete(stub)
+
+    assert name == "endpoint-0"
+    assert stub.requests == 3
+    # Jittered to half of 0.1 s, then of 0.2 s
+    assert seconds >= 0.15
+
+
+def test_retries_stop_at_llm_max_retries(monkeypatch):
+    monkeypatch.setattr(settings, "llm_max_retries", 2)
+
+    with StubOpenAI(latency_ms=0, errors=1.0) as stub:
+        with pytest.raises(LLMError) as raised:
+            complete(stub)
+
+    assert raised.value.retryable
+    assert raised.value.status_code == 500
+    assert stub.requests == 3
+
+
+def test_http_date_retry_after_is_waited_out():
+    # Dates have whole-second resolution, so this waits up to a second
+    script = [(429, {"Retry-After": formatdate(time.time() + 1, usegmt=True)})]
+    with StubOpenAI(latency_ms=0, script=script) as stub:
+        name, _ = complete(stub)
+
+    assert name == "endpoint-0"
+    assert stub.requests == 2
+
+
+def test_retry_after_beyond_backoff_max_moves_to_the_next_endpoint(monkeypatch):
+    monkeypatch.setattr(settings, "llm_backoff_max_seconds", 1)
+
+    with StubOpenAI(latency_ms=0, script=[(429, {"Retry-After": "30"})]) as limited, StubOpenAI(
+        latency_ms=0
+    ) as fallback:
+        name, seconds = complete(limited, fallback)
+
+    # Not retried on the limited endpoint, and not waited for
+    assert name == "endpoint-1"
+    assert limited.requests == 1
+    assert fallback.requests == 1
+    assert seconds < 1
+
+
+def test_429_holds_back_every_caller_on_the_endpoint(monkeypatch):
+    monkeypatch.setattr(settings, "llm_max_retries", 1)
+
+    async def run(stub):
+        gateway = LLMGateway(endpoints(stub))
+        try:
+            first = asyncio.create_task(gateway.complete("answer", **REQUEST))
+            while stub.requests < 1:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            # A second caller, arriving after the 429, waits for the same window
+            started = time.monotonic()
+            await gateway.complete("answer", **REQUEST)
+            second = time.monotonic() - started
+            await first
+            return second
+        finally:
+            await gateway.close()
+
+    with StubOpenAI(latency_ms=0, script=[(429, {"retry-after-ms": "500"})]) as stub:
+        second = asyncio.run(run(stub))
+
+    assert stub.requests == 3
+    assert second >= 0.3
+
+
+def test_slow_calls_are_hedged_and_the_loser_cancelled(monkeypatch):
+    monkeypatch.setattr(settings, "llm_hedge_quantile", 0.95)
+    monkeypatch.setattr(settings, "llm_hedge_min_samples", 1)
+    hedges = telemetry.LLM_HEDGES.value(endpoint="endpoint-1", operation="answer")
+
+    async def run(slow, fast):
+        gateway = LLMGateway(endpoints(slow, fast))
+        try:
+            gateway.endpoints[0].record_latency("answer", 0.05)
+            started = time.monotonic()
+            endpoint, response = await gateway.complete_routed("answer", **REQUEST)
+            seconds = time.monotonic() - started
+            await asyncio.sleep(0.05)
+            others = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            return endpoint.name, response.model, seconds, others
+        finally:
+            await gateway.close()
+
+    with StubOpenAI(latency_ms=3000) as slow, StubOpenAI(latency_ms=0) as fast:
+        name, model, seconds, others = asyncio.run(run(slow, fast))
+
+    assert (name, model) == ("endpoint-1", "model-1")
+    assert seconds < 1
+    # The slower call was cancelled rather than left running
+    assert others == []
+    assert telemetry.LLM_HEDGES.value(endpoint="endpoint-1", operation="answer") == hedges + 1
+
+
+def test_invalid_requests_are_not_sent_to_another_endpoint():
+    with StubOpenAI(latency_ms=0, script=[(400, {})]) as primary, StubOpenAI(
+        latency_ms=0
+    ) as fallback:
+        with pytest.raises(LLMError) as raised:
+            complete(primary, fallback)
+
+    assert not raised.value.retryable
+    assert raised.value.status_code == 400
+    assert primary.requests == 1
+    assert fallback.requests == 0
+
+
+def test_endpoints_that_give_up_fall_back_to_the_next(monkeypatch):
+    monkeypatch.setattr(settings, "llm_max_retries", 1)
+
+    with StubOpenAI(latency_ms=0, errors=1.0) as primary, StubOpenAI(latency_ms=0) as fallback:
+        name, _ = complete(primary, fallback)
+
+    assert name == "endpoint-1"
+    assert primary.requests == 2
+    assert fallback.requests == 1
@@ -0,0 +1,46 @@
+import asyncio
+
+from app.core.config import settings
+from app.services.completion_cache import completion_key
+from app.services.llm_service import LLMService
+from tests.stubs import StubOpenAI
+
+CHUNKS = [{"text": "Roof damage is covered after the deductible.", "doc_id": "a"}]
+
+
+def test_fallback_answers_are_not_cached_as_the_first_routes(monkeypatch):
+    monkeypatch.setattr(settings, "completion_cache_enabled", True)
+    monkeypatch.setattr(settings, "llm_max_retries", 0)
+    monkeypatch.setattr(settings, "llm_hedge_quantile", 0)
+
+    with StubOpenAI(latency_ms=0, errors=1.0) as down, StubOpenAI(latency_ms=0) as up:
+        monkeypatch.setattr(
+            settings,
+            "llm_endpoints",
+            [
+                {"name": "primary", "base_url": down.base_url, "model": "primary"},
+                {"name": "fallback", "base_url": up.base_url, "model": "fallback"},
+            ],
+        )
+
+        async def run():
+            service = LLMService()
+            try:
+                for _ in range(2):
+                    await service.generate_answer("Is roof damage covered?", CHUNKS)
+                return service
+            finally:
+                await service.close()
+
+        service = asyncio.run(run())
+
+    # Both questions went to the fallback; neither was answered from cache
+    assert up.requests == 2
+    assert service.completion_cache.stats()["hits"] == 0
+    assert service.completion_cache.stats()["entries"] == 1
+    request = {
+        "messages": service._answer_messages("Is roof damage covered?", CHUNKS),
+        "temperature": 0.1,
+        "max_tokens": 1000,
+    }
+    assert service.completion_cache.get(completion_key("answer", "fallback", request))
@@ -0,0 +1,187 @@
+import asyncio
+import functools
+import http.server
+import os
+import threading
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.http import create_http_client
+from app.services.pdf_processor import PDFProcessor
+from tests.stubs import FileServer, _Server, generate_pdf
+
+MB = 1024 * 1024
+
+
+class PDFHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves ``size`` bytes of PDF in ``part``-byte writes, ``delay`` seconds
+    apart, with or without a Content-Length header. Records the bytes it
+    managed to send and the requests in flight.
+    """
+
+    def __init__(self, *args, size, part, delay, sized, content_type, stats, **kwargs):
+        self.size, self.part, self.delay = size, part, delay
+        self.sized, self.content_type, self.stats = sized, content_type, stats
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.stats["lock"]:
+            self.stats["in_flight"] += 1
+            self.stats["most_in_flight"] = max(
+                self.stats["most_in_flight"], self.stats["in_flight"]
+            )
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", self.content_type)
+            if self.sized:
+                self.send_header("Content-Length", str(self.size))
+            self.end_headers()
+            sent = 0
+            while sent < self.size:
+                time.sleep(self.delay)
+                data = b"%" * min(self.part, self.size - sent)
+                try:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                except ConnectionError:
+                    break
+                sent += len(data)
+                self.stats["sent"] = sent
+        finally:
+            with self.stats["lock"]:
+                self.stats["in_flight"] -= 1
+
+
+class PDFServer(_Server):
+    def __init__(
+        self,
+        size: int,
+        part: int = 64 * 1024,
+        delay: float = 0.0,
+        sized: bool = True,
+        content_type: str = "application/pdf",
+    ):
+        self.stats = {
+            "sent": 0,
+            "in_flight": 0,
+            "most_in_flight": 0,
+            "lock": threading.Lock(),
+        }
+        handler = functools.partial(
+            PDFHandler,
+            size=size,
+            part=part,
+            delay=delay,
+            sized=sized,
+            content_type=content_type,
+            stats=self.stats,
+        )
+        super().__init__(handler, "127.0.0.1", 0)
+
+    def url(self, name: str = "policy.pdf") -> str:
+        return f"http://{self.host}:{self.port}/{name}"
+
+
+@pytest.fixture(autouse=True)
+def one_mb_limit(monkeypatch):
+    monkeypatch.setattr(settings, "max_pdf_size_mb", 1)
+
+
+def download(*urls: str) -> list:
+    """Download URLs concurrently through one pooled client, like the app."""
+
+    async def run():
+        async with create_http_client() as client:
+            processor = PDFProcessor(client=client)
+            return await asyncio.gather(
+                *(processor.download_pdf(url) for url in urls), return_exceptions=True
+            )
+
+    return asyncio.run(run())
+
+
+def test_declared_size_over_the_limit_is_refused():
+    with PDFServer(size=2 * MB, delay=0.01) as server:
+        [error] = download(server.url())
+
+    assert isinstance(error, ValueError)
+    assert "too large" in str(error)
+    # Refused on the headers, before reading the body
+    assert server.stats["sent"] < MB
+
+
+def test_undeclared_size_is_cut_off_while_streaming():
+    with PDFServer(size=16 * MB, delay=0.002, sized=False) as server:
+        [error] = download(server.url())
+        time.sleep(0.1)
+
+    assert isinstance(error, ValueError)
+    assert "exceeds" in str(error)
+    # The connection was dropped soon after the limit, not at the end
+    assert server.stats["sent"] < 4 * MB
+
+
+def test_bodies_within_the_limit_are_returned():
+    with PDFServer(size=MB, sized=False) as unsized, PDFServer(size=MB) as sized:
+        results = download(unsized.url(), sized.url())
+
+    assert [len(result) for result in results] == [MB, MB]
+
+
+def test_non_pdf_responses_are_refused():
+    with PDFServer(size=1024, content_type="text/html") as server:
+        [error] = download(server.url())
+
+    assert isinstance(error, ValueError)
+    assert "not point to a PDF" in str(error)
+
+
+def test_downloads_run_concurrently_within_the_limit(monkeypatch):
+    monkeypatch.setattr(settings, "pdf_download_concurrency", 4)
+
+    with PDFServer(size=4 * 1024, part=1024, delay=0.05) as server:
+        started = time.monotonic()
+        results = download(*(server.url(f"policy-{number}.pdf") for number in range(8)))
+        seconds = time.monotonic() - started
+
+    assert all(isinstance(result, bytes) for result in results)
+    assert server.stats["most_in_flight"] == 4
+    # Two rounds of 0.2 s downloads, not eight
+    assert seconds < 0.8
+
+
+def test_unchanged_documents_are_revalidated_with_304(tmp_path):
+    path = tmp_path / "policy.pdf"
+    path.write_bytes(generate_pdf(1, 0))
+    os.utime(path, (1_000_000, 1_000_000))
+
+    async def run(files):
+        async with create_http_client() as client:
+            processor = PDFProcessor(client=client)
+            url = files.url("policy.pdf")
+            content, validators = await processor.fetch_pdf(url)
+            unchanged = await processor.fetch_pdf(
+                url, last_modified=validators["last_modified"]
+            )
+
+            path.write_bytes(generate_pdf(1, 1))
+            os.utime(path, (2_000_000, 2_000_000))
+            changed = await processor.fetch_pdf(
+                url, last_modified=validators["last_modified"]
+            )
+            return content, validators, unchanged, changed
+
+    with FileServer(str(tmp_path)) as files:
+        content, validators, unchanged, changed = asyncio.run(run(files))
+
+    assert content == generate_pdf(1, 0)
+    assert validators["last_modified"]
+    assert unchanged == (None, validators)
+    assert changed[0] == generate_pdf(1, 1)
+    assert changed[1]["last_modified"] != validators["last_modified"]
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.core.config import settings
+from app.services.pdf_processor import ExtractionPool, PDFProcessor
+from tests.stubs import generate_pdf
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(settings, "pdf_extraction_backend", "pypdf2")
+    monkeypatch.setattr(settings, "pdf_extraction_min_pages_per_task", 2)
+    with ExtractionPool(workers=2) as pool:
+        yield pool
+
+
+def test_process_pool_extracts_like_a_thread(pool):
+    pdf = generate_pdf(7, 0)
+
+    async def run():
+        in_thread = await PDFProcessor().extract_pages(pdf)
+        in_pool = await PDFProcessor(executor=pool, workers=pool.workers).extract_pages(pdf)
+        return in_thread, in_pool
+
+    in_thread, in_pool = asyncio.run(run())
+    assert in_pool == in_thread
+    assert [page for page, _, _ in in_pool[1]] == list(range(1, 8))
+
+
+def test_pool_recovers_after_a_worker_dies(pool):
+    pdf = generate_pdf(3, 0)
+    processor = PDFProcessor(executor=pool, workers=pool.workers)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        # What a worker segfaulting on a hostile PDF looks like
+        with pytest.raises(BrokenProcessPool):
+            await loop.run_in_executor(pool, os._exit, 1)
+        return await processor.extract_text(pdf)
+
+    assert "[Page 3]" in asyncio.run(run())
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="needs /dev/shm")
+def test_process_pool_leaves_nothing_behind(pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    before = set(os.listdir("/dev/shm"))
+    processor = PDFProcessor(executor=pool, workers=pool.workers)
+
+    async def run():
+        await processor.extract_pages(generate_pdf(5, 0))
+        # Also when extraction fails
+        with pytest.raises(Exception):
+            await processor.extract_pages(b"%PDF-1.4 not really")
+
+    asyncio.run(run())
+    assert set(os.listdir("/dev/shm")) == before
+    assert not list(tmp_path.iterdir())
+
+
+def test_page_spans_locate_each_page(monkeypatch):
+    monkeypatch.setattr(settings, "pdf_extraction_backend", "pypdf2")
+    monkeypatch.setattr(settings, "pdf_extraction_min_pages_per_task", 2)
+    # Five pages in three ranges, so spans are shifted across range joins
+    text, pages = asyncio.run(PDFProcessor(workers=2).extract_pages(generate_pdf(5, 0)))
+
+    assert [page for page, _, _ in pages] == list(range(1, 6))
+    for page, start, end in pages:
+        assert text[start:end].startswith(f"[Page {page}]\nClause 1.{page}.1 ")
+    # Pages are joined by a blank line and cover the whole text
+    assert pages[0][1] == 0 and pages[-1][2] == len(text)
+    for (_, _, end), (_, start, _) in zip(pages, pages[1:]):
+        assert text[end:start] == "\n\n"
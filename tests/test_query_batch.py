@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.core.config import settings
+from app.services.query_processor import QueryProcessor
+from app.services.vector_store import VectorStore
+from tests.conftest import HashingEmbedder, write_pdf
+
+QUERIES = [
+    "What does clause 1.1.1 say about the roof deductible?",
+    "Is flood damage excluded?",
+    "When is the premium due?",
+    "Who inspects wind mitigation?",
+    "What is the grace period?",
+]
+
+
+@pytest.fixture
+def calls(documents, monkeypatch):
+    """Runs the app against the documents fixture, recording its batched calls."""
+    calls = {"embed": [], "search": [], "answering": 0, "most_answering": 0}
+    monkeypatch.setattr(main, "EmbeddingService", HashingEmbedder)
+    monkeypatch.setattr(settings, "job_workers", 1)
+    monkeypatch.setattr(settings, "llm_max_concurrency", 2)
+
+    embed_queries_async = HashingEmbedder.embed_queries_async
+    search_batch = VectorStore.search_batch
+    answer = QueryProcessor._answer
+
+    async def recording_embed(self, texts):
+        calls["embed"].append(len(texts))
+        return await embed_queries_async(self, texts)
+
+    def recording_search(self, query_embeddings, *args, **kwargs):
+        calls["search"].append(len(query_embeddings))
+        return search_batch(self, query_embeddings, *args, **kwargs)
+
+    async def recording_answer(self, *args, **kwargs):
+        calls["answering"] += 1
+        calls["most_answering"] = max(calls["most_answering"], calls["answering"])
+        try:
+            # Long enough for every answer to be waiting on the semaphore
+            await asyncio.sleep(0.05)
+            return await answer(self, *args, **kwargs)
+        finally:
+            calls["answering"] -= 1
+
+    monkeypatch.setattr(HashingEmbedder, "embed_queries_async", recording_embed)
+    monkeypatch.setattr(VectorStore, "search_batch", recording_search)
+    monkeypatch.setattr(QueryProcessor, "_answer", recording_answer)
+    return calls
+
+
+def finished_job(client: TestClient, job_id: str) -> dict:
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("pending", "processing"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_batch_answers_every_question_in_one_job(documents, calls):
+    directory, files = documents
+    write_pdf(str(directory / "policy.pdf"), 0)
+    request = {
+        "queries": QUERIES,
+        "document_urls": [files.url("policy.pdf")],
+        "validation": "off",
+    }
+
+    with TestClient(main.app) as client:
+        submitted = client.post("/query-batch", json=request).json()
+        assert submitted["status"] == "pending"
+        job = finished_job(client, submitted["job_id"])
+        documents_indexed = len(main.get_query_processor().vector_store.documents)
+
+    assert job["status"] == "completed", job
+    assert [result["query"] for result in job["results"]] == QUERIES
+    for result in job["results"]:
+        assert result["answer"]
+        assert result["sources"]
+    assert job["metadata"]["queries"] == len(QUERIES)
+    assert job["metadata"]["documents_processed"] == 1
+    assert documents_indexed == 1
+
+    # One encode and one index search for all questions, then answers
+    # generated at most llm_max_concurrency at a time
+    assert calls["embed"] == [len(QUERIES)]
+    assert calls["search"] == [len(QUERIES)]
+    assert calls["most_answering"] == 2
+
+
+def test_batch_requires_a_question(documents, calls):
+    _, files = documents
+    with TestClient(main.app) as client:
+        response = client.post(
+            "/query-batch", json={"queries": [], "document_urls": [files.url("policy.pdf")]}
+        )
+    assert response.status_code == 422
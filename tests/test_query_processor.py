@@ -0,0 +1,132 @@
+import asyncio
+
+from app.core import telemetry
+from app.core.config import settings
+from app.services.document_cache import DocumentCache
+from app.services.query_processor import QueryProcessor
+from tests.conftest import GatedEmbedder, HashingEmbedder, write_pdf
+
+QUERY = "What does clause 1.1.1 say about the roof deductible?"
+
+
+def test_concurrent_queries_on_overlapping_documents(documents):
+    directory, files = documents
+    for document, name in enumerate(["a.pdf", "b.pdf", "c.pdf"]):
+        write_pdf(str(directory / name), document)
+    a, b, c = (files.url(name) for name in ["a.pdf", "b.pdf", "c.pdf"])
+
+    async def run():
+        processor = QueryProcessor(embedding_service=HashingEmbedder())
+        try:
+            return await asyncio.gather(
+                *(
+                    processor.process_query(QUERY, urls, validation="off")
+                    for urls in ([a], [b], [a, b], [b, c], [a, b, c], [c, a])
+                )
+            ), processor
+        finally:
+            await processor.close()
+
+    results, processor = asyncio.run(run())
+    for result, urls in zip(results, ([a], [b], [a, b], [b, c], [a, b, c], [c, a])):
+        assert "error" not in result, result
+        assert result["metadata"]["documents_processed"] == len(urls)
+        # Every source comes from the request's own documents
+        assert {source["source"] for source in result["sources"]} <= set(urls)
+    assert len(processor.vector_store.documents) == 3
+    assert not processor.vector_store._pins
+
+
+def test_replacing_a_document_while_it_is_searched(documents):
+    directory, files = documents
+    path = str(directory / "policy.pdf")
+    old_id = DocumentCache.content_hash(write_pdf(path, 0, mtime=1_000_000))
+    url = files.url("policy.pdf")
+
+    async def run():
+        embedder = GatedEmbedder()
+        processor = QueryProcessor(embedding_service=embedder)
+        vector_store = processor._get_vector_store()
+        try:
+            first = await processor.process_query(QUERY, [url], validation="off")
+            assert "error" not in first, first
+
+            # A request is held between loading (its pin is taken) and search
+            embedder.hold()
+            searching = asyncio.create_task(
+                processor.process_query(QUERY, [url], validation="off")
+            )
+            await embedder.entered.wait()
+
+            # Meanwhile the URL starts serving new content
+            new_id = DocumentCache.content_hash(write_pdf(path, 1, mtime=2_000_000))
+            replaced = await processor.process_query(QUERY, [url], validation="off")
+            assert "error" not in replaced, replaced
+            assert vector_store.has_document(new_id)
+            # Still pinned by the held request, so only marked stale
+            assert vector_store.has_document(old_id)
+
+            embedder.release()
+            return await searching, vector_store, new_id
+        finally:
+            embedder.release()
+            await processor.close()
+
+    held, vector_store, new_id = asyncio.run(run())
+    assert "error" not in held, held
+    assert held["metadata"]["chunks_used"] > 0
+    assert held["sources"]
+    # The old content went once its last pin was released
+    assert not vector_store.has_document(old_id)
+    assert vector_store.has_document(new_id)
+    assert not vector_store._pins
+
+
+def test_queries_without_relevant_chunks_report_their_trace(documents, monkeypatch):
+    directory, files = documents
+    write_pdf(str(directory / "policy.pdf"), 0)
+    # No chunk is this similar
+    monkeypatch.setattr(settings, "min_similarity", 1.1)
+
+    async def run():
+        processor = QueryProcessor(embedding_service=HashingEmbedder())
+        try:
+            return await processor.process_query(
+                QUERY, [files.url("policy.pdf")], validation="off"
+            )
+        finally:
+            await processor.close()
+
+    result = asyncio.run(run())
+    assert result["chunks_found"] == 0
+    assert result["metadata"]["documents_processed"] == 1
+    assert "search_ms" in result["metadata"]["timings"]
+
+    trace = next(
+        trace
+        for trace in telemetry.recent_traces()
+        if trace["trace_id"] == result["metadata"]["trace_id"]
+    )
+    search = next(span for span in trace["spans"] if span["name"] == "search")
+    assert search["attributes"]["hits"] == 0
+
+
+def test_answers_cite_pages_and_offsets(documents):
+    directory, files = documents
+    write_pdf(str(directory / "policy.pdf"), 0)
+    url = files.url("policy.pdf")
+
+    async def run():
+        processor = QueryProcessor(embedding_service=HashingEmbedder())
+        try:
+            return await processor.process_query(QUERY, [url], validation="off")
+        finally:
+            await processor.close()
+
+    result = asyncio.run(run())
+    assert "error" not in result, result
+    assert len(result["sources"]) == result["metadata"]["chunks_used"] > 0
+    for source in result["sources"]:
+        assert (source["source"], source["document_name"]) == (url, "policy.pdf")
+        assert 1 <= source["page_start"] <= source["page_end"] <= 2
+        assert 0 <= source["start_char"] < source["end_char"]
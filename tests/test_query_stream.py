@@ -0,0 +1,151 @@
+import asyncio
+import json
+from typing import Dict, List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.core.config import settings
+from app.services.query_processor import QueryProcessor
+from tests.stubs import StubOpenAI
+from tests.conftest import GatedEmbedder, HashingEmbedder, write_pdf
+
+QUERY = "What does clause 1.1.1 say about the roof deductible?"
+
+
+def parse_events(body: str) -> List[Tuple[str, Dict]]:
+    """Split a Server-Sent Events body into ``(event, data)`` pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def policy_url(documents):
+    directory, files = documents
+    write_pdf(str(directory / "policy.pdf"), 0)
+    return files.url("policy.pdf")
+
+
+def use_processor(monkeypatch, embedder) -> QueryProcessor:
+    """Serve the app from a processor on the given embedder, skipping the lifespan."""
+    processor = QueryProcessor(embedding_service=embedder)
+    monkeypatch.setattr(main, "_query_processor", processor)
+    return processor
+
+
+def test_query_stream_sends_tokens_then_answer(policy_url, monkeypatch):
+    processor = use_processor(monkeypatch, HashingEmbedder())
+
+    response = TestClient(main.app).post(
+        "/query-stream",
+        json={"query": QUERY, "document_urls": [policy_url], "validation": "off"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    names = [event for event, _ in events]
+    assert names[0] == "status"
+    assert names[-2:] == ["answer", "done"]
+
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) == len(StubOpenAI.ANSWER.split())
+    assert "".join(tokens).strip() == StubOpenAI.ANSWER
+    # Every token arrives before the final answer event
+    assert names.index("answer") > max(i for i, name in enumerate(names) if name == "token")
+
+    answer = events[-2][1]
+    assert answer["answer"].strip() == StubOpenAI.ANSWER
+    assert answer["metadata"]["chunks_used"] > 0
+    assert answer["metadata"]["documents_processed"] == 1
+    assert "timings" in answer["metadata"]
+    assert answer["metadata"]["trace_id"]
+    assert answer["sources"]
+    assert not processor.vector_store._pins
+
+
+def test_query_stream_reports_the_model_that_answered(policy_url, monkeypatch):
+    monkeypatch.setattr(settings, "llm_max_retries", 0)
+    use_processor(monkeypatch, HashingEmbedder())
+
+    with StubOpenAI(latency_ms=0, errors=1.0) as down:
+        monkeypatch.setattr(
+            settings,
+            "llm_endpoints",
+            [
+                {"name": "primary", "base_url": down.base_url, "model": "primary"},
+                {"name": "fallback", "model": "fallback"},
+            ],
+        )
+        response = TestClient(main.app).post(
+            "/query-stream",
+            json={"query": QUERY, "document_urls": [policy_url], "validation": "off"},
+        )
+
+    answer = dict(parse_events(response.text))["answer"]
+    assert answer["answer"].strip() == StubOpenAI.ANSWER
+    assert answer["metadata"]["model_used"] == "fallback"
+
+
+def test_query_stream_releases_pins_on_disconnect(policy_url, monkeypatch):
+    embedder = GatedEmbedder()
+    processor = use_processor(monkeypatch, embedder)
+    body = json.dumps(
+        {"query": QUERY, "document_urls": [policy_url], "validation": "off"}
+    ).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/query-stream",
+        "raw_path": b"/query-stream",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"host", b"test")],
+        "client": ("127.0.0.1", 1),
+        "server": ("test", 80),
+    }
+
+    async def run():
+        # The search is held, so the request's documents stay pinned until
+        # the client goes away
+        embedder.hold()
+        disconnected = asyncio.Event()
+        requested = False
+        sent = []
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        app = asyncio.create_task(main.app(scope, receive, send))
+        await embedder.entered.wait()
+        assert processor.vector_store._pins
+
+        disconnected.set()
+        await asyncio.wait_for(app, timeout=10)
+        return sent
+
+    try:
+        sent = asyncio.run(run())
+    finally:
+        embedder.release()
+
+    streamed = b"".join(message.get("body", b"") for message in sent)
+    events = [event for event, _ in parse_events(streamed.decode())]
+    assert "searching" in streamed.decode()
+    assert "token" not in events and "answer" not in events
+    assert not processor.vector_store._pins
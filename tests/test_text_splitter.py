@@ -0,0 +1,161 @@
+import random
+
+import pytest
+
+from app.core.config import settings
+from app.core.tokens import count_tokens
+from app.services.text_chunker import TextChunker
+from app.services.text_splitter import RecursiveTextSplitter
+from tests.stubs import page_lines
+
+# Expected chunks were captured from LangChain 0.1.0's
+# RecursiveCharacterTextSplitter with the separators TextChunker used
+PARITY = [
+    (
+        # Paragraph boundaries, then sentence boundaries within one
+        "Section 1. Roof coverage applies to wind and hail damage.\n\n"
+        "Section 2. The deductible is 1,000 dollars per claim. "
+        "It is waived for total losses.\n\n"
+        "Section 3. Flood and sewer backup are excluded.",
+        60,
+        20,
+        [
+            "Section 1. Roof coverage applies to wind and hail damage.",
+            "Section 2. The deductible is 1,000 dollars per claim",
+            ". It is waived for total losses.",
+            "Section 3. Flood and sewer backup are excluded.",
+        ],
+    ),
+    (
+        # Words carried over into the next chunk
+        "The insurer pays for roof repairs once the deductible is met "
+        "and an adjuster has inspected the damage",
+        40,
+        15,
+        [
+            "The insurer pays for roof repairs once",
+            "repairs once the deductible is met and",
+            "is met and an adjuster has inspected",
+            "has inspected the damage",
+        ],
+    ),
+    (
+        # Lines, then sentences, then words, then characters of a long URL
+        "Claims must be filed within 60 days.\n"
+        "Notice goes to https://claims.example.com/policies/HO-3/forms/notice-of-loss today. "
+        "Late notice may void coverage",
+        40,
+        10,
+        [
+            "Claims must be filed within 60 days.",
+            "Notice goes to",
+            "https://claims.example.com/policies/HO-",
+            "licies/HO-3/forms/notice-of-loss",
+            "today",
+            ". Late notice may void coverage",
+        ],
+    ),
+]
+
+
+def policy_text(pages: int = 3) -> str:
+    rng = random.Random(0)
+    return "\n\n".join("\n".join(page_lines(rng, 0, page)) for page in range(pages))
+
+
+@pytest.mark.parametrize("text, chunk_size, chunk_overlap, expected", PARITY)
+def test_chunks_match_langchain(text, chunk_size, chunk_overlap, expected):
+    splitter = RecursiveTextSplitter(chunk_size, chunk_overlap)
+    assert splitter.split_text(text) == expected
+
+
+@pytest.mark.parametrize("text, chunk_size, chunk_overlap, expected", PARITY)
+def test_offsets_locate_each_chunk(text, chunk_size, chunk_overlap, expected):
+    splitter = RecursiveTextSplitter(chunk_size, chunk_overlap)
+    split = splitter.split_text_with_offsets(text)
+
+    assert [chunk for chunk, _ in split] == expected
+    for chunk, offset in split:
+        assert text[offset : offset + len(chunk)] == chunk
+
+
+@pytest.mark.parametrize("part_size", [1, 7, 113, 1000, None])
+@pytest.mark.parametrize(
+    "text, chunk_size, chunk_overlap",
+    [(policy_text(), 300, 60), (PARITY[2][0], 40, 10)],
+)
+def test_stream_matches_splitting_at_once(text, chunk_size, chunk_overlap, part_size):
+    splitter = RecursiveTextSplitter(chunk_size, chunk_overlap)
+    part_size = part_size or len(text)
+
+    stream = splitter.stream()
+    chunks = []
+    for start in range(0, len(text), part_size):
+        chunks.extend(stream.feed(text[start : start + part_size]))
+    chunks.extend(stream.close())
+
+    assert chunks == splitter.split_text_with_offsets(text)
+
+
+def test_token_chunks_fit_the_token_budget(monkeypatch):
+    monkeypatch.setattr(settings, "chunk_length_unit", "tokens")
+    monkeypatch.setattr(settings, "chunk_size", 50)
+    monkeypatch.setattr(settings, "chunk_overlap", 20)
+    text = policy_text()
+
+    chunks = TextChunker().chunk_text(text)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk["text"]) <= 50 for chunk in chunks)
+    # Characters would allow far fewer words per chunk
+    assert max(len(chunk["text"]) for chunk in chunks) > 50
+    # Within a paragraph, chunks carry lines over, up to chunk_overlap tokens
+    overlaps = [
+        text[after["start_char"] : before["end_char"]]
+        for before, after in zip(chunks, chunks[1:])
+        if after["start_char"] < before["end_char"]
+    ]
+    assert overlaps
+    assert all(0 < count_tokens(overlap) <= 20 for overlap in overlaps)
+
+
+def test_chunks_carry_their_position_and_source(monkeypatch):
+    monkeypatch.setattr(settings, "chunk_size", 300)
+    monkeypatch.setattr(settings, "chunk_overlap", 60)
+    chunker = TextChunker()
+    pages = [policy_text(1), policy_text(1)]
+    text = "\n\n".join(pages)
+    spans = [(1, 0, len(pages[0])), (2, len(pages[0]) + 2, len(text))]
+    url = "http://example.com/policies/home.pdf"
+
+    chunks = chunker.chunk_documents(
+        {url: text, "http://example.com/broken.pdf": "Error: not a PDF"},
+        pages={url: spans},
+    )
+
+    assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    assert {chunk["total_chunks"] for chunk in chunks} == {len(chunks)}
+    assert {chunk["source"] for chunk in chunks} == {url}
+    assert {chunk["document_name"] for chunk in chunks} == {"home.pdf"}
+    for chunk in chunks:
+        assert text[chunk["start_char"] : chunk["end_char"]] == chunk["text"]
+        assert chunk["page_start"] == (1 if chunk["start_char"] < spans[1][1] else 2)
+        assert chunk["page_end"] == (1 if chunk["end_char"] <= spans[0][2] else 2)
+    assert chunks[0]["page_start"] == 1 and chunks[-1]["page_end"] == 2
+
+
+def test_chunk_stream_matches_chunk_text(monkeypatch):
+    monkeypatch.setattr(settings, "chunk_size", 300)
+    monkeypatch.setattr(settings, "chunk_overlap", 60)
+    chunker = TextChunker()
+    metadata = chunker.document_metadata("http://example.com/policies/home.pdf")
+    pages = [policy_text(1), policy_text(2)]
+    text = "\n\n".join(pages)
+    spans = [(1, 0, len(pages[0])), (2, len(pages[0]) + 2, len(text))]
+
+    stream = chunker.stream(metadata)
+    stream.feed(pages[0], spans[:1])
+    stream.feed("\n\n" + pages[1], spans[1:])
+    stream.close()
+
+    assert stream.chunks == chunker.chunk_text(text, metadata, spans)
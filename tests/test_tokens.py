@@ -0,0 +1,11 @@
+from app.core.tokens import encoding_name
+
+
+def test_models_are_counted_with_their_own_encoding():
+    assert encoding_name("gpt-4o") == "o200k_base"
+    assert encoding_name("gpt-4o-2024-08-06") == "o200k_base"
+    assert encoding_name("gpt-3.5-turbo") == "cl100k_base"
+
+
+def test_unknown_models_fall_back_to_cl100k_base():
+    assert encoding_name("llama-3-70b-instruct") == "cl100k_base"
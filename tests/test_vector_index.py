@@ -0,0 +1,124 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.vector_store import VectorStore
+from tests.stubs import WORDS
+
+DOCUMENTS = 12
+CHUNKS_PER_DOCUMENT = 50
+
+
+def text(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(12))
+
+
+def corpus(seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    return {
+        f"doc-{number}": [
+            {"text": text(rng), "chunk_index": index} for index in range(CHUNKS_PER_DOCUMENT)
+        ]
+        for number in range(DOCUMENTS)
+    }
+
+
+def chunk_id(store: VectorStore, result: dict) -> int:
+    return store.documents[result["doc_id"]][0] + result["chunk_index"]
+
+
+def exact_top(store: VectorStore, documents: dict, query: str, top_k: int, doc_ids=None):
+    """Chunk IDs of the ``top_k`` nearest chunks by brute force."""
+    candidates = [
+        (store.documents[doc_id][0] + chunk["chunk_index"], chunk["text"])
+        for doc_id, chunks in documents.items()
+        if store.has_document(doc_id) and (doc_ids is None or doc_id in doc_ids)
+        for chunk in chunks
+    ]
+    vectors = store.create_embeddings([chunk_text for _, chunk_text in candidates])
+    similarities = vectors @ store.embedding_service.embed_query(query)
+    return [candidates[row][0] for row in np.argsort(-similarities, kind="stable")[:top_k]]
+
+
+@pytest.fixture(params=["hnsw", "ivfpq"])
+def index_type(request, monkeypatch):
+    monkeypatch.setattr(settings, "hybrid_search_enabled", False)
+    monkeypatch.setattr(settings, "vector_index_type", request.param)
+    monkeypatch.setattr(settings, "vector_index_promotion_threshold", 400)
+    monkeypatch.setattr(settings, "vector_index_nlist", 8)
+    monkeypatch.setattr(settings, "vector_index_nprobe", 4)
+    monkeypatch.setattr(settings, "vector_index_pq_m", 16)
+    monkeypatch.setattr(settings, "vector_index_pq_nbits", 6)
+    monkeypatch.setattr(settings, "vector_search_exhaustive_max", 100)
+    return request.param
+
+
+@pytest.fixture
+def promoted(index_type, embedder):
+    """A store promoted part way through adding the corpus."""
+    documents = corpus()
+    store = VectorStore(embedding_service=embedder)
+    types = []
+    for doc_id, chunks in documents.items():
+        store.add_document(doc_id, chunks)
+        types.append(store.index_type)
+    return store, documents, types
+
+
+def test_flat_index_is_promoted_at_the_threshold(index_type, promoted):
+    store, _, types = promoted
+
+    # 400 vectors are reached with the eighth document
+    assert types == ["flat"] * 7 + [index_type] * 5
+    assert store.index.ntotal == DOCUMENTS * CHUNKS_PER_DOCUMENT
+
+
+def test_promoted_index_finds_the_nearest_chunks(index_type, promoted):
+    store, documents, _ = promoted
+    rng = random.Random(1)
+
+    found = expected = 0
+    for _ in range(20):
+        query = text(rng)
+        exact = set(exact_top(store, documents, query, 10))
+        results = store.search(query, top_k=10)
+        found += len(exact & {chunk_id(store, result) for result in results})
+        expected += len(exact)
+
+    assert found / expected >= (0.85 if index_type == "hnsw" else 0.6)
+
+
+def test_filtered_search_never_misses_allowed_chunks(promoted):
+    store, documents, _ = promoted
+    allowed = {"doc-3", "doc-10"}
+    query = text(random.Random(2))
+
+    # Small enough to be ranked exhaustively: every allowed chunk is reachable
+    results = store.search(query, top_k=2 * CHUNKS_PER_DOCUMENT, doc_ids=allowed)
+    assert {result["doc_id"] for result in results} == allowed
+    assert len({chunk_id(store, result) for result in results}) == 2 * CHUNKS_PER_DOCUMENT
+
+    top = store.search(query, top_k=5, doc_ids=allowed)
+    assert [chunk_id(store, result) for result in top][:1] == exact_top(
+        store, documents, query, 1, allowed
+    )
+
+
+def test_removed_documents_are_not_returned(promoted):
+    store, documents, _ = promoted
+    # One document from before promotion, one added after it
+    for doc_id in ("doc-0", "doc-11"):
+        store.remove_document(doc_id)
+
+    assert not store.has_document("doc-0") and not store.has_document("doc-11")
+    for query in (documents["doc-0"][0]["text"], documents["doc-11"][0]["text"]):
+        results = store.search(query, top_k=20)
+        assert len(results) == 20
+        assert not {result["doc_id"] for result in results} & {"doc-0", "doc-11"}
+
+    # Re-adding a removed document makes it searchable again
+    store.add_document("doc-0", documents["doc-0"])
+    results = store.search(documents["doc-0"][0]["text"], top_k=1, doc_ids=["doc-0"])
+    assert results[0]["doc_id"] == "doc-0"
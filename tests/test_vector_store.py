@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.lexical_index import terms
+from app.services.pdf_processor import PDFProcessor
+from app.services.text_chunker import TextChunker
+from app.services.vector_store import VectorStore
+from tests.conftest import HashingEmbedder
+from tests.stubs import generate_pdf
+
+
+def chunk(text: str, index: int) -> dict:
+    return {"text": text, "chunk_index": index, "document_name": "policy.pdf"}
+
+
+@pytest.fixture
+def store(embedder, monkeypatch):
+    monkeypatch.setattr(settings, "hybrid_search_enabled", True)
+    store = VectorStore(embedding_service=embedder)
+    store.add_document(
+        "policy",
+        [
+            chunk("The roof of the dwelling is covered against wind and hail.", 0),
+            chunk("Clause 4.2.1 excludes flood and sewer backup from the policy.", 1),
+            chunk("The premium is due at the start of the term, with a grace period.", 2),
+        ],
+    )
+    return store
+
+
+def test_stopwords_are_not_terms():
+    assert terms("What is the deductible for the roof?") == ["deductible", "roof"]
+
+
+def test_stopword_query_finds_no_keyword_hits(store):
+    assert store.search("the", min_similarity=0.99) == []
+    assert all(result["lexical_score"] is None for result in store.search("what is the"))
+
+
+def test_keyword_hits_below_min_similarity_are_dropped(store):
+    results = store.search("flood", min_similarity=0.99)
+    assert results == []
+
+    results = store.search("flood", min_similarity=0.1)
+    assert [result["chunk_index"] for result in results] == [1]
+    assert results[0]["lexical_score"] > 0
+    assert results[0]["similarity"] >= 0.1
+
+
+def test_saved_index_round_trips(store, tmp_path, embedder):
+    store.save_index(str(tmp_path / "saved"))
+
+    restored = VectorStore(embedding_service=embedder)
+    restored.load_index(str(tmp_path / "saved"))
+    assert restored.has_document("policy")
+    assert restored.search("flood", min_similarity=0.1)[0]["chunk_index"] == 1
+
+
+@pytest.mark.parametrize(
+    "setting, value, key",
+    [
+        ("embedding_model", "sentence-transformers/all-mpnet-base-v2", "embedding_model"),
+        ("embedding_backend", "onnx-int8", "embedding_backend"),
+        ("chunk_size", 800, "chunking"),
+        ("chunk_length_unit", "tokens", "chunking"),
+        ("pdf_extraction_backend", "pypdf2", "chunking"),
+    ],
+)
+def test_index_built_with_other_settings_is_rejected(
+    store, tmp_path, embedder, monkeypatch, setting, value, key
+):
+    path = str(tmp_path / "saved")
+    store.save_index(path)
+    monkeypatch.setattr(settings, setting, value)
+
+    restored = VectorStore(embedding_service=embedder)
+    with pytest.raises(ValueError, match=f"built with {key}"):
+        restored.load_index(path)
+    assert not restored.has_document("policy")
+
+
+def test_index_of_other_dimension_is_rejected(store, tmp_path):
+    path = str(tmp_path / "saved")
+    store.save_index(path)
+
+    with pytest.raises(ValueError, match="64-dimensional"):
+        VectorStore(embedding_service=HashingEmbedder(dimension=32)).load_index(path)
+
+
+def test_rejected_index_is_replaced_on_save(store, tmp_path, embedder, monkeypatch):
+    path = str(tmp_path / "saved")
+    store.save_index(path)
+    monkeypatch.setattr(settings, "chunk_size", 800)
+
+    fresh = VectorStore(embedding_service=embedder)
+    with pytest.raises(ValueError):
+        fresh.load_index(path)
+    # Saved while still empty: the old vectors must not come back
+    fresh.save_index(path)
+    with pytest.raises(ValueError, match="not found"):
+        VectorStore(embedding_service=embedder).load_index(path)
+
+
+def test_search_returns_page_spans_and_offsets(tmp_path, embedder, monkeypatch):
+    monkeypatch.setattr(settings, "pdf_extraction_backend", "pypdf2")
+    url = "http://example.com/policies/home.pdf"
+    text, pages = asyncio.run(PDFProcessor().extract_pages(generate_pdf(3, 0)))
+    chunks = TextChunker().chunk_documents({url: text}, pages={url: pages})
+    store = VectorStore(embedding_service=embedder)
+    store.add_document(url, chunks)
+    store.save_index(str(tmp_path / "saved"))
+
+    restored = VectorStore(embedding_service=embedder)
+    restored.load_index(str(tmp_path / "saved"))
+    results = restored.search("Clause 1.2.3 roof deductible", top_k=len(chunks))
+
+    assert len(results) == len(chunks)
+    for result in results:
+        # Offsets slice the extracted text, so citations need no re-parsing
+        assert text[result["start_char"] : result["end_char"]] == result["text"]
+        assert result["page_start"] == max(
+            page for page, start, _ in pages if start <= result["start_char"]
+        )
+        assert result["page_end"] == max(
+            page for page, start, _ in pages if start < result["end_char"]
+        )
+    assert {result["page_start"] for result in results} == {1, 2, 3}